@@ -0,0 +1,112 @@
+"""Offline fixtures for the benchmarks, built from the files in NCCP_Cancer_Regimens/."""
+import pickle
+import sys
+import warnings
+from functools import lru_cache
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import nccp_chemotherapy_regimens as nccp  # noqa: E402
+
+# Parse/merge warnings about the fixture's known quirks would drown the results.
+warnings.filterwarnings("ignore", module="nccp_chemotherapy_regimens")
+
+FIXTURE_DIR = ROOT / "NCCP_Cancer_Regimens"
+TEST_PAGE = FIXTURE_DIR / "test_file.html"
+PAGE_URL = "https://www.hse.ie/eng/services/list/5/cancer/profinfo/chemoprotocols/{}/"
+
+
+@lru_cache(maxsize=None)
+def fixture_html():
+    return TEST_PAGE.read_bytes()
+
+
+@lru_cache(maxsize=None)
+def fixture_tables():
+    return nccp.parse_tables_from_html(fixture_html())
+
+
+def fixture_pages(pages=5):
+    """Split the fixture's tables into `pages` tumour-group pages."""
+    tables = fixture_tables()
+    return {PAGE_URL.format(f"group{i}"): list(tables[i::pages]) for i in range(pages)}
+
+
+def scaled_pages(factor, pages=5):
+    """Synthetic site `factor` times the fixture, with distinct names and codes.
+
+    Each copy gets its own page URLs, regimen names and indication codes, and its
+    own string objects, as separately scraped pages would.
+    """
+    scaled = {}
+    for copy in range(factor):
+        for url, tables in fixture_pages(pages).items():
+            scaled[f"{url.rstrip('/')}-{copy}/"] = [
+                (caption, [(f"{name} [{copy}]", link,
+                            {f"{code}-{copy}": desc for code, desc in indics.items()})
+                           for name, link, indics in table])
+                for caption, table in tables
+            ]
+    return fresh_copy(scaled)
+
+
+def fresh_copy(data):
+    """Deep copy that also duplicates strings, like a separate scrape would."""
+    return pickle.loads(pickle.dumps(data))
+
+
+def scaled_database(factor, pages=5):
+    return nccp.NCCP_Chemotherapy_Database.from_parsed_tables(scaled_pages(factor, pages))
+
+
+def scaled_html(factor):
+    """The fixture page with its tables repeated `factor` times."""
+    html = fixture_html().decode("utf-8")
+    start, end = html.index("<table"), html.rindex("</table>") + len("</table>")
+    return (html[:start] + html[start:end] * factor + html[end:]).encode("utf-8")
+
+
+# Synthetic NCRI/CSO CSVs in the layouts ncri_plots reads; the real exports are
+# not redistributable, so the values are random but plausibly shaped.
+NCRI_YEARS = range(1994, 2020)
+NCRI_AGE_GROUPS = ("0-49", "50-64", "65-74", "75+")
+SURVIVAL_PERIODS = ("1994-1998", "1999-2003", "2004-2008", "2009-2013", "2014-2018")
+
+
+def write_ncri_csvs(directory, site="All invasive cancers", seed=0):
+    """Write age/sex incidence, population and survival CSVs; return their paths."""
+    import numpy as np
+    import pandas as pd
+    from ncri_plots import AGE_BANDS
+
+    rng = np.random.default_rng(seed)
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    slug = "".join(char if char.isalnum() else "_" for char in site.lower())
+    paths = {kind: directory / f"{slug}_{kind}.csv"
+             for kind in ("age_incidence", "sex_incidence", "population", "survival")}
+
+    pd.DataFrame([(group, year, int(rng.integers(500, 9000)), rng.uniform(50, 3000))
+                  for group in NCRI_AGE_GROUPS for year in NCRI_YEARS],
+                 columns=["Age group", "Year", "Case numbers", "Crude rate"]
+                 ).to_csv(paths["age_incidence"], index=False)
+    pd.DataFrame([(year, sex, int(rng.integers(5000, 15000)))
+                  for year in NCRI_YEARS for sex in ("Males", "Females")],
+                 columns=["Year", "Sex", "Case numbers"]
+                 ).to_csv(paths["sex_incidence"], index=False)
+    population = []
+    for year in range(1990, 2023):
+        for band in AGE_BANDS:
+            male, female = rng.uniform(50, 200, size=2).round(1)
+            population += [("Population", year, sex, band, "Thousand", value)
+                           for sex, value in (("Both sexes", male + female),
+                                              ("Male", male), ("Female", female))]
+    pd.DataFrame(population, columns=["Statistic", "Year", "Sex", "Age Group", "UNIT",
+                                      "VALUE"]).to_csv(paths["population"], index=False)
+    pd.DataFrame([(period, time, 100 * np.exp(-rng.uniform(0.05, 0.2) * time))
+                  for period in SURVIVAL_PERIODS for time in range(1, 6)],
+                 columns=["Dates", "Time (years)", "Net survival"]
+                 ).to_csv(paths["survival"], index=False)
+    return paths
@@ -0,0 +1,97 @@
+"""Compare the memory held by the object-graph and compact database representations.
+
+Holds `snapshots` separately parsed copies of a database scaled `factor` times and
+reports the deep size of each representation: the original __dict__ classes, the
+slotted object graph and CompactChemotherapyDatabase.
+
+    python benchmarks/memory_benchmark.py --factor 10 --snapshots 5
+"""
+import argparse
+import gc
+import sys
+import types
+
+from fixtures import fresh_copy, nccp, scaled_pages
+
+SKIPPED_TYPES = (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType,
+                 types.MethodType, property)
+
+
+class LegacyIndication:
+    def __init__(self, code, description, source_url, diseases, has_genetic_req=None,
+                 progression_flags=None):
+        self.code = code
+        self.description = description
+        self.source_url = source_url
+        self.regimens = set()
+        self.diseases = diseases
+        self.has_genetic_req = has_genetic_req
+        self.progression_flags = progression_flags
+
+
+class LegacyRegimen:
+    def __init__(self, description, diseases):
+        self.description = description
+        self.indication_codes = set()
+        self.diseases = diseases
+
+    def __hash__(self):
+        return hash(self.description)
+
+
+def legacy_graph(database):
+    """Rebuild the object graph with the pre-__slots__ classes and uninterned labels."""
+    regimens = {key: LegacyRegimen(reg.description, set(fresh_copy(reg.diseases)))
+                for key, reg in database.regimens.items()}
+    indications = {key: LegacyIndication(ind.code, ind.description, ind.source_url,
+                                         set(fresh_copy(ind.diseases)))
+                   for key, ind in database.indications.items()}
+    for key, reg in database.regimens.items():
+        for ind in reg.indication_codes:
+            regimens[key].indication_codes.add(indications[ind.code])
+            indications[ind.code].regimens.add(regimens[key])
+    return regimens, indications
+
+
+def deep_sizeof(*roots):
+    """Bytes held by every object reachable from roots, each counted once."""
+    seen, stack, total = set(), list(roots), 0
+    while stack:
+        thing = stack.pop()
+        if id(thing) in seen or isinstance(thing, SKIPPED_TYPES):
+            continue
+        seen.add(id(thing))
+        total += sys.getsizeof(thing)
+        stack.extend(gc.get_referents(thing))
+    return total
+
+
+def run(factor, snapshots):
+    databases = [nccp.NCCP_Chemotherapy_Database.from_parsed_tables(scaled_pages(factor))
+                 for _ in range(snapshots)]
+    graphs = [(db.regimens, db.indications) for db in databases]
+    legacy = [legacy_graph(db) for db in databases]
+    compact = [db.compact() for db in databases]
+    for db in compact:
+        db.harmonizer = None
+    results = {"legacy (__dict__)": deep_sizeof(legacy),
+               "slotted graph": deep_sizeof(graphs),
+               "compact": deep_sizeof(compact)}
+    regimens, indications = len(databases[0].regimens), len(databases[0].indications)
+    print(f"{snapshots} snapshot(s) of {regimens} regimens / {indications} indications")
+    baseline = results["legacy (__dict__)"]
+    for name, size in results.items():
+        print(f"  {name:<20} {size / 2 ** 20:8.2f} MiB  ({size / baseline:6.1%})")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--factor", type=int, default=10)
+    parser.add_argument("--snapshots", type=int, default=3)
+    args = parser.parse_args()
+    run(args.factor, args.snapshots)
+
+
+if __name__ == "__main__":
+    main()
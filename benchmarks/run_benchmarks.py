@@ -0,0 +1,295 @@
+"""Offline benchmarks for parsing, searching, exporting, NCRI plotting and CLI startup.
+
+Each benchmark runs at every scale factor (synthetic data `factor` times the
+fixtures) and its median time is appended to a JSON-lines history. Unless
+--no-check is given, medians are compared with the median of the last --window
+recorded runs on the same machine and Python version, and the exit status is 1 if
+any is slower by more than --threshold. The history file is machine-local and
+ignored by git.
+
+    python benchmarks/run_benchmarks.py --factors 1 10 100 --filter search
+"""
+import argparse
+import gc
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from fixtures import (FIXTURE_DIR, ROOT, nccp, scaled_database, scaled_html, scaled_pages,
+                      write_ncri_csvs)
+
+HISTORY_FILE = Path(__file__).resolve().parent / "history.jsonl"
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    """Register setup(factor) -> run() under name."""
+    def register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return register
+
+
+@benchmark("parse/tables")
+def _(factor):
+    html = scaled_html(factor)
+    return lambda: nccp.parse_tables_from_html(html)
+
+
+@benchmark("parse/soup")
+def _(factor):
+    html = scaled_html(factor)
+    return lambda: nccp.parse_tables_from_html(html, backend="soup")
+
+
+@benchmark("organize_parsed_tables")
+def _(factor):
+    pages = scaled_pages(factor)
+    return lambda: nccp.organize_parsed_tables(pages)
+
+
+@benchmark("fix_regimen_name/dict")
+def _(factor):
+    names = [row[0] for tables in scaled_pages(factor).values()
+             for _, table in tables for row in table]
+    harmonization = nccp.read_harmonization_file(FIXTURE_DIR / "harmonization.tsv")
+    return lambda: [nccp.fix_regimen_name(name, harmonization) for name in names]
+
+
+@benchmark("fix_regimen_name/harmonizer")
+def _(factor):
+    from harmonization import RegimenHarmonizer
+    names = [row[0] for tables in scaled_pages(factor).values()
+             for _, table in tables for row in table]
+
+    def run():
+        harmonizer = RegimenHarmonizer.from_files(
+            FIXTURE_DIR / "harmonization.tsv", FIXTURE_DIR / "nccp_regimens_by_tumour_group.tsv")
+        return [nccp.fix_regimen_name(name, harmonizer) for name in names]
+    return run
+
+
+@benchmark("search_regimens/scan")
+def _(factor):
+    database = scaled_database(factor)
+    return lambda: nccp.NCCP_Chemotherapy_Database._search(
+        database.regimens.values(), "CISplatin", ("description", "diseases"))
+
+
+@benchmark("search_regimens/indexed")
+def _(factor):
+    database = scaled_database(factor)
+    database.search_index("regimens")
+    return lambda: database.search_regimens("CISplatin")
+
+
+@benchmark("search_indications/scan")
+def _(factor):
+    database = scaled_database(factor)
+    return lambda: nccp.NCCP_Chemotherapy_Database._search(
+        database.indications.values(), "HER2", ("description", "code"))
+
+
+@benchmark("search_indications/indexed")
+def _(factor):
+    database = scaled_database(factor)
+    database.search_index("indications")
+    return lambda: database.search_indications("HER2")
+
+
+@benchmark("search_indications/regex")
+def _(factor):
+    database = scaled_database(factor)
+    database.search_index("indications")
+    return lambda: database.search_indications(r"EGFR|ALK[- ]positive")
+
+
+@benchmark("tabulate_indications")
+def _(factor):
+    database = scaled_database(factor)
+    return database.tabulate_indications
+
+
+@benchmark("ncri/read_and_merge")
+def _(factor):
+    import ncri_plots
+    directory = tempfile.mkdtemp(prefix="nccp-bench-")
+    sites = [write_ncri_csvs(directory, f"site {i}", seed=i) for i in range(factor)]
+
+    def run():
+        for paths in sites:
+            population = ncri_plots.PopulationData.read_csv(paths["population"])
+            age = ncri_plots.AgeIncidenceData.read_csv(paths["age_incidence"])
+            sex = ncri_plots.SexIncidenceData.read_csv(paths["sex_incidence"])
+            age.age_incidence_tools.merge_with_population_table(population)
+            sex.sex_incidence_tools.merge_with_population_table(population)
+            ncri_plots.SurvivalData.read_csv(paths["survival"])
+            population.population_tools.add_proportions()
+    return run
+
+
+@benchmark("ncri/read_and_merge/cached")
+def _(factor):
+    from ncri_cache import DerivedTableCache
+    run = BENCHMARKS["ncri/read_and_merge"](factor)
+    cache = DerivedTableCache(max_entries=16 * factor)
+
+    def cached():
+        with cache:
+            run()
+    return cached
+
+
+@benchmark("ncri/read_sites")
+def _(factor):
+    import ncri_plots
+    directory = tempfile.mkdtemp(prefix="nccp-bench-")
+    sites = {f"site {i}": write_ncri_csvs(directory, f"site {i}", seed=i) for i in range(factor)}
+    return lambda: [ncri_plots.read_sites({site: paths[kind] for site, paths in sites.items()},
+                                          kind)
+                    for kind in ("age_incidence", "sex_incidence", "survival")]
+
+
+@benchmark("ncri/plots")
+def _(factor):
+    import ncri_plots
+    directory = tempfile.mkdtemp(prefix="nccp-bench-")
+    sites = [write_ncri_csvs(directory, f"site {i}", seed=i) for i in range(factor)]
+    return lambda: [ncri_plots.main(paths["age_incidence"], paths["sex_incidence"],
+                                    paths["population"], paths["survival"])
+                    for paths in sites]
+
+
+@benchmark("ncri/report")
+def _(factor):
+    import ncri_plots
+    directory = tempfile.mkdtemp(prefix="nccp-bench-")
+    sites = {f"site {i}": write_ncri_csvs(directory, f"site {i}", seed=i) for i in range(factor)}
+    return lambda: ncri_plots.write_report(sites, Path(directory) / "report.html")
+
+
+def _cli(factor, *args):
+    path = Path(tempfile.mkdtemp(prefix="nccp-bench-")) / "database.sqlite"
+    database = scaled_database(factor)
+    database.save(path)
+    code = next(iter(database.indications))
+    command = [sys.executable, str(ROOT / "nccp.py"), "--database", str(path),
+               *[code if arg == "{code}" else arg for arg in args]]
+    return lambda: subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+
+
+@benchmark("cli/show-indication")
+def _(factor):
+    return _cli(factor, "show-indication", "{code}")
+
+
+@benchmark("cli/search")
+def _(factor):
+    return _cli(factor, "search", "HER2")
+
+
+def time_benchmark(setup, factor, repeat):
+    run = setup(factor)
+    run()  # Warm-up: imports, lazy indexes, caches.
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        gc.disable()  # As timeit does, so collections don't land in random runs.
+        try:
+            start = time.perf_counter()
+            run()
+            times.append(time.perf_counter() - start)
+        finally:
+            gc.enable()
+    return {"median": statistics.median(times), "min": min(times), "repeat": repeat}
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def read_history(path):
+    if not Path(path).exists():
+        return []
+    with open(path) as infile:
+        return [json.loads(line) for line in infile if line.strip()]
+
+
+def environment():
+    """Where timings come from; only runs from the same environment are compared."""
+    return {"python": platform.python_version(), "machine": platform.node()}
+
+
+def find_regressions(results, history, threshold, window, env=None):
+    """Return [(key, median, reference)] for results slower than the reference.
+
+    The reference is taken from runs of history recorded in env, by default the
+    current environment().
+    """
+    env = environment() if env is None else env
+    history = [run for run in history
+               if all(run.get(field) == value for field, value in env.items())]
+    regressions = []
+    for key, result in results.items():
+        previous = [run["results"][key]["median"] for run in history
+                    if key in run["results"]][-window:]
+        if not previous:
+            continue
+        reference = statistics.median(previous)
+        if result["median"] > reference * (1 + threshold):
+            regressions.append((key, result["median"], reference))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--factors", type=int, nargs="+", default=[1, 10])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--filter", default="", help="only run benchmarks containing this")
+    parser.add_argument("--history", default=HISTORY_FILE, type=Path)
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="allowed slowdown before failing, as a fraction")
+    parser.add_argument("--window", type=int, default=5,
+                        help="number of previous runs the reference is taken from")
+    parser.add_argument("--no-save", action="store_true")
+    parser.add_argument("--no-check", action="store_true")
+    args = parser.parse_args(argv)
+
+    history = read_history(args.history)
+    results = {}
+    for name, setup in BENCHMARKS.items():
+        if args.filter not in name:
+            continue
+        for factor in args.factors:
+            key = f"{name}@{factor}x"
+            results[key] = time_benchmark(setup, factor, args.repeat)
+            print(f"{key:<40} {results[key]['median'] * 1000:10.2f} ms")
+
+    regressions = [] if args.no_check else find_regressions(results, history,
+                                                            args.threshold, args.window)
+    for key, median, reference in regressions:
+        print(f"REGRESSION {key}: {median * 1000:.2f} ms vs {reference * 1000:.2f} ms",
+              file=sys.stderr)
+    if not args.no_save:
+        with open(args.history, "a") as outfile:
+            outfile.write(json.dumps({
+                "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "commit": git_commit(),
+                **environment(),
+                "results": results,
+            }) + "\n")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
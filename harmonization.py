@@ -0,0 +1,200 @@
+import hashlib
+import json
+import os
+import re
+import unicodedata
+
+NUMBER_PATTERN = re.compile(r"\d+(?:\.\d+)?")
+BRACKET_PATTERN = re.compile(r"\(([^()]*)\)")
+ROUTE_PATTERN = re.compile(r"\b(s\.?/?c|sub\W?cut(?:aneous)?|i\.?v|intravenous|oral|p\.?o|"
+                           r"i\.?m|intramuscular|intrathecal)\b")
+UNIT_PATTERN = re.compile(r"(?<![a-z])(mg|mcg|micrograms?|g|units?|iu|ml|auc)"
+                          r"(?:\s*/\s*(m2|kg|day|dose|week|hr|hour))?(?![a-z])")
+ROUTES = {"sc": "sc", "subcut": "sc", "subcutaneous": "sc", "iv": "iv", "intravenous": "iv",
+          "oral": "oral", "po": "oral", "im": "im", "intramuscular": "im",
+          "intrathecal": "intrathecal"}
+NUMBER_WORDS = frozenset({"one", "two", "three", "four", "five", "six", "seven", "eight",
+                          "nine", "ten", "eleven", "twelve", "once", "twice", "single",
+                          "double", "triple"})
+NON_DRUG_WORDS = NUMBER_WORDS | frozenset({
+    "therapy", "monotherapy", "regimen", "cycle", "cycles", "days", "weeks", "intervals",
+    "with", "plus", "then", "followed", "oral", "intravenous", "subcutaneous",
+    "intramuscular", "intrathecal", "micrograms", "units"})
+MAX_BLOCKS = 6
+# Bumped when resolution rules change, so caches written by older rules are ignored.
+CACHE_VERSION = 2
+
+
+def _fold(name):
+    key = unicodedata.normalize("NFKD", name.casefold())
+    return "".join(char for char in key if not unicodedata.combining(char))
+
+
+def harmonization_key(name):
+    """Case-, accent-, punctuation- and spacing-insensitive key for a regimen name."""
+    return re.sub(r"[\W_]+", " ", _fold(name)).strip()
+
+
+def guard_tokens(name):
+    """Features two names must share before a fuzzy match may merge them.
+
+    Trigram similarity can't tell "Two Weekly" from "Three Weekly", IV from S/C,
+    mg/day from mg/kg or a bracketed brand or acronym from its absence, so the
+    doses, number words, routes, units, bracketed tokens and remaining words
+    (drug names, schedules) of both names are compared as well.
+    """
+    folded, key = _fold(name), harmonization_key(name)
+    words = key.split()
+    return (tuple(NUMBER_PATTERN.findall(key)),
+            frozenset(word for word in words if word in NUMBER_WORDS),
+            frozenset(ROUTES[re.sub(r"[^a-z]", "", route)]
+                      for route in ROUTE_PATTERN.findall(folded)),
+            frozenset(unit for unit in UNIT_PATTERN.findall(folded)),
+            frozenset(harmonization_key(token) for token in BRACKET_PATTERN.findall(folded)),
+            frozenset(word for word in words
+                      if len(word) > 3 and word.isalpha() and word not in NON_DRUG_WORDS))
+
+
+def _grams(key):
+    padded = f"  {key} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+class RegimenHarmonizer:
+    """Resolve scraped regimen names to canonical names.
+
+    Canonical names are indexed by their harmonization_key and by character
+    trigram blocks. A name resolves through, in order: a known alias, an exact
+    key match, or the best fuzzy (Dice) match among canonical names sharing its
+    rarest trigrams. Fuzzy matches scoring at least `accept` whose guard_tokens
+    agree are merged. Weaker ones scoring at least `review`, and strong ones
+    whose guard tokens differ, are left unmerged and reported in `review`. Ties
+    go to the greatest key, so results don't depend on set iteration order.
+    Alias targets are only matched through their aliases, never fuzzily, and
+    are returned as written in the alias table. Resolutions are memoized and
+    can be persisted in `cache_file` across runs.
+    """
+
+    def __init__(self, canonical_names=(), aliases=None, accept=0.92, review=0.8,
+                 cache_file=None):
+        self.accept = accept
+        self.review_threshold = review
+        self.cache_file = cache_file
+        self.review = {}
+        self._canonical = {}
+        self._grams = {}
+        self._guards = {}
+        self._blocks = {}
+        self._aliases = {}
+        self._alias_targets = {}
+        self._resolved = {}
+        for name in canonical_names:
+            self.add_canonical(name)
+        for alias, target in (aliases or {}).items():
+            self.add_alias(alias, target)
+        if cache_file is not None and os.path.exists(cache_file):
+            self._load_cache()
+
+    @classmethod
+    def from_files(cls, harmonization_file=None, canonical_file=None, **kwargs):
+        """Build from harmonization.tsv aliases and an optional regimen list TSV.
+
+        Listed names are normalized like scraped ones by fix_regimen_name, so an
+        exact match doesn't bring back the dashes and spacing it removed.
+        """
+        from nccp_chemotherapy_regimens import fix_regimen_name, read_harmonization_file
+        canonical_names = []
+        if canonical_file is not None:
+            with open(canonical_file) as infile:
+                canonical_names = [fix_regimen_name(line.rstrip("\n").split("\t")[-1])
+                                   for line in infile if line.strip()]
+        aliases = {}
+        if harmonization_file is not None:
+            aliases = read_harmonization_file(harmonization_file)
+        return cls(canonical_names, aliases, **kwargs)
+
+    def __repr__(self):
+        return (f"RegimenHarmonizer(canonical={len(self._canonical)}, "
+                f"aliases={len(self._aliases)}, review={len(self.review)})")
+
+    def __len__(self):
+        return len(self._canonical)
+
+    def add_canonical(self, name):
+        name = name.strip()
+        key = harmonization_key(name)
+        if not key or key in self._canonical:
+            return
+        self._canonical[key] = name
+        self._grams[key] = _grams(key)
+        self._guards[key] = guard_tokens(name)
+        for gram in self._grams[key]:
+            self._blocks.setdefault(gram, set()).add(key)
+        self._resolved.clear()
+
+    def add_alias(self, alias, target):
+        target = target.strip()
+        self._alias_targets[alias] = target
+        self._aliases[harmonization_key(alias)] = target
+        self._resolved.clear()
+
+    def state(self):
+        """JSON-serializable configuration, enough to rebuild an equal harmonizer."""
+        return {"canonical_names": list(self._canonical.values()),
+                "aliases": dict(self._alias_targets),
+                "accept": self.accept, "review": self.review_threshold}
+
+    def fingerprint(self):
+        return hashlib.sha1(json.dumps(self.state(), sort_keys=True).encode()).hexdigest()
+
+    def resolve(self, name):
+        """Return the canonical name for name, or name itself if none is found."""
+        return self.match(name)[0]
+
+    def match(self, name):
+        """Return (resolved name, score, status).
+
+        Status is one of "alias", "exact", "fuzzy", "review" or "new"; only the
+        first three replace the name.
+        """
+        if (resolved := self._resolved.get(name)) is not None:
+            return resolved
+        key = harmonization_key(name)
+        if key in self._aliases:
+            resolved = self._aliases[key], 1.0, "alias"
+        elif key in self._canonical:
+            resolved = self._canonical[key], 1.0, "exact"
+        else:
+            resolved = self._fuzzy_match(name, key)
+        self._resolved[name] = resolved
+        return resolved
+
+    def _fuzzy_match(self, name, key):
+        grams = _grams(key)
+        blocks = sorted((self._blocks[gram] for gram in grams if gram in self._blocks),
+                        key=len)[:MAX_BLOCKS]
+        scores = ((2 * len(grams & self._grams[candidate])
+                   / (len(grams) + len(self._grams[candidate])), candidate)
+                  for candidate in set().union(*blocks))
+        best_score, best_key = max(scores, default=(0.0, None))
+        if best_key is None or best_score < self.review_threshold:
+            return name, best_score, "new"
+        if best_score >= self.accept and guard_tokens(name) == self._guards[best_key]:
+            return self._canonical[best_key], best_score, "fuzzy"
+        self.review[name] = self._canonical[best_key], best_score
+        return name, best_score, "review"
+
+    def _load_cache(self):
+        with open(self.cache_file) as infile:
+            cache = json.load(infile)
+        if (cache.get("version") != CACHE_VERSION
+                or cache.get("fingerprint") != self.fingerprint()):
+            return
+        self._resolved = {name: tuple(resolved) for name, resolved in cache["resolved"].items()}
+        self.review = {name: tuple(resolved) for name, resolved in cache["review"].items()}
+
+    def save_cache(self, cache_file=None):
+        cache_file = cache_file or self.cache_file
+        with open(cache_file, "w") as outfile:
+            json.dump({"version": CACHE_VERSION, "fingerprint": self.fingerprint(),
+                       "resolved": self._resolved, "review": self.review}, outfile)
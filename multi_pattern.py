@@ -0,0 +1,94 @@
+import re
+
+from search_index import is_literal
+
+
+class AhoCorasick:
+    """Aho-Corasick automaton reporting which literal patterns occur in a text."""
+
+    def __init__(self, patterns):
+        self.patterns = list(patterns)
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [()]
+        for i, pattern in enumerate(self.patterns):
+            state = 0
+            for char in pattern:
+                if char not in self._goto[state]:
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append(())
+                    self._goto[state][char] = len(self._goto) - 1
+                state = self._goto[state][char]
+            self._out[state] += (i,)
+        queue = list(self._goto[0].values())
+        for state in queue:
+            for char, child in self._goto[state].items():
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(char, 0)
+                self._out[child] += self._out[self._fail[child]]
+                queue.append(child)
+
+    def finditer(self, text):
+        """Yield (end_position, pattern_index) for every occurrence in text."""
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for position, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for i in out[state]:
+                yield position + 1, i
+
+    def matches(self, text):
+        """Return the set of pattern indices occurring in text."""
+        goto, fail, out = self._goto, self._fail, self._out
+        found = set()
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if out[state]:
+                found.update(out[state])
+        return found
+
+
+class MultiPatternMatcher:
+    """Match many literal and regex patterns against a text in one pass.
+
+    Literal patterns go through a single Aho-Corasick automaton. Regexes are
+    combined into one alternation that is used as a prefilter, so they are only
+    tried individually on texts where at least one of them matches.
+    """
+
+    def __init__(self, patterns, ignore_case=False):
+        self.patterns = list(patterns)
+        self.ignore_case = ignore_case
+        literals, self._regexes = [], []
+        self._literal_ids = []
+        flags = re.IGNORECASE if ignore_case else 0
+        for i, pattern in enumerate(self.patterns):
+            if is_literal(pattern) and pattern:
+                literals.append(pattern.casefold() if ignore_case else pattern)
+                self._literal_ids.append(i)
+            else:
+                self._regexes.append((i, re.compile(pattern, flags)))
+        self._automaton = AhoCorasick(literals)
+        self._combined = None
+        if self._regexes:
+            try:
+                self._combined = re.compile("|".join(f"(?:{regex.pattern})"
+                                                     for _, regex in self._regexes), flags)
+            except re.error:
+                pass  # E.g. numbered backreferences; try each regex without prefilter.
+
+    def matches(self, text):
+        """Return the set of indices into patterns that match text."""
+        folded = text.casefold() if self.ignore_case else text
+        found = {self._literal_ids[i] for i in self._automaton.matches(folded)}
+        if self._regexes and (self._combined is None or self._combined.search(text)):
+            found.update(i for i, regex in self._regexes if regex.search(text))
+        return found
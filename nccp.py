@@ -0,0 +1,189 @@
+"""Query, refresh and export a prebuilt NCCP regimen database.
+
+    python nccp.py refresh --harmonization harmonization.tsv
+    python nccp.py search HER2 --limit 5
+    python nccp.py show-indication 00224a
+    python nccp.py show-regimen "Trastuzumab Monotherapy"
+    python nccp.py export indications.parquet
+    python nccp.py diff last_week.sqlite --codes all_indication_codes.txt
+    python nccp.py serve --port 8765
+
+The database is a snapshot written by NCCP_Chemotherapy_Database.save(), taken
+from --database or $NCCP_DATABASE. Query subcommands load it lazily and only
+import what they use, so a lookup never imports pandas, bs4 or plotly.
+"""
+import argparse
+import json
+import os
+import sys
+
+from nccp_export import indication_record, regimen_record
+
+DEFAULT_DATABASE = "nccp_database.sqlite"
+
+
+def load_database(path):
+    from nccp_chemotherapy_regimens import NCCP_Chemotherapy_Database
+    if not os.path.exists(path):
+        raise SystemExit(f"No database at {path}; run `nccp.py refresh` first.")
+    return NCCP_Chemotherapy_Database.load(path)
+
+
+def print_record(record, as_json):
+    if as_json:
+        print(json.dumps(record, indent=2))
+        return
+    width = max(map(len, record))
+    for field, value in record.items():
+        if field == "description_variants":
+            value = f"\n{' ' * (width + 2)}".join(value)
+        elif isinstance(value, (list, tuple)):
+            value = ", ".join(value)
+        print(f"{field:<{width}}  {'' if value is None else value}")
+
+
+def refresh(args):
+    import nccp_chemotherapy_regimens as nccp
+    page_cache = None
+    if args.page_cache is not None:
+        from page_cache import PageCache
+        page_cache = PageCache(args.page_cache)
+    previous = load_database(args.database) if os.path.exists(args.database) else None
+    try:
+        database = nccp.main(args.harmonization, max_workers=args.workers,
+                             page_cache=page_cache, previous=previous)
+    finally:
+        if previous is not None:
+            previous.close()
+    if args.genetic_indications is not None:
+        database.add_genetic_classification(args.genetic_indications)
+    database.save(args.database)
+    print(database)
+
+
+def search(args):
+    with load_database(args.database) as database:
+        method = database.search_regimens if args.regimens else database.search_indications
+        results = method(args.text, fields=args.fields, limit=args.limit, rank=args.rank,
+                         tokens=args.tokens)
+        if args.json:
+            record = regimen_record if args.regimens else indication_record
+            print(json.dumps([record(thing) for thing in results], indent=2))
+            return
+        for thing in results:
+            print(thing.description if args.regimens
+                  else f"{thing.code}\t{thing.description}")
+
+
+def show_indication(args):
+    with load_database(args.database) as database:
+        if args.code not in database.indications:
+            raise SystemExit(f"No indication with code {args.code}.")
+        print_record(indication_record(database.indications[args.code]), args.json)
+
+
+def show_regimen(args):
+    with load_database(args.database) as database:
+        if args.name not in database.regimens:
+            raise SystemExit(f"No regimen named {args.name!r}.")
+        print_record(regimen_record(database.regimens[args.name]), args.json)
+
+
+def export(args):
+    with load_database(args.database) as database:
+        columns = args.columns
+        if args.with_variants:
+            from nccp_export import INDICATION_COLUMNS
+            columns = [*(columns or INDICATION_COLUMNS), "Description Variants"]
+        database.export_indications(args.path, fmt=args.format, columns=columns)
+
+
+def diff(args):
+    from nccp_diff import diff as diff_builds
+    with load_database(args.old) as old, load_database(args.new or args.database) as new:
+        report = diff_builds(old, new, args.codes)
+    print(json.dumps(report, indent=2))
+
+
+def serve(args):
+    import asyncio
+    from nccp_service import QueryService
+    if not os.path.exists(args.database):
+        raise SystemExit(f"No database at {args.database}; run `nccp.py refresh` first.")
+    service = QueryService.from_snapshot(args.database, cache_size=args.cache_size)
+    print(f"Serving {args.database} on http://{args.host}:{args.port}", file=sys.stderr)
+    try:
+        asyncio.run(service.serve_forever(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="nccp", description=__doc__.splitlines()[0])
+    parser.add_argument("--database", default=os.environ.get("NCCP_DATABASE",
+                                                             DEFAULT_DATABASE),
+                        help="snapshot file (default: $NCCP_DATABASE or %(default)s)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    command = subparsers.add_parser("refresh", help="scrape NCCP and update the database")
+    command.add_argument("--harmonization", help="regimen name harmonization TSV")
+    command.add_argument("--genetic-indications",
+                         help="file of indication codes with a genetic requirement")
+    command.add_argument("--workers", type=int, help="pages fetched concurrently")
+    command.add_argument("--page-cache", help="SQLite HTTP cache for fetched pages")
+    command.set_defaults(run=refresh)
+
+    command = subparsers.add_parser("search", help="search indications or regimens")
+    command.add_argument("text", help="substring, regex, or words with --tokens")
+    command.add_argument("--regimens", action="store_true",
+                         help="search regimens instead of indications")
+    command.add_argument("--fields", nargs="+")
+    command.add_argument("--limit", type=int)
+    command.add_argument("--rank", action="store_true")
+    command.add_argument("--tokens", action="store_true")
+    command.add_argument("--json", action="store_true")
+    command.set_defaults(run=search)
+
+    command = subparsers.add_parser("show-indication", help="show one indication by code")
+    command.add_argument("code")
+    command.add_argument("--json", action="store_true")
+    command.set_defaults(run=show_indication)
+
+    command = subparsers.add_parser("show-regimen", help="show one regimen by name")
+    command.add_argument("name")
+    command.add_argument("--json", action="store_true")
+    command.set_defaults(run=show_regimen)
+
+    command = subparsers.add_parser("export", help="export the indication table")
+    command.add_argument("path", help="output file; the extension picks the format")
+    command.add_argument("--format", help="tsv, jsonl, parquet or arrow")
+    command.add_argument("--columns", nargs="+")
+    command.add_argument("--with-variants", action="store_true",
+                         help="add a column of other wordings of each description")
+    command.set_defaults(run=export)
+
+    command = subparsers.add_parser("diff", help="changefeed between two snapshots")
+    command.add_argument("old", help="earlier snapshot")
+    command.add_argument("new", nargs="?", help="later snapshot (default: --database)")
+    command.add_argument("--codes", help="expected codes, e.g. all_indication_codes.txt")
+    command.set_defaults(run=diff)
+
+    command = subparsers.add_parser("serve", help="answer lookups over HTTP/JSON")
+    command.add_argument("--host", default="127.0.0.1")
+    command.add_argument("--port", type=int, default=8765)
+    command.add_argument("--cache-size", type=int, default=4096,
+                         help="responses cached per database generation")
+    command.set_defaults(run=serve)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    args.run(args)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
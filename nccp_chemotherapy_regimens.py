@@ -1,15 +1,41 @@
 
+import hashlib
+import json
+import os
 import re
+import sys
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from functools import lru_cache
+from html import escape as html_escape
+from itertools import groupby, islice
+from operator import itemgetter
+from typing import TYPE_CHECKING
 from urllib.request import Request, urlopen
 from urllib.parse import urljoin
 from warnings import warn
 
-import pandas as pd
-from bs4 import BeautifulSoup, Tag
+from harmonization import RegimenHarmonizer
+from multi_pattern import MultiPatternMatcher
+from nccp_metrics import count, instrumented, stage
+from search_index import SearchIndex, field_text, is_literal, link_name
+from table_parser import parse_table_tree
+
+if TYPE_CHECKING:
+    from bs4 import BeautifulSoup, Tag
 
 BASE_URL = "https://www.hse.ie/"
 CODE_PATTERN = re.compile(r"(P0|P|0)0\d{3}[a-z]?")
 
+_page_cache = None
+
+
+def set_page_cache(cache):
+    """Route all page fetches through `cache` (a PageCache), or None to disable."""
+    global _page_cache
+    previous, _page_cache = _page_cache, cache
+    return previous
+
 
 def get_chemoprotocol_urls():
     soup = soupify_page(BASE_URL + "/eng/services/list/5/cancer/profinfo/chemoprotocols/")
@@ -20,33 +46,153 @@ def get_chemoprotocol_urls():
     return urls
 
 
-def parse_tables_from_all_urls(url_list):
-    parsed = dict()
+def parse_tables_from_all_urls(url_list, max_workers=None, parse_in_processes=False,
+                               failures=None):
+    if max_workers is None:
+        parsed = dict()
+        for url in url_list:
+            parsed[url] = parse_tables_from_url(url)
+        return parsed
+    return _parse_tables_concurrently(list(url_list), max_workers, parse_in_processes,
+                                      failures)
+
+
+def _parse_tables_concurrently(url_list, max_workers, parse_in_processes, failures=None):
+    # Fetching is I/O bound, so it always runs on threads; parsing can optionally be
+    # handed to a process pool to sidestep the GIL. Failures are collected per URL
+    # and the output keeps the order of url_list.
+    if failures is None:
+        failures = {}
+    pending = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as fetch_pool:
+        if parse_in_processes:
+            with ProcessPoolExecutor(max_workers=max_workers) as parse_pool:
+                fetches = {fetch_pool.submit(fetch_page, url): url for url in url_list}
+                for future in as_completed(fetches):
+                    url = fetches[future]
+                    try:
+                        page = future.result()
+                    except Exception as err:
+                        failures[url] = err
+                        continue
+                    pending[url] = parse_pool.submit(parse_tables_from_html, page)
+                parsed = _collect_results(url_list, pending, failures)
+        else:
+            pending = {url: fetch_pool.submit(parse_tables_from_url, url)
+                       for url in url_list}
+            parsed = _collect_results(url_list, pending, failures)
+    for url, err in failures.items():
+        warn(f"Failed to fetch or parse {url}: {err!r}", category=RuntimeWarning)
+        count("warnings", category="fetch_failed", url=url)
+    return parsed
+
+
+def _collect_results(url_list, pending, failures):
+    parsed = {}
     for url in url_list:
-        parsed[url] = parse_tables_from_url(url)
+        if url not in pending:
+            continue
+        try:
+            parsed[url] = pending[url].result()
+        except Exception as err:
+            failures[url] = err
     return parsed
 
 
+def stream_parsed_rows(url_list, max_workers=None, failures=None):
+    """Yield (url, caption, row) records page by page, in the order of url_list.
+
+    Each table starts with a (url, caption, None) record, followed by one record
+    per row, so pages can be rebuilt exactly. Pages are parsed one at a time as
+    they arrive; with max_workers, up to that many pages are fetched ahead on
+    threads and failed fetches are warned about, recorded in `failures` (a dict
+    of url to exception) and skipped.
+    """
+    for url, page in _fetch_ahead(url_list, max_workers, failures):
+        for caption, table in _parse_page(url, page):
+            yield url, caption, None
+            for row in table:
+                yield url, caption, row
+
+
+def _fetch_ahead(url_list, max_workers, failures=None):
+    if max_workers is None:
+        for url in url_list:
+            yield url, fetch_page(url)
+        return
+    urls = iter(url_list)
+    with ThreadPoolExecutor(max_workers=max_workers) as fetch_pool:
+        pending = deque((url, fetch_pool.submit(fetch_page, url))
+                        for url in islice(urls, max_workers))
+        while pending:
+            url, future = pending.popleft()
+            if (next_url := next(urls, None)) is not None:
+                pending.append((next_url, fetch_pool.submit(fetch_page, next_url)))
+            try:
+                page = future.result()
+            except Exception as err:
+                if failures is not None:
+                    failures[url] = err
+                warn(f"Failed to fetch or parse {url}: {err!r}", category=RuntimeWarning)
+                count("warnings", category="fetch_failed", url=url)
+                continue
+            yield url, page
+
+
 def parse_tables_from_url(url):
+    return _parse_page(url, fetch_page(url))
+
+
+def _parse_page(url, page):
+    with stage("parse_page", url):
+        tables = parse_tables_from_html(page)
+    count("rows_parsed", sum(len(table) for _, table in tables), url=url)
+    return tables
+
+
+def parse_tables_from_html(html, backend="tables"):
+    # backend="tables" builds only the <table> subtrees, "lxml" does the same on top
+    # of lxml's faster tokenizer, and "soup" is the full bs4 tree.
+    if backend in ("tables", "lxml"):
+        tree = parse_table_tree(html, use_lxml=backend == "lxml")
+    elif backend == "soup":
+        from bs4 import BeautifulSoup
+        tree = BeautifulSoup(html, "html.parser")
+    else:
+        raise ValueError(f"Unknown parser backend: {backend}")
     parsed = []
-    tables = find_tables(soupify_page(url))
+    tables = find_tables(tree)
     for table in tables:
         content, caption = parse_table(table)
         parsed.append((caption, content))
     return parsed
 
 
+def fetch_page(url):
+    with stage("fetch_page", url):
+        if _page_cache is not None:
+            page = _page_cache.fetch(url)
+        else:
+            with urlopen(Request(url)) as response:
+                page = response.read()
+    count("bytes_fetched", len(page), url=url)
+    return page
+
+
+@instrumented("soupify_page")
 def soupify_page(url):
-    soup = BeautifulSoup(urlopen(Request(url)), "html.parser")
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(fetch_page(url), "html.parser")
     return soup
 
 
-def find_tables(soup_obj: BeautifulSoup):
+def find_tables(soup_obj: "BeautifulSoup"):
     tables = soup_obj.find_all("table")
     return tables
 
 
-def parse_table(table_tag: Tag):
+@instrumented("parse_table")
+def parse_table(table_tag: "Tag"):
     header_re = re.compile("^Regimen(.Name)?")
 
     caption = table_tag.find("caption")
@@ -61,6 +207,7 @@ def parse_table(table_tag: Tag):
         cols = row.find_all("td")
         if len(cols) != 2:
             warn(f"Weird row: {row}")
+            count("warnings", category="weird_row")
             continue
 
         regimen, indications = cols
@@ -70,6 +217,7 @@ def parse_table(table_tag: Tag):
         indics = parse_indications(indications)
 
         parsed.append((regimen_name, regimen_link, indics))
+    count("tables_parsed")
     return parsed, caption
 
 
@@ -80,6 +228,8 @@ def parse_regimen(regimen_td_tag):
     regimen_name = name_results[0].string
     if regimen_name is None:
         regimen_name = re.sub("</?.+?>", "", str(name_results[0]))
+    else:
+        regimen_name = str(regimen_name)  # Drop NavigableString's reference to the tree.
 
     regimen_link = regimen_td_tag.find_all("a")
     regimen_link = regimen_link[0]["href"]
@@ -87,22 +237,25 @@ def parse_regimen(regimen_td_tag):
     return regimen_name, regimen_link
 
 
+@instrumented("parse_indications")
 def parse_indications(indication_td_tag):
     indics = {}
     entries = list(indication_td_tag.find_all("p"))
     current_id = None
     for entry in entries:
-        if (code_search := re.search(CODE_PATTERN, str(entry))) and entry.find("strong"):
+        if entry.find("strong") and (code_search := re.search(CODE_PATTERN, str(entry))):
             current_id = code_search[0]
             indics[current_id] = ""
             continue
         if current_id not in indics:
             warn(f"Skipped indication: '{current_id}' in entry: '{entry}'",
                  category=RuntimeWarning)
+            count("warnings", category="skipped_indication")
             continue
-        desc = str(entry)
+        desc = cell_text(entry)
+        if desc is None:
+            desc = re.sub(r"(<.+?>|</.+?>)", "", str(entry))
         desc = re.sub(r"\xa0", " ", desc)
-        desc = re.sub(r"(<.+?>|</.+?>)", "", desc)
         desc = desc.strip()
         if not desc.endswith("."):
             desc += "."
@@ -110,61 +263,151 @@ def parse_indications(indication_td_tag):
     return indics
 
 
+def cell_text(tag):
+    """Return str(tag) with its tags stripped, without rendering the markup.
+
+    Returns None when the shortcut could differ from stripping the rendered markup
+    (comments, script-like strings, or attribute values spanning lines).
+    """
+    from bs4 import NavigableString
+    pieces = []
+    for node in tag.descendants:
+        if isinstance(node, str):
+            if type(node) not in (str, NavigableString):
+                return None
+            pieces.append(node)
+        elif any("\n" in str(value) for value in node.attrs.values()):
+            return None
+    return html_escape("".join(pieces), quote=False)
+
+
+@instrumented("organize_parsed_tables")
 def organize_parsed_tables(parsed_data, harmonization_file=None):
     if harmonization_file is not None:
-        harmonization_dict = read_harmonization_file(harmonization_file)
+        harmonization_dict = RegimenHarmonizer.from_files(harmonization_file)
     else:
         harmonization_dict = None
     all_regimens = {}
     all_indications = {}
     for url, tables in parsed_data.items():
-        name = url.rstrip("/").rsplit("/")[-1]
-        name = re.sub(r"%20", " ", name)
-        for table_name, table in tables:
-            disease = {name}
-            if table_name:
-                table_name = re.sub(r"\n.+", "", table_name)
-                disease.add(f"{name}:{table_name}")
-            for entry in table:
-                reg_name = fix_regimen_name(entry[0], harmonization_dict)
-                if reg_name not in all_regimens:
-                    drug_regimen = Regimen(reg_name)
-                    all_regimens[reg_name] = drug_regimen
-                else:
-                    drug_regimen = all_regimens[reg_name]
-                drug_regimen.diseases |= disease
-                source_url = entry[1]
-                indications = entry[2]
-                for code, desc in indications.items():
-                    if code in all_indications:
-                        indication = all_indications[code]
-                        if indication.description != desc:
-                            if (indication.description.lower().replace(" ", "") ==
-                                    desc.lower().replace(" ", "")):
-                                pass
-                            elif not indication.description:
-                                indication.description = desc
-                            else:
-                                warn(f"Indication description mismatch in indication {code}:"
-                                     f"\n1:  {indication.description}"
-                                     f"\n2:  {desc}")
-                                indication.description += f"\n{desc}"
-                        indication.regimens.add(drug_regimen)
-                        indication.diseases |= disease
-                    else:
-                        indication = Indication(code, desc, source_url,
-                                                {drug_regimen}, disease)
-                        all_indications[code] = indication
-                    drug_regimen.indication_codes.add(indication)
+        for entry in page_entries(url, tables, harmonization_dict):
+            merge_entry(entry, all_regimens, all_indications)
     return all_regimens, all_indications
 
 
+def page_entries(url, tables, harmonization_dict=None):
+    name = url.rstrip("/").rsplit("/")[-1]
+    name = re.sub(r"%20", " ", name)
+    for table_name, table in tables:
+        disease = {sys.intern(name)}  # Interned: shared by every object of the page.
+        if table_name:
+            table_name = re.sub(r"\n.+", "", table_name)
+            disease.add(sys.intern(f"{name}:{table_name}"))
+        for entry in table:
+            reg_name = fix_regimen_name(entry[0], harmonization_dict)
+            yield reg_name, disease, entry[1], entry[2]
+
+
+def page_keys(url, tables, harmonization_dict=None):
+    regimen_keys = {}
+    indication_keys = {}
+    for reg_name, _, _, indications in page_entries(url, tables, harmonization_dict):
+        regimen_keys[reg_name] = None
+        indication_keys.update(dict.fromkeys(indications))
+    return tuple(regimen_keys), tuple(indication_keys)
+
+
+def fingerprint_tables(tables):
+    return hashlib.sha1(json.dumps(tables).encode()).hexdigest()
+
+
+def description_fingerprint(description):
+    """Hash of a description ignoring case and whitespace."""
+    return hashlib.sha1("".join(description.casefold().split()).encode()).digest()
+
+
+ENTITY_FIELDS = {"indications": ("code", "description", "description_variants", "source_url",
+                                 "diseases", "regimens", "has_genetic_req",
+                                 "progression_flags", "biomarkers"),
+                 "regimens": ("description", "diseases", "indication_codes")}
+
+
+def entity_fields(kind, thing):
+    """JSON-able field values of a regimen or indication, links as sorted keys."""
+    fields = {}
+    for field in ENTITY_FIELDS[kind]:
+        value = getattr(thing, field)
+        if isinstance(value, (set, frozenset)):
+            value = sorted(link_name(x) for x in value)
+        elif isinstance(value, tuple):
+            value = list(value)
+        fields[field] = value
+    return fields
+
+
+def entity_hash(fields):
+    return hashlib.sha1(json.dumps(fields, sort_keys=True).encode()).hexdigest()
+
+
+def merge_entry(entry, all_regimens, all_indications, regimen_keys=None,
+                indication_keys=None, retracted_regimens=None,
+                retracted_indications=None):
+    # With regimen_keys/indication_keys set, only those objects are updated; links
+    # to the remaining (already complete) objects are simply re-added.
+    reg_name, disease, source_url, indications = entry
+    update_regimen = regimen_keys is None or reg_name in regimen_keys
+    if reg_name in all_regimens:
+        drug_regimen = all_regimens[reg_name]
+    elif retracted_regimens and reg_name in retracted_regimens:
+        drug_regimen = retracted_regimens.pop(reg_name)
+        all_regimens[reg_name] = drug_regimen
+    else:
+        drug_regimen = Regimen(reg_name)
+        all_regimens[reg_name] = drug_regimen
+    if update_regimen:
+        drug_regimen.diseases |= disease
+    for code, desc in indications.items():
+        if indication_keys is not None and code not in indication_keys:
+            if update_regimen:
+                indication = all_indications[code]
+                indication.regimens.add(drug_regimen)
+                drug_regimen.indication_codes.add(indication)
+            continue
+        if code in all_indications:
+            indication = all_indications[code]
+            if not indication.description:
+                indication.set_description(desc)
+            elif desc and indication.add_description_variant(desc):
+                warn(f"Indication description mismatch in indication {code}:"
+                     f"\n1:  {indication.description}"
+                     f"\n2:  {desc}")
+                count("warnings", category="description_mismatch")
+            indication.regimens.add(drug_regimen)
+            indication.diseases |= disease
+        elif retracted_indications and code in retracted_indications:
+            indication = retracted_indications.pop(code)
+            indication.set_description(desc)
+            indication.source_url = source_url
+            indication.regimens = {drug_regimen}
+            indication.diseases = set(disease)
+            all_indications[code] = indication
+        else:
+            indication = Indication(code, desc, source_url,
+                                    {drug_regimen}, set(disease))
+            all_indications[code] = indication
+        drug_regimen.indication_codes.add(indication)
+
+
 def fix_regimen_name(regimen_name, harmonization_dict=None):
     reg_name = regimen_name.strip().rstrip("*")
     reg_name = re.sub(r"\xa0", r" ", reg_name)  # Replace non-breaking spaces.
     reg_name = re.sub(r"–", r"-", reg_name)  # Replace em-dash with en-dash.
     reg_name = re.sub(r" ?- ?(?=\d)", r" - ", reg_name)  # Normalize duration hyphenation.
     reg_name = re.sub(r"(- \d+) ?days?$", r"\1 days", reg_name)  # Normalize 'days'.
+    if isinstance(harmonization_dict, RegimenHarmonizer):
+        reg_name = harmonization_dict.resolve(reg_name)
+    elif harmonization_dict:
+        reg_name = harmonization_dict.get(reg_name.lower(), reg_name)
     return reg_name
 
 
@@ -177,12 +420,35 @@ def read_harmonization_file(harmonization_file):
     return data
 
 
+def read_code_file(code_file):
+    """Return the set of codes listed one per line, re-read only if the file changed."""
+    stat = os.stat(code_file)
+    return _read_code_list(os.path.abspath(code_file), stat.st_mtime_ns, stat.st_size)
+
+
+def read_genetic_indication_file(genetic_indication_file):
+    return read_code_file(genetic_indication_file)
+
+
+@lru_cache(maxsize=8)
+def _read_code_list(path, mtime, size):
+    with open(path) as infile:
+        return frozenset(line.strip() for line in infile if line.strip())
+
+
 class Indication:
+    __slots__ = ("code", "description", "_variants", "source_url", "regimens", "diseases",
+                 "has_genetic_req", "progression_flags", "biomarkers")
+
     def __init__(self, code, description, source_url, regimens=None, diseases=None,
-                 has_genetic_req=None, progression_flags=None):
+                 has_genetic_req=None, progression_flags=None, biomarkers=None,
+                 description_variants=None):
         # From NCCP:
         self.code = code
-        self.description = description
+        self.set_description(description)
+        if description_variants is not None:
+            for variant in description_variants:
+                self.add_description_variant(variant)
         self.source_url = source_url
         self.regimens = regimens
         if self.regimens is None:
@@ -194,14 +460,55 @@ class Indication:
         # Custom:
         self.has_genetic_req = has_genetic_req
         self.progression_flags = progression_flags
+        self.biomarkers = biomarkers
 
     def __repr__(self):
         string = (f"Indication(code='{self.code}', description='{self.description}', "
                   f"diseases={self.diseases})")
         return string
 
+    @property
+    def auto_genetic_req(self):
+        """Whether the description names a biomarker, None until classified."""
+        return None if self.biomarkers is None else bool(self.biomarkers)
+
+    @property
+    def description_variants(self):
+        """Every differently worded description seen, the description first."""
+        if self._variants is not None:
+            return list(self._variants.values())
+        return [self.description] if self.description else []
+
+    def set_description(self, description):
+        """Make description the only known variant."""
+        self.description = description
+        self._variants = None
+
+    def add_description_variant(self, description):
+        """Record a differently worded description; return whether it was new.
+
+        Variants differing only in case or whitespace count as the same. The
+        first variant stays the description. Variants are only kept, keyed by
+        description_fingerprint, once a second one turns up.
+        """
+        if not self.description:
+            self.set_description(description)
+            return bool(description)
+        fingerprint = description_fingerprint(description)
+        if self._variants is None:
+            first = description_fingerprint(self.description)
+            if fingerprint == first:
+                return False
+            self._variants = {first: self.description}
+        elif fingerprint in self._variants:
+            return False
+        self._variants[fingerprint] = description
+        return True
+
 
 class Regimen:
+    __slots__ = ("description", "indication_codes", "diseases")
+
     def __init__(self, description, indication_codes=None, diseases=None):
         self.description = description
         self.indication_codes = indication_codes
@@ -228,10 +535,34 @@ class Regimen:
 
 
 class NCCP_Chemotherapy_Database:
+    SEARCH_FIELDS = {"regimens": ("description", "diseases", "indication_codes"),
+                     "indications": ("code", "description", "diseases", "regimens")}
+
     def __init__(self, regimens, indications):
         self.regimens = regimens
         self.indications = indications
 
+        # Per-page state used for incremental refreshes:
+        self.harmonizer = None
+        self.pages = {}
+        self.fingerprints = {}
+        self._page_keys = {}
+        self._regimen_pages = {}
+        self._indication_pages = {}
+        self._snapshot = None
+        self._search_indexes = {}
+        self._graph = None
+
+    @classmethod
+    def from_parsed_tables(cls, parsed_data, harmonization_file=None, canonical_file=None,
+                           harmonizer=None):
+        database = cls({}, {})
+        if harmonizer is None and (harmonization_file or canonical_file) is not None:
+            harmonizer = RegimenHarmonizer.from_files(harmonization_file, canonical_file)
+        database.harmonizer = harmonizer
+        database.update(parsed_data)
+        return database
+
     def __str__(self):
         string = (f"NCCP_Regimen_Database:"
                   f"\n  Regimens: {len(self.regimens)}"
@@ -256,54 +587,350 @@ class NCCP_Chemotherapy_Database:
         results = []
         for thing in sublist:
             for field in fields:
-                field_value = getattr(thing, field)
-                if isinstance(field_value, (list, tuple, set)):
-                    field_value = ", ".join([str(x) for x in list(field_value)])
-                if re.search(search_text, field_value):
+                if re.search(search_text, field_text(thing, field)):
                     results.append(thing)
                     break
         return results
 
-    def search_regimens(self, search_text, fields=None):
-        accepted = {"description", "diseases", "indication_codes"}
+    def search_index(self, kind):
+        """Return the SearchIndex over "regimens" or "indications", building it once."""
+        if kind not in self._search_indexes:
+            fields = self.SEARCH_FIELDS[kind]
+            self._search_indexes[kind] = SearchIndex(getattr(self, kind), fields)
+        return self._search_indexes[kind]
+
+    def _indexed_search(self, kind, search_text, fields, limit, rank, tokens):
+        index = self.search_index(kind)
+        if tokens:
+            matches = index.tokens(search_text, fields)
+        elif is_literal(search_text):
+            matches = index.substring(search_text, fields)
+        else:
+            matches = index.regex(search_text, fields)
+        return index.order(matches, rank=rank, limit=limit)
+
+    @instrumented("search_regimens")
+    def search_regimens(self, search_text, fields=None, limit=None, rank=False,
+                        tokens=False):
+        """Search regimens by regex, plain substring or (tokens=True) word tokens.
+
+        Linked indications are matched by code. Plain substring and token queries
+        are answered from the search index; results can be ranked and limited.
+        """
+        accepted = set(self.SEARCH_FIELDS["regimens"])
         fields = self._validate_search_fields(fields, accepted)
-        results = self._search(self.regimens.values(), search_text, fields)
+        results = self._indexed_search("regimens", search_text, fields, limit, rank,
+                                       tokens)
         return results
 
-    def search_indications(self, search_text, fields=None):
-        accepted = {"code", "description", "diseases", "regimens"}
+    @instrumented("search_indications")
+    def search_indications(self, search_text, fields=None, limit=None, rank=False,
+                           tokens=False):
+        """Search indications like search_regimens; linked regimens match by name."""
+        accepted = set(self.SEARCH_FIELDS["indications"])
         fields = self._validate_search_fields(fields, accepted)
-        results = self._search(self.indications.values(), search_text, fields)
+        results = self._indexed_search("indications", search_text, fields, limit, rank,
+                                       tokens)
+        return results
+
+    @instrumented("search_many")
+    def search_many(self, patterns, kind="indications", fields=None, ignore_case=False):
+        """Match many patterns against regimens or indications in a single pass.
+
+        Literal patterns share one Aho-Corasick automaton and regexes share one
+        combined alternation. Returns {pattern: [matching objects]}.
+        """
+        if kind not in self.SEARCH_FIELDS:
+            raise ValueError(f"Unknown search target: {kind}")
+        fields = self._validate_search_fields(fields, set(self.SEARCH_FIELDS[kind]))
+        patterns = list(dict.fromkeys(patterns))
+        matcher = MultiPatternMatcher(patterns, ignore_case=ignore_case)
+        index = self.search_index(kind)
+        objects = getattr(self, kind)
+        results = {pattern: [] for pattern in patterns}
+        for key, texts in index.texts(fields):
+            found = set()
+            for text in texts:
+                found |= matcher.matches(text)
+            for i in found:
+                results[patterns[i]].append(objects[key])
         return results
 
+    @instrumented("update")
+    def update(self, parsed_data):
+        """Merge freshly parsed pages, re-merging only pages whose tables changed.
+
+        Objects touched by the old or new version of a changed page are retracted
+        and rebuilt by replaying, in page order, only the pages that mention them.
+        The result is identical to a full rebuild. Returns the changed URLs.
+        """
+        if self._snapshot is not None:
+            self._snapshot.materialize(self)
+        fingerprints = {url: fingerprint_tables(tables)
+                        for url, tables in parsed_data.items()}
+        kept = [url for url in self.pages if url in fingerprints]
+        if kept != [url for url in fingerprints if url in self.pages]:
+            changed = list(fingerprints)  # Page order changed; merge order matters.
+        else:
+            changed = [url for url, print_ in fingerprints.items()
+                       if self.fingerprints.get(url) != print_]
+        removed = [url for url in self.pages if url not in fingerprints]
+        if not changed and not removed:
+            return []
+
+        self.pages = dict(parsed_data)
+        self.fingerprints = fingerprints
+        self._remerge(changed, removed)
+        return changed + removed
+
+    def _remerge(self, changed, removed):
+        # Retract the objects named by the old or new version of each changed or
+        # removed page (self.pages already holds the new versions) and rebuild
+        # them by replaying the pages that mention them.
+        regimen_keys, indication_keys = set(), set()
+        for url in removed + changed:
+            old_regimens, old_indications = self._page_keys.get(url, ((), ()))
+            for key in old_regimens:
+                self._regimen_pages[key].discard(url)
+            for key in old_indications:
+                self._indication_pages[key].discard(url)
+            regimen_keys.update(old_regimens)
+            indication_keys.update(old_indications)
+        for url in removed:
+            self._page_keys.pop(url, None)
+        for url in changed:
+            new_regimens, new_indications = page_keys(url, self.pages[url],
+                                                      self.harmonizer)
+            self._page_keys[url] = new_regimens, new_indications
+            for key in new_regimens:
+                self._regimen_pages.setdefault(key, set()).add(url)
+            for key in new_indications:
+                self._indication_pages.setdefault(key, set()).add(url)
+            regimen_keys.update(new_regimens)
+            indication_keys.update(new_indications)
+        if list(self._page_keys) != list(self.pages):
+            self._page_keys = {url: self._page_keys[url] for url in self.pages}
+
+        retracted_regimens = {}
+        for key in regimen_keys:
+            if (regimen := self.regimens.pop(key, None)) is not None:
+                regimen.indication_codes.clear()
+                regimen.diseases.clear()
+                retracted_regimens[key] = regimen
+        retracted_indications = {}
+        for key in indication_keys:
+            if (indication := self.indications.pop(key, None)) is not None:
+                retracted_indications[key] = indication
+
+        replayed = set()
+        for key in regimen_keys:
+            replayed |= self._regimen_pages.get(key, set())
+        for key in indication_keys:
+            replayed |= self._indication_pages.get(key, set())
+        for url in self.pages:
+            if url not in replayed:
+                continue
+            for entry in page_entries(url, self.pages[url], self.harmonizer):
+                merge_entry(entry, self.regimens, self.indications, regimen_keys,
+                            indication_keys, retracted_regimens, retracted_indications)
+        self._restore_page_order()
+        self._reindex(regimen_keys, indication_keys)
+
+    @instrumented("add_page")
+    def add_page(self, url, tables):
+        """Merge one parsed page, as update() would with the page added or replaced."""
+        if self._snapshot is not None:
+            self._snapshot.materialize(self)
+        if url in self.pages:
+            # Only this page's fingerprint and keys change; the rest stay as they are.
+            fingerprint = fingerprint_tables(tables)
+            if self.fingerprints.get(url) != fingerprint:
+                self.pages[url] = tables
+                self.fingerprints[url] = fingerprint
+                self._remerge([url], [])
+            return
+        # A new page comes last in page order, so merging it on top of the current
+        # objects gives the same result as a full rebuild.
+        regimen_keys, indication_keys = page_keys(url, tables, self.harmonizer)
+        self.pages[url] = tables
+        self.fingerprints[url] = fingerprint_tables(tables)
+        self._page_keys[url] = regimen_keys, indication_keys
+        for key in regimen_keys:
+            self._regimen_pages.setdefault(key, set()).add(url)
+        for key in indication_keys:
+            self._indication_pages.setdefault(key, set()).add(url)
+        for entry in page_entries(url, tables, self.harmonizer):
+            merge_entry(entry, self.regimens, self.indications)
+        self._reindex(regimen_keys, indication_keys)
+
+    def set_harmonizer(self, harmonizer):
+        """Resolve regimen names with harmonizer, re-merging every page if it changed."""
+        if self._snapshot is not None:
+            self._snapshot.materialize(self)
+        state = harmonizer.state() if harmonizer is not None else None
+        current = self.harmonizer.state() if self.harmonizer is not None else None
+        if state == current:
+            return
+        self.harmonizer = harmonizer
+        self._remerge(list(self.pages), [])
+
+    def fold(self, records, prune=False, keep=()):
+        """Merge (url, caption, row) records from stream_parsed_rows page by page.
+
+        Yields each URL once its page has been merged, so the database can be
+        queried while later pages are still being fetched. With prune=True, pages
+        absent from records are dropped once they are exhausted, except those in
+        `keep` (e.g. the failures of stream_parsed_rows), which keep their
+        previous tables and place.
+        """
+        seen = []
+        for url, page_records in groupby(records, key=itemgetter(0)):
+            tables = []
+            for _, caption, row in page_records:
+                if row is None:
+                    tables.append((caption, []))
+                else:
+                    tables[-1][1].append(row)
+            self.add_page(url, tables)
+            seen.append(url)
+            yield url
+        if prune:
+            keep = set(keep).union(seen)
+            if len(keep) > len(seen):
+                seen = [url for url in self.pages if url in keep]
+            self.update({url: self.pages[url] for url in seen})
+
+    def _reindex(self, regimen_keys, indication_keys):
+        for kind, keys in (("regimens", regimen_keys), ("indications", indication_keys)):
+            if kind in self._search_indexes:
+                self._search_indexes[kind].objects = getattr(self, kind)
+                self._search_indexes[kind].reindex(keys)
+        self._graph = None
+
+    def graph(self):
+        """Sparse regimen-indication-disease graph, built on first use."""
+        if self._graph is None:
+            from nccp_graph import RegimenGraph
+            self._graph = RegimenGraph.from_database(self)
+        return self._graph
+
+    def regimen_drugs(self, drug_index):
+        """Join regimens to the drugs they name, see nccp_drugs.DrugIndex.join."""
+        return drug_index.join(self.regimens.values())
+
+    def compact(self):
+        """Return a read-only, memory-compact copy of the database."""
+        from nccp_compact import CompactChemotherapyDatabase
+        return CompactChemotherapyDatabase(self)
+
+    def save(self, path):
+        """Save a snapshot of the database, links and per-page state included."""
+        from nccp_snapshot import save_snapshot
+        save_snapshot(self, path)
+
+    @classmethod
+    def load(cls, path, lazy=True):
+        """Load a snapshot written by save(); objects are built on access if lazy."""
+        from nccp_snapshot import load_snapshot
+        return load_snapshot(path, cls, lazy=lazy)
+
+    def close(self):
+        """Close the snapshot file behind a lazily loaded database.
+
+        Objects not built yet can no longer be looked up afterwards. Does nothing
+        for in-memory or fully materialized databases.
+        """
+        if self._snapshot is not None:
+            self._snapshot.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _restore_page_order(self):
+        # Key-only pass so dict order matches a full rebuild (first appearance).
+        regimens, indications = {}, {}
+        for regimen_keys, indication_keys in self._page_keys.values():
+            for key in regimen_keys:
+                if key not in regimens:
+                    regimens[key] = self.regimens[key]
+            for key in indication_keys:
+                if key not in indications:
+                    indications[key] = self.indications[key]
+        self.regimens = regimens
+        self.indications = indications
+
     def add_genetic_classification(self, genetic_indication_file):
-        with open(genetic_indication_file) as infile:
-            gen_inds = infile.readlines()
-        gen_inds = {x.strip() for x in gen_inds}
+        gen_inds = read_genetic_indication_file(genetic_indication_file)
         for indication in self.indications.values():
             indication.has_genetic_req = indication.code in gen_inds
         return
 
-    def tabulate_indications(self):
-        table = []
-        for ind in self.indications.values():
-            entry = [ind.code, ind.description, ", ".join(ind.diseases),
-                     ", ".join([reg.description for reg in ind.regimens]),
-                     ind.source_url]
-            table.append(entry)
-        table = pd.DataFrame(table, columns=["Code", "Indication", "Categories",
-                                             "Regimen", "URL"])
-        table = table.set_index("Code")
+    def classify_genetic_requirements(self, classifier, genetic_indication_file=None,
+                                      override=False):
+        """Flag indications naming a biomarker, see nccp_genetics.GeneticClassifier.
+
+        Sets biomarkers (and so auto_genetic_req) on every indication; the curated
+        has_genetic_req is only replaced if override is set. If a manual
+        genetic_indication_file is given, returns the agreement report with it.
+        """
+        classifier.classify(self.indications.values(), override=override)
+        if genetic_indication_file is not None:
+            return classifier.agreement(self.indications.values(),
+                                        read_genetic_indication_file(genetic_indication_file))
+
+    def indication_columns(self, columns=None):
+        """Return {column: values} for the indication table, built column-wise."""
+        from nccp_export import indication_columns
+        return indication_columns(self.indications.values(), columns)
+
+    def iter_indication_rows(self, columns=None):
+        """Yield indication table rows one at a time, without building the table."""
+        from nccp_export import iter_indication_rows
+        return iter_indication_rows(self.indications.values(), columns)
+
+    def tabulate_indications(self, columns=None):
+        import pandas as pd
+        table = pd.DataFrame(self.indication_columns(columns))
+        if "Code" in table:
+            table = table.set_index("Code")
         return table
 
-
-def main(harmonization_file):
-    urls = get_chemoprotocol_urls()
-    data = parse_tables_from_all_urls(urls)
-    data = organize_parsed_tables(data, harmonization_file)
-    data = NCCP_Chemotherapy_Database(*data)
-    return data
+    def export_indications(self, path, fmt=None, columns=None, **kwargs):
+        """Stream the indication table to path as TSV, JSONL, Parquet or Arrow.
+
+        fmt defaults to the format implied by the file extension. Parquet and
+        Arrow are written in batches (batch_size) and need pyarrow installed.
+        """
+        from pathlib import Path
+        from nccp_export import EXPORT_FORMATS, WRITERS
+        if fmt is None:
+            fmt = EXPORT_FORMATS.get(Path(path).suffix.lower())
+        if fmt not in WRITERS:
+            raise ValueError(f"Unknown export format for {path}; "
+                             f"use one of {list(WRITERS)}.")
+        WRITERS[fmt](self.indications.values(), path, columns, **kwargs)
+
+
+def main(harmonization_file, max_workers=None, page_cache=None, previous=None):
+    if page_cache is not None:
+        set_page_cache(page_cache)
+    database = previous
+    if database is None:
+        database = NCCP_Chemotherapy_Database.from_parsed_tables({}, harmonization_file)
+    elif harmonization_file is not None:
+        database.set_harmonizer(RegimenHarmonizer.from_files(harmonization_file))
+    failures = {}
+    records = stream_parsed_rows(get_chemoprotocol_urls(), max_workers=max_workers,
+                                 failures=failures)
+    for _ in database.fold(records, prune=True, keep=failures):
+        pass
+    return database
 
 
 if __name__ == "__main__":
-    nccp_database = main("/home/tyler/Documents/Projects/PersonalizedMedicine/NCCP_Cancer_Regimens/harmonization.tsv")
+    from nccp import main as cli
+    # Same arguments as nccp.py; with none, refresh the default database.
+    sys.exit(cli(sys.argv[1:] or ["refresh"]))
@@ -0,0 +1,260 @@
+import sys
+from array import array
+from collections.abc import Mapping
+
+from nccp_chemotherapy_regimens import NCCP_Chemotherapy_Database
+
+GENETIC_CODES = {None: -1, False: 0, True: 1}
+GENETIC_VALUES = {code: value for value, code in GENETIC_CODES.items()}
+
+
+class Vocabulary:
+    """Integer coding for a set of (interned) strings."""
+
+    __slots__ = ("values", "ids")
+
+    def __init__(self):
+        self.values = []
+        self.ids = {}
+
+    def __len__(self):
+        return len(self.values)
+
+    def encode(self, value):
+        if value not in self.ids:
+            self.ids[value] = len(self.values)
+            self.values.append(sys.intern(value) if isinstance(value, str) else value)
+        return self.ids[value]
+
+
+def _csr(rows):
+    # Compressed sparse rows: row i's entries are indices[indptr[i]:indptr[i + 1]].
+    indptr, indices = array("I", [0]), array("I")
+    for row in rows:
+        indices.extend(sorted(row))
+        indptr.append(len(indices))
+    return indptr, indices
+
+
+class CompactIndication:
+    __slots__ = ("_database", "_id")
+
+    def __init__(self, database, id_):
+        self._database = database
+        self._id = id_
+
+    def __eq__(self, other):
+        return (isinstance(other, CompactIndication) and other._id == self._id
+                and other._database is self._database)
+
+    def __hash__(self):
+        return hash(self.code)
+
+    def __repr__(self):
+        string = (f"Indication(code='{self.code}', description='{self.description}', "
+                  f"diseases={self.diseases})")
+        return string
+
+    @property
+    def code(self):
+        return self._database._codes.values[self._id]
+
+    @property
+    def description(self):
+        return self._database._descriptions[self._id]
+
+    @property
+    def source_url(self):
+        return self._database._urls.values[self._database._indication_urls[self._id]]
+
+    @property
+    def description_variants(self):
+        description = self.description
+        return self._database._description_variants.get(
+            self._id, (description,) if description else ())
+
+    @property
+    def regimens(self):
+        database = self._database
+        return frozenset(CompactRegimen(database, i) for i in
+                         database._row(database._indication_regimens, self._id))
+
+    @property
+    def diseases(self):
+        database = self._database
+        return frozenset(database._diseases.values[i] for i in
+                         database._row(database._indication_diseases, self._id))
+
+    @property
+    def has_genetic_req(self):
+        return GENETIC_VALUES[self._database._genetic[self._id]]
+
+    @property
+    def progression_flags(self):
+        return self._database._progression_flags.get(self._id)
+
+    @property
+    def biomarkers(self):
+        return self._database._biomarkers.get(self._id)
+
+    @property
+    def auto_genetic_req(self):
+        biomarkers = self.biomarkers
+        return None if biomarkers is None else bool(biomarkers)
+
+
+class CompactRegimen:
+    __slots__ = ("_database", "_id")
+
+    def __init__(self, database, id_):
+        self._database = database
+        self._id = id_
+
+    def __eq__(self, other):
+        return (isinstance(other, CompactRegimen) and other._id == self._id
+                and other._database is self._database)
+
+    def __hash__(self):
+        return hash(self.description)
+
+    def __repr__(self):
+        string = (f"Regimen(description='{self.description}', "
+                  f"indication_codes={self.indication_codes}, "
+                  f"diseases={self.diseases})")
+        return string
+
+    @property
+    def description(self):
+        return self._database._regimen_names.values[self._id]
+
+    @property
+    def indication_codes(self):
+        database = self._database
+        return frozenset(CompactIndication(database, i) for i in
+                         database._row(database._regimen_indications, self._id))
+
+    @property
+    def diseases(self):
+        database = self._database
+        return frozenset(database._diseases.values[i] for i in
+                         database._row(database._regimen_diseases, self._id))
+
+
+class _CompactMapping(Mapping):
+    def __init__(self, vocabulary, view_class, database):
+        self._vocabulary = vocabulary
+        self._view_class = view_class
+        self._database = database
+
+    def __getitem__(self, key):
+        return self._view_class(self._database, self._vocabulary.ids[key])
+
+    def __contains__(self, key):
+        return key in self._vocabulary.ids
+
+    def __iter__(self):
+        return iter(self._vocabulary.values)
+
+    def __len__(self):
+        return len(self._vocabulary)
+
+
+class CompactChemotherapyDatabase(NCCP_Chemotherapy_Database):
+    """Read-only NCCP database stored as integer-coded vocabularies and arrays.
+
+    Strings are interned and stored once; regimen-indication and disease links
+    are compressed sparse rows of array("I"). regimens/indications map keys to
+    lightweight views exposing the usual Regimen/Indication attributes, with
+    link and disease sets returned as frozensets. Per-page state is not kept, so
+    methods that merge pages or save a snapshot raise TypeError.
+    """
+
+    def __init__(self, database):
+        super().__init__({}, {})
+        regimens = list(database.regimens.values())
+        indications = list(database.indications.values())
+        self._diseases = Vocabulary()
+        self._urls = Vocabulary()
+        self._regimen_names = Vocabulary()
+        self._codes = Vocabulary()
+        for regimen in regimens:
+            self._regimen_names.encode(regimen.description)
+        for indication in indications:
+            self._codes.encode(indication.code)
+        self._descriptions = [sys.intern(ind.description) for ind in indications]
+        self._description_variants = {i: tuple(ind.description_variants)
+                                      for i, ind in enumerate(indications)
+                                      if len(ind.description_variants) > 1}
+        self._indication_urls = array("I", [self._urls.encode(ind.source_url)
+                                            for ind in indications])
+        self._genetic = array("b", [GENETIC_CODES[ind.has_genetic_req]
+                                    for ind in indications])
+        self._progression_flags = {i: ind.progression_flags
+                                   for i, ind in enumerate(indications)
+                                   if ind.progression_flags is not None}
+        self._biomarkers = {i: ind.biomarkers for i, ind in enumerate(indications)
+                            if ind.biomarkers is not None}
+        self._regimen_indications = _csr(
+            [self._codes.ids[ind.code] for ind in reg.indication_codes] for reg in regimens)
+        self._indication_regimens = _csr(
+            [self._regimen_names.ids[reg.description] for reg in ind.regimens]
+            for ind in indications)
+        self._regimen_diseases = _csr(
+            [self._diseases.encode(disease) for disease in reg.diseases] for reg in regimens)
+        self._indication_diseases = _csr(
+            [self._diseases.encode(disease) for disease in ind.diseases]
+            for ind in indications)
+        self.harmonizer = database.harmonizer
+        self.regimens = _CompactMapping(self._regimen_names, CompactRegimen, self)
+        self.indications = _CompactMapping(self._codes, CompactIndication, self)
+
+    @staticmethod
+    def _row(csr, i):
+        indptr, indices = csr
+        return indices[indptr[i]:indptr[i + 1]]
+
+    def indication_columns(self, columns=None):
+        """Columns read straight from the vocabularies and CSR arrays."""
+        from nccp_export import _validate_columns
+        diseases, names, urls = (self._diseases.values, self._regimen_names.values,
+                                 self._urls.values)
+        rows = range(len(self._codes))
+        builders = {
+            "Code": lambda: list(self._codes.values),
+            "Indication": lambda: list(self._descriptions),
+            "Categories": lambda: [", ".join([diseases[j] for j in
+                                              self._row(self._indication_diseases, i)])
+                                   for i in rows],
+            "Regimen": lambda: [", ".join([names[j] for j in
+                                           self._row(self._indication_regimens, i)])
+                                for i in rows],
+            "URL": lambda: [urls[j] for j in self._indication_urls],
+            "Description Variants": lambda: [
+                "\n".join(self._description_variants.get(i, ())[1:]) for i in rows],
+        }
+        return {column: builders[column]() for column in _validate_columns(columns)}
+
+    def update(self, parsed_data):
+        raise TypeError("Compact databases are read-only; update the source database "
+                        "and call compact() again.")
+
+    def add_page(self, url, tables):
+        raise TypeError("Compact databases are read-only; add the page to the source "
+                        "database and call compact() again.")
+
+    def fold(self, records, prune=False, keep=()):
+        raise TypeError("Compact databases are read-only; fold records into the source "
+                        "database and call compact() again.")
+
+    def set_harmonizer(self, harmonizer):
+        raise TypeError("Compact databases are read-only.")
+
+    def save(self, path):
+        raise TypeError("Compact databases keep no per-page state; save the source "
+                        "database instead.")
+
+    def add_genetic_classification(self, genetic_indication_file):
+        raise TypeError("Compact databases are read-only.")
+
+    def classify_genetic_requirements(self, classifier, genetic_indication_file=None):
+        raise TypeError("Compact databases are read-only.")
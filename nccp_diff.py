@@ -0,0 +1,106 @@
+import os
+from collections import Counter
+
+from nccp_chemotherapy_regimens import (NCCP_Chemotherapy_Database, entity_fields,
+                                        entity_hash, read_code_file)
+
+KINDS = ("indications", "regimens")
+SET_FIELDS = frozenset({"diseases", "regimens", "indication_codes"})
+
+
+class BuildDigest:
+    """Content hash of every indication and regimen in one database build.
+
+    Snapshots store the hashes, so digesting a saved build reads two columns and
+    builds no objects; in-memory databases are hashed once here. Field values
+    are only looked up for entities whose hashes differ.
+    """
+
+    def __init__(self, database):
+        self.database = database
+        reader = getattr(database, "_snapshot", None)
+        if reader is not None:
+            self.hashes = {kind: reader.hashes(kind) for kind in KINDS}
+        else:
+            self.hashes = {kind: {key: entity_hash(entity_fields(kind, thing))
+                                  for key, thing in getattr(database, kind).items()}
+                           for kind in KINDS}
+
+    @classmethod
+    def of(cls, build):
+        """Digest a database or snapshot path; digests are returned as they are."""
+        if isinstance(build, cls):
+            return build
+        if isinstance(build, (str, os.PathLike)):
+            build = NCCP_Chemotherapy_Database.load(build)
+        return cls(build)
+
+    def __repr__(self):
+        return (f"BuildDigest(indications={len(self.hashes['indications'])}, "
+                f"regimens={len(self.hashes['regimens'])})")
+
+    def fields(self, kind, key):
+        return entity_fields(kind, getattr(self.database, kind)[key])
+
+
+def field_changes(old, new):
+    """{field: change} for differing fields; links as added/removed keys."""
+    changes = {}
+    for field, value in new.items():
+        if old[field] == value:
+            continue
+        if field in SET_FIELDS:
+            changes[field] = {"added": sorted(set(value) - set(old[field])),
+                              "removed": sorted(set(old[field]) - set(value))}
+        else:
+            changes[field] = {"old": old[field], "new": value}
+    return changes
+
+
+def diff(old, new, code_file=None):
+    """Changefeed from build old to build new (databases, snapshot paths or digests).
+
+    Returns {"changes": [...], "summary": {...}} where each change is a dict of
+    kind, key, change ("added", "removed" or "modified") and fields: all field
+    values for additions and removals, field_changes() for modifications. With
+    a code_file such as all_indication_codes.txt, listed codes absent from new
+    are reported as missing_codes and scraped codes it lacks as unlisted_codes.
+    """
+    old, new = BuildDigest.of(old), BuildDigest.of(new)
+    changes = []
+    summary = {kind: Counter(added=0, removed=0, modified=0) for kind in KINDS}
+    for kind in KINDS:
+        before, after = old.hashes[kind], new.hashes[kind]
+        for key, digest in after.items():
+            previous = before.get(key)
+            if previous == digest:
+                continue
+            if previous is None:
+                change, fields = "added", new.fields(kind, key)
+            else:
+                change = "modified"
+                fields = field_changes(old.fields(kind, key), new.fields(kind, key))
+            changes.append({"kind": kind, "key": key, "change": change, "fields": fields})
+            summary[kind][change] += 1
+        for key in before:
+            if key not in after:
+                changes.append({"kind": kind, "key": key, "change": "removed",
+                                "fields": old.fields(kind, key)})
+                summary[kind]["removed"] += 1
+    report = {"changes": changes, "summary": {kind: dict(counts)
+                                              for kind, counts in summary.items()}}
+    if code_file is not None:
+        listed, scraped = read_code_file(code_file), new.hashes["indications"].keys()
+        report["missing_codes"] = sorted(listed - scraped)
+        report["unlisted_codes"] = sorted(scraped - listed)
+    return report
+
+
+def changefeed(builds, code_file=None):
+    """Yield diff() of each consecutive pair of builds, digesting every build once."""
+    previous = None
+    for build in builds:
+        current = BuildDigest.of(build)
+        if previous is not None:
+            yield diff(previous, current, code_file)
+        previous = current
@@ -0,0 +1,111 @@
+import re
+
+import pandas as pd
+
+TAG_PATTERN = re.compile(r"<[^>]+>")
+TOKEN_PATTERN = re.compile(r"[^\W_]+")
+FLAG_COLUMNS = ("EMA", "FDA", "EN", "WHO", "Generic")
+LIST_COLUMNS = ("Indications", "Targets")
+JOIN_COLUMNS = ("Regimen", "Drug", "DrugBank ID", "ATC", "ChEMBL", "Targets")
+
+
+def name_tokens(name):
+    """Case-folded alphanumeric tokens, e.g. "Nab-Paclitaxel" -> ("nab", "paclitaxel")."""
+    return tuple(TOKEN_PATTERN.findall(name.casefold()))
+
+
+def read_drug_database(path):
+    """Load cancerdrugsdb.txt as a typed DataFrame indexed by product name.
+
+    HTML links are reduced to their text, Y/N flags become booleans, Year a
+    nullable integer, Last Update a date, and the "; "-separated Indications
+    and Targets columns tuples.
+    """
+    table = pd.read_csv(path, sep="\t", dtype=str, keep_default_na=False)
+    table = table.loc[:, [column for column in table.columns
+                          if column and not column.startswith("Unnamed")]]
+    for column in table.columns:
+        table[column] = table[column].str.replace(TAG_PATTERN, "", regex=True).str.strip()
+    for column in FLAG_COLUMNS:
+        table[column] = table[column] == "Y"
+    table["Year"] = pd.to_numeric(table["Year"].replace("", None)).astype("Int16")
+    table["Last Update"] = pd.to_datetime(table["Last Update"], format="%d/%m/%Y",
+                                          errors="coerce")
+    for column in ("Other", "ATC"):
+        table[column] = table[column].astype("category")
+    for column in LIST_COLUMNS:
+        table[column] = [tuple(item for item in value.split("; ") if item)
+                         for value in table[column]]
+    return table.set_index("Product")
+
+
+class DrugIndex:
+    """Case-folded drug-name index for finding the drugs named in regimen descriptions.
+
+    Product names (and any extra synonyms, mapped to products) are indexed as
+    token sequences keyed by their first token. A description is scanned once,
+    taking the longest name starting at each token, so "Nab-Paclitaxel" wins
+    over "Paclitaxel". Matches are memoized per description, so joining again
+    after regimens are added only scans the new ones.
+    """
+
+    def __init__(self, drugs, synonyms=None):
+        self.drugs = drugs
+        self._names = {}
+        self._matches = {}
+        self._rows = {product: (row["DrugBank ID"], row["ATC"], row["ChEMBL"],
+                                "; ".join(row["Targets"]))
+                      for product, row in drugs.iterrows()}
+        for product in drugs.index:
+            self.add_synonym(product, product)
+        for synonym, product in (synonyms or {}).items():
+            self.add_synonym(synonym, product)
+
+    @classmethod
+    def from_file(cls, path, synonyms=None):
+        return cls(read_drug_database(path), synonyms)
+
+    def __repr__(self):
+        return f"DrugIndex(drugs={len(self.drugs)}, cached={len(self._matches)})"
+
+    def add_synonym(self, name, product):
+        if product not in self.drugs.index:
+            raise KeyError(f"Unknown product {product!r}")
+        tokens = name_tokens(name)
+        if not tokens:
+            return
+        candidates = self._names.setdefault(tokens[0], [])
+        candidates.append((tokens, product))
+        candidates.sort(key=lambda candidate: -len(candidate[0]))
+        self._matches.clear()
+
+    def drugs_in(self, description):
+        """Return the products named in description, in order of appearance."""
+        if (found := self._matches.get(description)) is not None:
+            return found
+        tokens = name_tokens(description)
+        found, position = [], 0
+        while position < len(tokens):
+            for names, product in self._names.get(tokens[position], ()):
+                if tokens[position:position + len(names)] == names:
+                    if product not in found:
+                        found.append(product)
+                    position += len(names)
+                    break
+            else:
+                position += 1
+        self._matches[description] = found = tuple(found)
+        return found
+
+    def join(self, regimens):
+        """Regimen -> drug -> targets table, one row per regimen and drug.
+
+        regimens may be regimen names, Regimen objects or a database's regimens
+        mapping. Regimens naming no known drug are left out.
+        """
+        rows = []
+        for regimen in regimens:
+            name = getattr(regimen, "description", regimen)
+            rows.extend((name, product, *self._rows[product])
+                        for product in self.drugs_in(name))
+        return pd.DataFrame(rows, columns=list(JOIN_COLUMNS))
@@ -0,0 +1,137 @@
+import csv
+import json
+from contextlib import contextmanager
+from itertools import islice
+
+INDICATION_COLUMNS = ("Code", "Indication", "Categories", "Regimen", "URL")
+# Exported only when asked for by name, so the default keeps the table_export.tsv layout.
+OPTIONAL_COLUMNS = ("Description Variants",)
+COLUMN_VALUES = {
+    "Code": lambda ind: ind.code,
+    "Indication": lambda ind: ind.description,
+    # Other wordings of the description, one per line; usually empty.
+    "Description Variants": lambda ind: "\n".join(ind.description_variants[1:]),
+    "Categories": lambda ind: ", ".join(ind.diseases),
+    "Regimen": lambda ind: ", ".join([reg.description for reg in ind.regimens]),
+    "URL": lambda ind: ind.source_url,
+}
+EXPORT_FORMATS = {".tsv": "tsv", ".jsonl": "jsonl", ".parquet": "parquet",
+                  ".arrow": "arrow", ".feather": "arrow"}
+
+
+def _validate_columns(columns):
+    if columns is None:
+        return INDICATION_COLUMNS
+    columns = tuple(columns)
+    if unknown := set(columns) - set(INDICATION_COLUMNS) - set(OPTIONAL_COLUMNS):
+        raise ValueError(f"Unknown export columns: {unknown}")
+    return columns
+
+
+def indication_columns(indications, columns=None):
+    """Build {column: values} one column at a time, computing only the requested ones."""
+    indications = list(indications)
+    return {column: [COLUMN_VALUES[column](ind) for ind in indications]
+            for column in _validate_columns(columns)}
+
+
+def iter_indication_rows(indications, columns=None):
+    getters = [COLUMN_VALUES[column] for column in _validate_columns(columns)]
+    for ind in indications:
+        yield [getter(ind) for getter in getters]
+
+
+def _names(things):
+    return sorted(getattr(thing, "code", None) or thing.description for thing in things)
+
+
+def indication_record(indication):
+    """JSON-able dict of one indication, linked regimens by name."""
+    return {"code": indication.code,
+            "description": indication.description,
+            "description_variants": list(indication.description_variants),
+            "diseases": sorted(indication.diseases),
+            "regimens": _names(indication.regimens),
+            "has_genetic_req": indication.has_genetic_req,
+            "auto_genetic_req": indication.auto_genetic_req,
+            "biomarkers": indication.biomarkers,
+            "source_url": indication.source_url}
+
+
+def regimen_record(regimen):
+    """JSON-able dict of one regimen, linked indications by code."""
+    return {"description": regimen.description,
+            "diseases": sorted(regimen.diseases),
+            "indications": _names(regimen.indication_codes)}
+
+
+def _batches(indications, size):
+    indications = iter(indications)
+    while batch := list(islice(indications, size)):
+        yield batch
+
+
+@contextmanager
+def _open_text(path_or_file):
+    if hasattr(path_or_file, "write"):
+        yield path_or_file
+    else:
+        with open(path_or_file, "w", newline="") as outfile:
+            yield outfile
+
+
+def write_tsv(indications, path_or_file, columns=None):
+    """Stream rows in the table_export.tsv layout.
+
+    Same as tabulate_indications().to_csv(sep="\\t").
+    """
+    columns = _validate_columns(columns)
+    with _open_text(path_or_file) as outfile:
+        writer = csv.writer(outfile, delimiter="\t", lineterminator="\n")
+        writer.writerow(columns)
+        writer.writerows(iter_indication_rows(indications, columns))
+
+
+def write_jsonl(indications, path_or_file, columns=None):
+    columns = _validate_columns(columns)
+    with _open_text(path_or_file) as outfile:
+        for row in iter_indication_rows(indications, columns):
+            outfile.write(json.dumps(dict(zip(columns, row))))
+            outfile.write("\n")
+
+
+def _arrow_schema(columns):
+    import pyarrow as pa
+    return pa.schema([(column, pa.string()) for column in columns])
+
+
+def to_arrow(indications, columns=None):
+    import pyarrow as pa
+    columns = _validate_columns(columns)
+    return pa.table(indication_columns(indications, columns), schema=_arrow_schema(columns))
+
+
+def write_parquet(indications, path, columns=None, batch_size=10000):
+    """Write Parquet one row group per batch, so only a batch is held in memory."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    columns = _validate_columns(columns)
+    schema = _arrow_schema(columns)
+    with pq.ParquetWriter(path, schema) as writer:
+        for batch in _batches(indications, batch_size):
+            writer.write_table(pa.table(indication_columns(batch, columns), schema=schema))
+
+
+def write_arrow(indications, path, columns=None, batch_size=10000):
+    """Write an Arrow IPC (Feather v2) file one record batch at a time."""
+    import pyarrow as pa
+    columns = _validate_columns(columns)
+    schema = _arrow_schema(columns)
+    with pa.ipc.new_file(path, schema) as writer:
+        for batch in _batches(indications, batch_size):
+            writer.write_batch(pa.record_batch(indication_columns(batch, columns),
+                                               schema=schema))
+
+
+WRITERS = {"tsv": write_tsv, "jsonl": write_jsonl, "parquet": write_parquet,
+           "arrow": write_arrow}
@@ -0,0 +1,135 @@
+import hashlib
+import json
+import os
+import re
+
+from multi_pattern import MultiPatternMatcher
+
+# Biomarkers named in NCCP indications under names the Targets column lacks.
+BIOMARKER_PATTERNS = {
+    "HER2": r"\bHER2\b|(?i:human epidermal growth factor receptor 2)",
+    "EGFR": r"\bEGFR\b|(?i:epidermal growth factor receptor)(?! 2)",
+    "ALK": r"\bALK\b|(?i:anaplastic lymphoma kinase)",
+    "RAS": r"\b[KN]?RAS\b",
+    "BRCA": r"\bBRCA[12]?\b",
+    "PD-L1": r"\bPD-?L1\b",
+    "NTRK": r"\bNTRK\d?\b|(?i:neurotrophic tyrosine receptor kinase)",
+    "del(17p)": r"\b17p\b",
+    "BCR-ABL": r"\bBCR-ABL1?\b|\bPh\+|\bPh(?=[\s-]*positive)|(?i:philadelphia\s*chromosome)",
+    "KIT": r"\bKit\b|\bCD117\b",
+    "CD antigen": r"\bCD\d+\)?[\s-]*(?:\+|(?i:positive))",
+}
+# A mention followed by "-negative" (optionally after "/neu" or a bracketed
+# abbreviation) or preceded by "negative for" rules the biomarker out.
+NEGATED_AFTER = re.compile(r"(?:\s*\([\w/-]{1,12}\))?\)?(?:/neu)?[\s-]*(?:negative|-ve)\b",
+                           re.IGNORECASE)
+NEGATED_BEFORE = re.compile(r"negative\s+for\s+(?:[\w()/+-]+(?:,\s*|\s+(?:and|or)\s+))*$",
+                            re.IGNORECASE)
+# Clinical abbreviations that collide with gene symbols in the Targets column.
+ABBREVIATIONS = frozenset({"ALL", "AML", "CLL", "CML", "CP", "MDS", "STS"})
+SYMBOL_PATTERN = re.compile(r"[A-Z][A-Z0-9-]+")
+
+
+def read_targets(drug_database):
+    """Gene symbols in the Targets column of a read_drug_database table."""
+    return sorted({symbol for targets in drug_database["Targets"] for symbol in targets
+                   if SYMBOL_PATTERN.fullmatch(symbol)})
+
+
+def _negated(description, match):
+    return bool(NEGATED_AFTER.match(description, match.end())
+                or NEGATED_BEFORE.search(description, max(0, match.start() - 80),
+                                         match.start()))
+
+
+def description_hash(description):
+    return hashlib.sha1(description.encode()).hexdigest()
+
+
+class GeneticClassifier:
+    """Flag indications whose descriptions name a gene or biomarker.
+
+    Gene symbols (e.g. from the drug database Targets column) and the regexes
+    in BIOMARKER_PATTERNS are compiled into one MultiPatternMatcher, so each
+    description is scanned once; only the labels it finds are then located,
+    checking symbols for word boundaries and dropping negated mentions such as
+    "HER2-negative" or "negative for EGFR". Results are cached by description
+    hash, optionally persisted in cache_file, so unchanged descriptions are
+    skipped on refresh.
+    """
+
+    def __init__(self, symbols=(), patterns=None, exclude=ABBREVIATIONS, cache_file=None):
+        symbols = sorted(set(symbols) - set(exclude))
+        patterns = BIOMARKER_PATTERNS if patterns is None else patterns
+        self.labels = [*symbols, *patterns]
+        self._matcher = MultiPatternMatcher([*symbols, *patterns.values()])
+        self._finders = [*(re.compile(rf"(?<![\w-]){re.escape(symbol)}(?!\w)")
+                           for symbol in symbols),
+                         *map(re.compile, patterns.values())]
+        self._fingerprint = hashlib.sha1(json.dumps(
+            [symbols, patterns, NEGATED_AFTER.pattern, NEGATED_BEFORE.pattern],
+            sort_keys=True).encode()).hexdigest()
+        self.cache_file = cache_file
+        self._cache = {}
+        if cache_file is not None and os.path.exists(cache_file):
+            self._load_cache()
+
+    @classmethod
+    def from_drug_database(cls, drug_database, **kwargs):
+        return cls(read_targets(drug_database), **kwargs)
+
+    def __repr__(self):
+        return f"GeneticClassifier(labels={len(self.labels)}, cached={len(self._cache)})"
+
+    def biomarkers(self, description):
+        """Return the sorted biomarker labels named in description."""
+        key = description_hash(description)
+        if (found := self._cache.get(key)) is not None:
+            return found
+        found = {self.labels[i] for i in self._matcher.matches(description)
+                 if any(not _negated(description, match)
+                        for match in self._finders[i].finditer(description))}
+        self._cache[key] = found = tuple(sorted(found))
+        return found
+
+    def classify(self, indications, override=False):
+        """Set biomarkers on each indication, from all its variants.
+
+        The curated has_genetic_req is kept unless override is set, in which case
+        it is replaced by auto_genetic_req.
+        """
+        for indication in indications:
+            indication.biomarkers = self.biomarkers("\n".join(indication.description_variants))
+            if override:
+                indication.has_genetic_req = indication.auto_genetic_req
+
+    @staticmethod
+    def agreement(indications, manual_codes):
+        """Compare auto_genetic_req against a manually curated set of codes.
+
+        Reports precision and recall, and the codes on which the two disagree.
+        """
+        automatic = {ind.code for ind in indications if ind.auto_genetic_req}
+        codes = {ind.code for ind in indications}
+        manual = set(manual_codes) & codes
+        both = automatic & manual
+        return {
+            "indications": len(codes),
+            "agree": len(codes) - len(automatic ^ manual),
+            "both": len(both),
+            "automatic_only": sorted(automatic - manual),
+            "manual_only": sorted(manual - automatic),
+            "precision": len(both) / len(automatic) if automatic else None,
+            "recall": len(both) / len(manual) if manual else None,
+        }
+
+    def _load_cache(self):
+        with open(self.cache_file) as infile:
+            cache = json.load(infile)
+        if cache.get("fingerprint") == self._fingerprint:
+            self._cache = {key: tuple(found) for key, found in cache["biomarkers"].items()}
+
+    def save_cache(self, cache_file=None):
+        cache_file = cache_file or self.cache_file
+        with open(cache_file, "w") as outfile:
+            json.dump({"fingerprint": self._fingerprint, "biomarkers": self._cache}, outfile)
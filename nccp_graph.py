@@ -0,0 +1,169 @@
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+KINDS = ("regimens", "indications", "diseases")
+
+
+def _incidence(edges, row_ids, column_ids):
+    rows = np.fromiter((row_ids[a] for a, _ in edges), dtype=np.int32, count=len(edges))
+    columns = np.fromiter((column_ids[b] for _, b in edges), dtype=np.int32,
+                          count=len(edges))
+    matrix = sparse.csr_matrix((np.ones(len(edges), dtype=np.int32), (rows, columns)),
+                               shape=(len(row_ids), len(column_ids)))
+    matrix.sum_duplicates()
+    matrix.data[:] = 1
+    return matrix
+
+
+class RegimenGraph:
+    """Regimen-indication-disease links stored as sparse incidence matrices.
+
+    Nodes are keyed as in the database: regimens by description, indications by
+    code and diseases by label. Regimen-indication and indication-disease links
+    are boolean CSR matrices; regimen-disease links are derived from them, with
+    the number of connecting indications as weight. All queries are sparse
+    matrix-vector products, so graphs combining several snapshots stay fast.
+    """
+
+    def __init__(self, regimen_indications, indication_diseases, regimens=(),
+                 indications=()):
+        regimen_indications = list(regimen_indications)
+        indication_diseases = list(indication_diseases)
+        self.keys = {
+            "regimens": list(dict.fromkeys([*regimens,
+                                            *(reg for reg, _ in regimen_indications)])),
+            "indications": list(dict.fromkeys([*indications,
+                                               *(ind for _, ind in regimen_indications),
+                                               *(ind for ind, _ in indication_diseases)])),
+            "diseases": list(dict.fromkeys(disease for _, disease in indication_diseases)),
+        }
+        self.ids = {kind: {key: i for i, key in enumerate(keys)}
+                    for kind, keys in self.keys.items()}
+        regimen_indication = _incidence(regimen_indications, self.ids["regimens"],
+                                        self.ids["indications"])
+        indication_disease = _incidence(indication_diseases, self.ids["indications"],
+                                        self.ids["diseases"])
+        regimen_disease = (regimen_indication @ indication_disease).tocsr()
+        self._incidence = {("regimens", "indications"): regimen_indication,
+                           ("indications", "diseases"): indication_disease,
+                           ("regimens", "diseases"): regimen_disease}
+        for (a, b), matrix in list(self._incidence.items()):
+            self._incidence[b, a] = matrix.T.tocsr()
+        offsets = np.cumsum([0, *(len(self.keys[kind]) for kind in KINDS)])
+        self._offsets = dict(zip(KINDS, offsets))
+        self._adjacency = sparse.bmat([
+            [None, regimen_indication, None],
+            [regimen_indication.T, None, indication_disease],
+            [None, indication_disease.T, None],
+        ], format="csr", dtype=np.int32)
+
+    @classmethod
+    def from_database(cls, database):
+        regimen_indications, indication_diseases = [], []
+        for ind in database.indications.values():
+            regimen_indications.extend((reg.description, ind.code) for reg in ind.regimens)
+            indication_diseases.extend((ind.code, disease) for disease in ind.diseases)
+        return cls(regimen_indications, indication_diseases, database.regimens,
+                   database.indications)
+
+    @classmethod
+    def combine(cls, graphs):
+        """Union of several graphs (or databases), e.g. one per snapshot."""
+        regimen_indications, indication_diseases = [], []
+        regimens, indications = {}, {}
+        for graph in graphs:
+            if not isinstance(graph, RegimenGraph):
+                graph = graph.graph()
+            regimen_indications.extend(graph.edges("regimens", "indications"))
+            indication_diseases.extend(graph.edges("indications", "diseases"))
+            regimens.update(dict.fromkeys(graph.keys["regimens"]))
+            indications.update(dict.fromkeys(graph.keys["indications"]))
+        return cls(regimen_indications, indication_diseases, regimens, indications)
+
+    def __repr__(self):
+        return (f"RegimenGraph(regimens={len(self.keys['regimens'])}, "
+                f"indications={len(self.keys['indications'])}, "
+                f"diseases={len(self.keys['diseases'])})")
+
+    def incidence(self, kind, other):
+        """Sparse (kind x other) matrix; regimen-disease entries count indications."""
+        return self._incidence[kind, other]
+
+    def edges(self, kind, other):
+        matrix = self._incidence[kind, other].tocoo()
+        keys, other_keys = self.keys[kind], self.keys[other]
+        return [(keys[i], other_keys[j]) for i, j in zip(matrix.row, matrix.col)]
+
+    def _vector(self, kind, keys):
+        if isinstance(keys, str):
+            keys = [keys]
+        vector = np.zeros(len(self.keys[kind]), dtype=np.int32)
+        vector[[self.ids[kind][key] for key in keys]] = 1
+        return vector
+
+    def _series(self, kind, counts, exclude=()):
+        found = np.flatnonzero(counts)
+        series = pd.Series(counts[found], index=[self.keys[kind][i] for i in found])
+        series = series.drop([key for key in exclude if key in series.index])
+        return series.sort_values(ascending=False, kind="stable")
+
+    def neighbours(self, kind, keys, other):
+        """Nodes of kind other linked to any of keys, with the number of links."""
+        counts = self._incidence[other, kind] @ self._vector(kind, keys)
+        return self._series(other, counts)
+
+    def related(self, kind, key, via):
+        """Nodes of the same kind sharing a `via` node with key, with shared counts.
+
+        E.g. related("regimens", name, "indications") gives the regimens sharing an
+        indication with name.
+        """
+        shared = (self._incidence[kind, via] > 0) @ (
+            (self._incidence[via, kind] > 0) @ self._vector(kind, key))
+        return self._series(kind, np.asarray(shared).ravel(), exclude=[key])
+
+    def co_occurrence(self, kind="regimens", via="diseases"):
+        """Sparse (kind x kind) DataFrame counting shared `via` nodes.
+
+        The diagonal holds each node's own number of `via` links.
+        """
+        matrix = (self._incidence[kind, via] > 0).astype(np.int32)
+        counts = (matrix @ matrix.T).tocsr()
+        return pd.DataFrame.sparse.from_spmatrix(counts, index=self.keys[kind],
+                                                 columns=self.keys[kind])
+
+    def crosstab(self, kind="regimens", other="diseases"):
+        """Dense (kind x other) count table, e.g. indications per regimen and disease."""
+        return pd.DataFrame(self._incidence[kind, other].toarray(), index=self.keys[kind],
+                            columns=self.keys[other])
+
+    def k_hop(self, kind, keys, hops, target=None):
+        """Nodes reachable from keys in at most hops steps, with their distance.
+
+        Returns a Series indexed by key for the target kind, or by (kind, key)
+        for all kinds when target is None. The start nodes are not included.
+        """
+        visited = np.zeros(self._adjacency.shape[0], dtype=bool)
+        start = self._offsets[kind] + np.flatnonzero(self._vector(kind, keys))
+        visited[start] = True
+        distance = np.full(len(visited), -1, dtype=np.int32)
+        frontier = np.zeros(len(visited), dtype=np.int32)
+        frontier[start] = 1
+        for hop in range(1, hops + 1):
+            reached = (self._adjacency @ frontier > 0) & ~visited
+            if not reached.any():
+                break
+            visited |= reached
+            distance[reached] = hop
+            frontier = reached.astype(np.int32)
+        results = {}
+        for node_kind in ([target] if target is not None else KINDS):
+            offset = self._offsets[node_kind]
+            found = np.flatnonzero(distance[offset:offset + len(self.keys[node_kind])] > 0)
+            results[node_kind] = pd.Series(
+                distance[offset + found], index=[self.keys[node_kind][i] for i in found],
+                dtype=np.int32)
+        if target is not None:
+            return results[target]
+        return pd.concat(results)
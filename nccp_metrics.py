@@ -0,0 +1,181 @@
+import cProfile
+import io
+import json
+import pstats
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+
+_active = None
+_NULL_STAGE = nullcontext()
+
+
+def set_metrics(metrics):
+    """Record pipeline metrics into `metrics` (a Metrics), or None to disable."""
+    global _active
+    previous, _active = _active, metrics
+    return previous
+
+
+def stage(name, url=None):
+    """Context manager timing a pipeline stage, a shared no-op when disabled."""
+    if _active is None:
+        return _NULL_STAGE
+    return _active.stage(name, url)
+
+
+def count(name, n=1, url=None, **labels):
+    if _active is not None:
+        _active.count(name, n, url, **labels)
+
+
+def instrumented(name):
+    """Decorator timing every call of a function as stage `name` when enabled."""
+    def decorate(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if _active is None:
+                return function(*args, **kwargs)
+            with _active.stage(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def _prometheus_labels(labels):
+    if not labels:
+        return ""
+    pairs = []
+    for key, value in dict(labels).items():
+        value = str(value).replace("\\", r"\\").replace('"', r'\"').replace("\n", r"\n")
+        pairs.append(f'{key}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+class Metrics:
+    """Wall/CPU time per stage and per URL, plus labelled counters.
+
+    Stages are timed inclusively, so nested stages (parse_indications within
+    parse_table) are also part of their parents. CPU time is per thread. Use as
+    a context manager to install it for the duration of a run; profile=True
+    additionally runs cProfile on the calling thread and trace_memory=True
+    records tracemalloc's peak and top allocation sites. Parsing done in a
+    process pool is not recorded.
+    """
+
+    def __init__(self, profile=False, trace_memory=False):
+        self.profile = profile
+        self.trace_memory = trace_memory
+        self.stages = {}
+        self.urls = {}
+        self.counters = Counter()
+        self.memory = None
+        self.profiler = None
+        self._lock = threading.Lock()
+        self._previous = None
+        self._started_tracemalloc = False
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def start(self):
+        self._previous = set_metrics(self)
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        if self.profile:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+
+    def stop(self):
+        if self.profiler is not None:
+            self.profiler.disable()
+        if self.trace_memory and tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            top = tracemalloc.take_snapshot().statistics("lineno")[:10]
+            self.memory = {"current_bytes": current, "peak_bytes": peak,
+                           "top": [{"site": str(stat.traceback), "bytes": stat.size,
+                                    "count": stat.count} for stat in top]}
+            if self._started_tracemalloc:
+                tracemalloc.stop()
+                self._started_tracemalloc = False
+        set_metrics(self._previous)
+
+    @contextmanager
+    def stage(self, name, url=None):
+        wall, cpu = time.perf_counter(), time.thread_time()
+        try:
+            yield
+        finally:
+            wall, cpu = time.perf_counter() - wall, time.thread_time() - cpu
+            with self._lock:
+                calls, wall_total, cpu_total = self.stages.get(name, (0, 0.0, 0.0))
+                self.stages[name] = calls + 1, wall_total + wall, cpu_total + cpu
+                if url is not None:
+                    self.urls.setdefault(url, Counter())[f"{name}_seconds"] += wall
+
+    def count(self, name, n=1, url=None, **labels):
+        with self._lock:
+            self.counters[name, tuple(sorted(labels.items()))] += n
+            if url is not None:
+                self.urls.setdefault(url, Counter())[name] += n
+
+    def profile_stats(self, limit=20, sort="cumulative"):
+        """Top `limit` functions of the cProfile run as text, or None."""
+        if self.profiler is None:
+            return None
+        stream = io.StringIO()
+        pstats.Stats(self.profiler, stream=stream).sort_stats(sort).print_stats(limit)
+        return stream.getvalue()
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "stages": {name: {"calls": calls, "wall_seconds": wall, "cpu_seconds": cpu}
+                           for name, (calls, wall, cpu) in self.stages.items()},
+                "urls": {url: dict(values) for url, values in self.urls.items()},
+                "counters": [{"name": name, "labels": dict(labels), "value": value}
+                             for (name, labels), value in self.counters.items()],
+                "memory": self.memory,
+                "profile": self.profile_stats(),
+            }
+
+    def to_json(self, indent=2):
+        return json.dumps(self.to_dict(), indent=indent)
+
+    def to_prometheus(self, prefix="nccp"):
+        lines = []
+        with self._lock:
+            for metric, index in (("stage_calls_total", 0), ("stage_wall_seconds_total", 1),
+                                  ("stage_cpu_seconds_total", 2)):
+                lines.append(f"# TYPE {prefix}_{metric} counter")
+                lines.extend(f"{prefix}_{metric}{_prometheus_labels({'stage': name})} "
+                             f"{values[index]}" for name, values in self.stages.items())
+            if self.urls:
+                lines.append(f"# TYPE {prefix}_url_total counter")
+                lines.extend(f"{prefix}_url_total"
+                             f"{_prometheus_labels({'url': url, 'metric': name})} {value}"
+                             for url, values in self.urls.items()
+                             for name, value in values.items())
+            for name in dict.fromkeys(name for name, _ in self.counters):
+                lines.append(f"# TYPE {prefix}_{name}_total counter")
+                lines.extend(f"{prefix}_{name}_total{_prometheus_labels(labels)} {value}"
+                             for (counter, labels), value in self.counters.items()
+                             if counter == name)
+            if self.memory is not None:
+                lines.append(f"# TYPE {prefix}_memory_peak_bytes gauge")
+                lines.append(f"{prefix}_memory_peak_bytes {self.memory['peak_bytes']}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """Write metrics as Prometheus text if path ends in .prom, else as JSON."""
+        text = self.to_prometheus() if str(path).endswith(".prom") else self.to_json()
+        with open(path, "w") as outfile:
+            outfile.write(text)
@@ -0,0 +1,227 @@
+import asyncio
+import json
+import re
+import sqlite3
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from nccp_chemotherapy_regimens import NCCP_Chemotherapy_Database
+from nccp_export import indication_record, regimen_record
+
+MAX_BODY = 1 << 20
+FLAGS = ("rank", "tokens")
+
+
+class _Generation:
+    # A database together with the responses computed from it, swapped as one.
+    def __init__(self, database, number):
+        self.database = database
+        self.number = number
+        self.responses = OrderedDict()
+
+
+class QueryService:
+    """Small HTTP/JSON service answering lookups and searches on one database.
+
+    GET /indications/<code>, /regimens/<name>, /search/indications?q=... and
+    /search/regimens?q=... (fields, limit, rank and tokens as in the search
+    methods) return JSON; POST /batch takes a JSON list of such paths and
+    answers them all in one response. Connections are kept alive. Lookups and
+    searches run in a pool of `workers` threads, so a slow search (or a user
+    regex) never blocks the event loop; one taking longer than `query_timeout`
+    seconds is answered with 503, though its thread runs on until it finishes.
+    Responses are cached per database generation, so swap() (or POST /reload, which reloads
+    the snapshot off the event loop) invalidates them all at once while requests
+    already being answered finish against the database they started with.
+    """
+
+    def __init__(self, database, snapshot=None, cache_size=4096, idle_timeout=30,
+                 query_timeout=10, workers=4):
+        self.snapshot = snapshot
+        self.cache_size = cache_size
+        self.idle_timeout = idle_timeout
+        self.query_timeout = query_timeout
+        self.stats = Counter(requests=0, hits=0, misses=0, reloads=0, timeouts=0)
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix="nccp-query")
+        self._generation = _Generation(self._warm(database), 0)
+
+    @classmethod
+    def from_snapshot(cls, path, **kwargs):
+        return cls(NCCP_Chemotherapy_Database.load(path, lazy=False), snapshot=path, **kwargs)
+
+    def __repr__(self):
+        return (f"QueryService(generation={self._generation.number}, "
+                f"cached={len(self._generation.responses)})")
+
+    @staticmethod
+    def _warm(database):
+        # Build both search indexes up front rather than inside the first request.
+        for kind in ("regimens", "indications"):
+            database.search_index(kind)
+        return database
+
+    def swap(self, database):
+        """Serve `database` from now on, dropping every cached response.
+
+        The database served until now is closed, releasing its snapshot file.
+        """
+        previous = self._generation.database
+        self._generation = _Generation(self._warm(database), self._generation.number + 1)
+        self.stats["reloads"] += 1
+        if previous is not database:
+            previous.close()
+
+    def close(self):
+        """Stop the query threads and close the database served."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._generation.database.close()
+
+    async def reload(self, path=None):
+        """Load the snapshot at path (default: the one served) in a thread and swap."""
+        path = path or self.snapshot
+        if path is None:
+            raise ValueError("No snapshot to reload from.")
+        loop = asyncio.get_running_loop()
+        database = await loop.run_in_executor(
+            None, lambda: self._warm(NCCP_Chemotherapy_Database.load(path, lazy=False)))
+        self.snapshot = path
+        self.swap(database)
+
+    async def answer(self, target):
+        """Return (status, JSON bytes) for a GET target, cached per generation."""
+        generation = self._generation
+        self.stats["requests"] += 1
+        if (cached := generation.responses.get(target)) is not None:
+            generation.responses.move_to_end(target)
+            self.stats["hits"] += 1
+            return cached
+        self.stats["misses"] += 1
+        loop = asyncio.get_running_loop()
+        try:
+            response = await asyncio.wait_for(
+                loop.run_in_executor(self._executor, self._respond, generation.database,
+                                     target),
+                self.query_timeout)
+        except asyncio.TimeoutError:
+            self.stats["timeouts"] += 1
+            return (HTTPStatus.SERVICE_UNAVAILABLE,
+                    json.dumps({"error": f"Timed out after {self.query_timeout} s"}).encode())
+        generation.responses[target] = response
+        if len(generation.responses) > self.cache_size:
+            generation.responses.popitem(last=False)
+        return response
+
+    @classmethod
+    def _respond(cls, database, target):
+        try:
+            response = HTTPStatus.OK, cls._query(database, target)
+        except KeyError as err:
+            response = HTTPStatus.NOT_FOUND, {"error": f"Not found: {err.args[0]}"}
+        except (ValueError, re.error) as err:
+            response = HTTPStatus.BAD_REQUEST, {"error": str(err)}
+        return response[0], json.dumps(response[1]).encode()
+
+    @staticmethod
+    def _query(database, target):
+        url = urlsplit(target)
+        parts = [unquote(part) for part in url.path.strip("/").split("/", 1)]
+        query = parse_qs(url.query)
+        if parts[0] == "health":
+            return {"regimens": len(database.regimens),
+                    "indications": len(database.indications)}
+        if len(parts) != 2:
+            raise KeyError(target)
+        kind, key = parts
+        if kind == "indications":
+            return indication_record(database.indications[key])
+        if kind == "regimens":
+            return regimen_record(database.regimens[key])
+        if kind == "search" and key in ("indications", "regimens"):
+            if "q" not in query:
+                raise ValueError("Missing search text parameter q.")
+            limit = query.get("limit", [None])[0]
+            results = getattr(database, f"search_{key}")(
+                query["q"][0], fields=query.get("fields"),
+                limit=None if limit is None else int(limit),
+                **{flag: query.get(flag, ["false"])[0] in ("1", "true") for flag in FLAGS})
+            record = indication_record if key == "indications" else regimen_record
+            return [record(thing) for thing in results]
+        raise KeyError(target)
+
+    async def answer_batch(self, body):
+        targets = json.loads(body)
+        if not isinstance(targets, list) or not all(isinstance(t, str) for t in targets):
+            raise ValueError("A batch is a JSON list of request paths.")
+        responses = await asyncio.gather(*map(self.answer, targets))
+        # Cached bodies are already JSON, so splice them in rather than re-encoding.
+        items = [b'{"status": %d, "body": %s}' % response for response in responses]
+        return HTTPStatus.OK, b"[" + b", ".join(items) + b"]"
+
+    async def handle(self, method, target, body):
+        if method == "GET":
+            return await self.answer(target)
+        if method == "POST" and target == "/batch":
+            try:
+                return await self.answer_batch(body)
+            except ValueError as err:  # json.JSONDecodeError included.
+                return HTTPStatus.BAD_REQUEST, json.dumps({"error": str(err)}).encode()
+        if method == "POST" and target == "/reload":
+            try:
+                await self.reload()
+            except (OSError, ValueError, sqlite3.Error) as err:
+                return (HTTPStatus.INTERNAL_SERVER_ERROR,
+                        json.dumps({"error": str(err)}).encode())
+            return HTTPStatus.OK, json.dumps({"generation": self._generation.number}).encode()
+        return HTTPStatus.METHOD_NOT_ALLOWED, b'{"error": "Method not allowed"}'
+
+    async def _connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request_line = await asyncio.wait_for(reader.readline(),
+                                                          self.idle_timeout)
+                except asyncio.TimeoutError:
+                    break
+                if not request_line:
+                    break
+                method, target, version = request_line.decode("latin-1").split()
+                headers = {}
+                while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length", 0))
+                if length > MAX_BODY:
+                    status, payload = HTTPStatus.REQUEST_ENTITY_TOO_LARGE, b"{}"
+                    keep_alive = False
+                else:
+                    body = await reader.readexactly(length) if length else b""
+                    status, payload = await self.handle(method, target, body)
+                    connection = headers.get("connection", "").lower()
+                    keep_alive = (connection != "close" if version == "HTTP/1.1"
+                                  else connection == "keep-alive")
+                writer.write(
+                    f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+                    f"Content-Type: application/json\r\nContent-Length: {len(payload)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+                    .encode("latin-1") + payload)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ValueError, asyncio.IncompleteReadError, ConnectionError):
+            pass  # Malformed request or client gone; just drop the connection.
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def start(self, host="127.0.0.1", port=8765):
+        return await asyncio.start_server(self._connection, host, port)
+
+    async def serve_forever(self, host="127.0.0.1", port=8765):
+        server = await self.start(host, port)
+        async with server:
+            await server.serve_forever()
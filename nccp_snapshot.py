@@ -0,0 +1,249 @@
+import json
+import os
+import sqlite3
+import threading
+from collections.abc import Mapping
+
+from harmonization import RegimenHarmonizer
+from nccp_chemotherapy_regimens import Indication, Regimen, entity_fields, entity_hash
+
+FORMAT_VERSION = 4
+
+SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE diseases (id INTEGER PRIMARY KEY, label TEXT UNIQUE);
+CREATE TABLE regimens (id INTEGER PRIMARY KEY, description TEXT UNIQUE, hash TEXT);
+CREATE TABLE indications (id INTEGER PRIMARY KEY, code TEXT UNIQUE, description TEXT,
+                          source_url TEXT, has_genetic_req INTEGER,
+                          progression_flags TEXT, biomarkers TEXT, hash TEXT,
+                          description_variants TEXT);
+CREATE TABLE links (regimen_id INTEGER, indication_id INTEGER);
+CREATE TABLE regimen_diseases (regimen_id INTEGER, disease_id INTEGER);
+CREATE TABLE indication_diseases (indication_id INTEGER, disease_id INTEGER);
+CREATE TABLE pages (position INTEGER PRIMARY KEY, url TEXT, fingerprint TEXT,
+                    tables TEXT, keys TEXT);
+CREATE INDEX links_by_regimen ON links (regimen_id);
+CREATE INDEX links_by_indication ON links (indication_id);
+CREATE INDEX regimen_diseases_by_regimen ON regimen_diseases (regimen_id);
+CREATE INDEX indication_diseases_by_indication ON indication_diseases (indication_id);
+"""
+
+
+def save_snapshot(database, path):
+    """Write database to a versioned SQLite snapshot at path."""
+    if database._snapshot is not None:
+        database._snapshot.materialize(database)
+    diseases = {}
+    for thing in (*database.regimens.values(), *database.indications.values()):
+        for disease in thing.diseases:
+            diseases.setdefault(disease, len(diseases))
+    regimen_ids = {regimen: i for i, regimen in enumerate(database.regimens.values())}
+    indication_ids = {ind.code: i for i, ind in enumerate(database.indications.values())}
+
+    temp_path = f"{path}.tmp"
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+    connection = sqlite3.connect(temp_path)
+    with connection:
+        connection.executescript(SCHEMA)
+        connection.executemany("INSERT INTO meta VALUES (?, ?)", [
+            ("format_version", str(FORMAT_VERSION)),
+            ("harmonizer", json.dumps(database.harmonizer.state()
+                                      if database.harmonizer is not None else None)),
+        ])
+        connection.executemany("INSERT INTO diseases VALUES (?, ?)",
+                               [(i, label) for label, i in diseases.items()])
+        connection.executemany(
+            "INSERT INTO regimens VALUES (?, ?, ?)",
+            [(i, reg.description, entity_hash(entity_fields("regimens", reg)))
+             for reg, i in regimen_ids.items()])
+        connection.executemany(
+            "INSERT INTO indications VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [(indication_ids[ind.code], ind.code, ind.description, ind.source_url,
+              ind.has_genetic_req, json.dumps(ind.progression_flags),
+              json.dumps(ind.biomarkers), entity_hash(entity_fields("indications", ind)),
+              json.dumps(ind.description_variants))
+             for ind in database.indications.values()]
+        )
+        connection.executemany(
+            "INSERT INTO links VALUES (?, ?)",
+            [(regimen_ids[reg], indication_ids[ind.code])
+             for reg in database.regimens.values() for ind in reg.indication_codes]
+        )
+        connection.executemany(
+            "INSERT INTO regimen_diseases VALUES (?, ?)",
+            [(regimen_ids[reg], diseases[disease])
+             for reg in database.regimens.values() for disease in reg.diseases]
+        )
+        connection.executemany(
+            "INSERT INTO indication_diseases VALUES (?, ?)",
+            [(indication_ids[ind.code], diseases[disease])
+             for ind in database.indications.values() for disease in ind.diseases]
+        )
+        connection.executemany(
+            "INSERT INTO pages VALUES (?, ?, ?, ?, ?)",
+            [(i, url, database.fingerprints[url], json.dumps(tables),
+              json.dumps(database._page_keys[url]))
+             for i, (url, tables) in enumerate(database.pages.items())]
+        )
+    connection.close()
+    os.replace(temp_path, path)
+
+
+def load_snapshot(path, database_class, lazy=True):
+    """Read a snapshot written by save_snapshot.
+
+    With lazy=True, regimens and indications are only built when looked up, and
+    their links to each other are only read from disk when first accessed.
+    """
+    reader = _SnapshotReader(path)
+    database = database_class(_SnapshotMapping(reader, "regimens"),
+                              _SnapshotMapping(reader, "indications"))
+    database.harmonizer = reader.harmonizer
+    database.fingerprints = reader.fingerprints()
+    database._snapshot = reader
+    if not lazy:
+        reader.materialize(database)
+    return database
+
+
+class _SnapshotIndication(Indication):
+    def __getattr__(self, name):
+        # Only reached while `regimens` has not been read from the snapshot yet.
+        if name != "regimens" or "_reader" not in vars(self):
+            raise AttributeError(name)
+        self.regimens = self._reader.linked("regimens", self.code)
+        return self.regimens
+
+
+class _SnapshotRegimen(Regimen):
+    def __getattr__(self, name):
+        if name != "indication_codes" or "_reader" not in vars(self):
+            raise AttributeError(name)
+        self.indication_codes = self._reader.linked("indications", self.description)
+        return self.indication_codes
+
+
+class _SnapshotMapping(Mapping):
+    def __init__(self, reader, kind):
+        self._reader = reader
+        self._kind = kind
+        self._keys = reader.keys(kind)
+        self._key_set = set(self._keys)
+
+    def __getitem__(self, key):
+        if key not in self._key_set:
+            raise KeyError(key)
+        return self._reader.get(self._kind, key)
+
+    def __contains__(self, key):
+        return key in self._key_set
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+
+class _SnapshotReader:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True,
+                                           check_same_thread=False)
+        meta = dict(self._query("SELECT key, value FROM meta"))
+        version = int(meta.get("format_version", 0))
+        if version != FORMAT_VERSION:
+            self.close()
+            raise ValueError(f"Unsupported snapshot format version {version} in {path}; "
+                             f"expected {FORMAT_VERSION}.")
+        harmonizer = json.loads(meta["harmonizer"])
+        self.harmonizer = RegimenHarmonizer(**harmonizer) if harmonizer is not None else None
+        self._diseases = dict(self._query("SELECT id, label FROM diseases"))
+        self._objects = {"regimens": {}, "indications": {}}
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    def _query(self, sql, parameters=()):
+        with self._lock:
+            return self._connection.execute(sql, parameters).fetchall()
+
+    def keys(self, kind):
+        column = "code" if kind == "indications" else "description"
+        return [row[0] for row in self._query(f"SELECT {column} FROM {kind} ORDER BY id")]
+
+    def hashes(self, kind):
+        """{key: entity_hash} as stored at save time, without building any objects."""
+        column = "code" if kind == "indications" else "description"
+        return dict(self._query(f"SELECT {column}, hash FROM {kind} ORDER BY id"))
+
+    def fingerprints(self):
+        return dict(self._query("SELECT url, fingerprint FROM pages ORDER BY position"))
+
+    def get(self, kind, key):
+        if (thing := self._objects[kind].get(key)) is not None:
+            return thing
+        if kind == "indications":
+            (id_, code, description, source_url, genetic, flags, biomarkers,
+             variants), = self._query(
+                "SELECT id, code, description, source_url, has_genetic_req, "
+                "progression_flags, biomarkers, description_variants FROM indications "
+                "WHERE code = ?", (key,))
+            diseases = self._diseases_of("indication", id_)
+            biomarkers = json.loads(biomarkers)
+            thing = _SnapshotIndication(code, description, source_url, None, diseases,
+                                        None if genetic is None else bool(genetic),
+                                        json.loads(flags),
+                                        None if biomarkers is None else tuple(biomarkers),
+                                        json.loads(variants))
+            del thing.regimens
+        else:
+            (id_,), = self._query("SELECT id FROM regimens WHERE description = ?", (key,))
+            thing = _SnapshotRegimen(key, None, self._diseases_of("regimen", id_))
+            del thing.indication_codes
+        thing._id = id_
+        thing._reader = self
+        self._objects[kind][key] = thing
+        return thing
+
+    def _diseases_of(self, kind, id_):
+        rows = self._query(f"SELECT disease_id FROM {kind}_diseases WHERE {kind}_id = ?",
+                           (id_,))
+        return {self._diseases[disease_id] for disease_id, in rows}
+
+    def linked(self, kind, key):
+        if kind == "regimens":
+            rows = self._query(
+                "SELECT r.description FROM links JOIN regimens r ON r.id = regimen_id "
+                "JOIN indications i ON i.id = indication_id WHERE i.code = ?", (key,))
+        else:
+            rows = self._query(
+                "SELECT i.code FROM links JOIN indications i ON i.id = indication_id "
+                "JOIN regimens r ON r.id = regimen_id WHERE r.description = ?", (key,))
+        return {self.get(kind, linked_key) for linked_key, in rows}
+
+    def materialize(self, database):
+        """Replace the lazy mappings with plain dicts and load per-page state."""
+        regimens = {key: self.get("regimens", key) for key in database.regimens}
+        indications = {key: self.get("indications", key) for key in database.indications}
+        for regimen in regimens.values():
+            regimen.indication_codes  # Resolve lazy links while the file is open.
+        for indication in indications.values():
+            indication.regimens
+        database.regimens = regimens
+        database.indications = indications
+        pages = self._query("SELECT url, tables, keys FROM pages ORDER BY position")
+        database.pages = {url: json.loads(tables) for url, tables, _ in pages}
+        database._page_keys = {url: tuple(tuple(part) for part in json.loads(keys))
+                               for url, _, keys in pages}
+        database._regimen_pages, database._indication_pages = {}, {}
+        for url, (regimen_keys, indication_keys) in database._page_keys.items():
+            for key in regimen_keys:
+                database._regimen_pages.setdefault(key, set()).add(url)
+            for key in indication_keys:
+                database._indication_pages.setdefault(key, set()).add(url)
+        database._snapshot = None
+        self.close()
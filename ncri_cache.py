@@ -0,0 +1,171 @@
+import hashlib
+import inspect
+import json
+import os
+import pickle
+import tempfile
+import threading
+from collections import Counter, OrderedDict
+from functools import wraps
+
+import pandas as pd
+
+_active = None
+
+
+def set_table_cache(cache):
+    """Memoize derived NCRI/CSO tables in `cache` (a DerivedTableCache), or None."""
+    global _active
+    previous, _active = _active, cache
+    return previous
+
+
+def derived_table(name):
+    """Decorator memoizing a table-producing function in the active cache.
+
+    CSV paths and DataFrames (or accessors wrapping one) among the arguments
+    are keyed by content; all other arguments, defaults included, by value.
+    """
+    def decorate(function):
+        signature = inspect.signature(function)
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if _active is None:
+                return function(*args, **kwargs)
+            arguments = signature.bind(*args, **kwargs)
+            arguments.apply_defaults()
+            return _active.get_or_compute(name, arguments.arguments,
+                                          lambda: function(*args, **kwargs))
+        return wrapper
+    return decorate
+
+
+def frame_hash(frame):
+    """Content hash of a DataFrame's values, index, columns and dtypes."""
+    digest = hashlib.sha1(pd.util.hash_pandas_object(frame, index=True).to_numpy().tobytes())
+    digest.update(repr((list(frame.columns), list(frame.dtypes.astype(str)),
+                        list(frame.index.names))).encode())
+    return digest.hexdigest()
+
+
+class DerivedTableCache:
+    """LRU cache of derived DataFrames keyed by the content of their inputs.
+
+    Keys hash the function name, the bytes of any source CSVs, the contents of
+    any input frames and the remaining parameters, so edited inputs are never
+    served stale results. At most `max_entries` tables are held in memory; with
+    a `directory` they are also pickled there and survive across processes.
+    Callers always receive a copy, so mutating a result leaves the cache intact.
+    """
+
+    def __init__(self, max_entries=64, directory=None):
+        self.max_entries = max_entries
+        self.directory = directory
+        self.stats = Counter(hits=0, misses=0, disk_hits=0)
+        self._tables = OrderedDict()
+        self._file_hashes = {}
+        self._lock = threading.Lock()
+        self._previous = None
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def __repr__(self):
+        return (f"DerivedTableCache(max_entries={self.max_entries}, "
+                f"directory={self.directory!r}, cached={len(self)})")
+
+    def __len__(self):
+        return len(self._tables)
+
+    def __enter__(self):
+        self._previous = set_table_cache(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        set_table_cache(self._previous)
+
+    def clear(self):
+        """Drop all tables, including those persisted to disk."""
+        with self._lock:
+            self._tables.clear()
+            self._file_hashes.clear()
+        if self.directory is not None:
+            for filename in os.listdir(self.directory):
+                if filename.endswith(".pkl"):
+                    os.remove(os.path.join(self.directory, filename))
+
+    def get_or_compute(self, name, arguments, compute):
+        """Return the cached table for name(**arguments), computing it on a miss."""
+        key = self.key(name, arguments)
+        if key is None:  # An argument (e.g. an open file) can't be keyed.
+            return compute()
+        with self._lock:
+            table = self._tables.get(key)
+            if table is not None:
+                self._tables.move_to_end(key)
+                self.stats["hits"] += 1
+                return table.copy()
+        table = self._load(key)
+        if table is not None:
+            self.stats["disk_hits"] += 1
+        else:
+            self.stats["misses"] += 1
+            table = compute()
+            self._save(key, table)
+        self._store(key, table)
+        return table.copy()
+
+    def key(self, name, arguments):
+        parts = [name]
+        for argument, value in arguments.items():
+            value = getattr(value, "_obj", value)  # DataFrame accessors.
+            if isinstance(value, pd.DataFrame):
+                parts.append((argument, "frame", frame_hash(value)))
+            elif isinstance(value, (str, os.PathLike)) and os.path.isfile(value):
+                parts.append((argument, "file", self.file_hash(value)))
+            elif isinstance(value, (type(None), bool, int, float, str, tuple, list, range)):
+                parts.append((argument, repr(value)))
+            else:
+                return None
+        return hashlib.sha1(json.dumps(parts).encode()).hexdigest()
+
+    def file_hash(self, path):
+        """sha1 of a file's bytes, remembered while its mtime and size are unchanged."""
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        signature = (path, stat.st_mtime_ns, stat.st_size)
+        if (digest := self._file_hashes.get(signature)) is None:
+            with open(path, "rb") as infile:
+                digest = hashlib.file_digest(infile, "sha1").hexdigest()
+            self._file_hashes[signature] = digest
+        return digest
+
+    def _store(self, key, table):
+        with self._lock:
+            self._tables[key] = table
+            self._tables.move_to_end(key)
+            while len(self._tables) > self.max_entries:
+                self._tables.popitem(last=False)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.pkl")
+
+    def _load(self, key):
+        if self.directory is None:
+            return None
+        try:
+            with open(self._path(key), "rb") as infile:
+                return pickle.load(infile)
+        except FileNotFoundError:
+            return None
+        except (pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            return None  # Corrupt or written by an incompatible pandas; recompute.
+
+    def _save(self, key, table):
+        if self.directory is None:
+            return
+        # Write then rename, so concurrent readers never see a partial pickle.
+        descriptor, temporary = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(descriptor, "wb") as outfile:
+            pickle.dump(table, outfile, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary, self._path(key))
@@ -1,13 +1,20 @@
 
+import itertools
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime
 
+import numpy as np
 import pandas as pd
 from pandas import IndexSlice as idx
 from pandas.api.extensions import register_dataframe_accessor
 import plotly.graph_objects as go
 import plotly.express as px
+import plotly.io as pio
 from plotly.subplots import make_subplots
 
+from ncri_cache import derived_table
+
 BAND_DICT = {"0-49": ["Under 1 year", "1 - 4 years", "5 - 9 years", "10 - 14 years",
                       "15 - 19 years", "20 - 24 years", "25 - 29 years",
                       "30 - 34 years", "35 - 39 years", "40 - 44 years",
@@ -16,6 +23,94 @@ BAND_DICT = {"0-49": ["Under 1 year", "1 - 4 years", "5 - 9 years", "10 - 14 yea
              "65-74": ["65 - 69 years", "70 - 74 years"],
              "75+": ["75 - 79 years", "80 - 84 years", "85 years and over"]}
 AGE_BANDS = [band for bands in BAND_DICT.values() for band in bands]
+CANCER_AGE_GROUPS = pd.CategoricalDtype(list(BAND_DICT), ordered=True)
+CANCER_AGE_GROUP_OF_BAND = {band: group for group, bands in BAND_DICT.items()
+                            for band in bands}
+ERRANT_YEARS = range(2012, 2017)  # CSO years with inconsistent female "1 - 4 years".
+CATEGORICAL_COLUMNS = ("Site", "Sex", "Age Group", "Dates")
+INT32 = np.iinfo(np.int32)
+
+
+def year_starts(years):
+    """Vectorized [datetime(year, 1, 1) for year in years]."""
+    starts = (np.asarray(years, dtype="int64") - 1970).astype("datetime64[Y]")
+    index = years.index if isinstance(years, pd.Series) else None
+    return pd.Series(starts.astype("datetime64[us]"), index=index)
+
+
+def _appearance_order(values):
+    # Categories in order of first appearance, so plots keep the CSV ordering.
+    return pd.unique(np.asarray(values))
+
+
+def compact_dtypes(frame):
+    """Return frame with label columns and index levels as categoricals, counts as int32.
+
+    Integer (and integral float) columns are narrowed to int32 where they fit
+    rather than to the smallest type, so arithmetic on them can't overflow.
+    """
+    frame = frame.copy()
+    for column in frame.columns:
+        values = frame[column]
+        if column in CATEGORICAL_COLUMNS:
+            frame[column] = pd.Categorical(values, categories=_appearance_order(values))
+        elif (pd.api.types.is_integer_dtype(values)
+              or (pd.api.types.is_float_dtype(values) and values.notna().all()
+                  and values.mod(1).eq(0).all())):
+            if len(values) and INT32.min <= values.min() and values.max() <= INT32.max:
+                frame[column] = values.astype("int32")
+    index = frame.index
+    if isinstance(index, pd.MultiIndex):
+        for name in CATEGORICAL_COLUMNS:
+            if name in index.names:
+                level = index.levels[index.names.index(name)]
+                categories = _appearance_order(index.get_level_values(name))
+                index = index.set_levels(pd.CategoricalIndex(level, categories=categories),
+                                         level=name)
+        frame.index = index
+    elif index.name in CATEGORICAL_COLUMNS:
+        frame.index = pd.CategoricalIndex(index, categories=_appearance_order(index),
+                                          name=index.name)
+    return frame
+
+
+def _line_traces(data, y, color):
+    """The traces of px.line(data, x="Year", y=y, color=color, markers=True)."""
+    colors = itertools.cycle(pio.templates["plotly_white"].layout.colorway)
+    return [go.Scatter(x=group["Year"], y=group[y], name=key, legendgroup=key,
+                       mode="lines+markers", line={"color": line_color, "dash": "solid"},
+                       marker={"symbol": "circle"}, orientation="v", showlegend=True,
+                       hovertemplate=(f"{color}={key}<br>Year=%{{x}}<br>"
+                                      f"{y}=%{{y}}<extra></extra>"))
+            for (key, group), line_color in zip(
+                data.groupby(color, sort=False, observed=True), colors)]
+
+
+def _combined_line_plot(frame, ys, color, subplot_titles, title):
+    """Side-by-side line plots of the two ys columns over Year, one line per color.
+
+    Traces are built directly; two throwaway px figures cost more than the plot.
+    """
+    data = frame.reset_index()
+    plot = make_subplots(rows=1, cols=2,
+                         subplot_titles=subplot_titles,
+                         x_title="Year",
+                         y_title="Cases")
+    for col, y in enumerate(ys, start=1):
+        plot.add_traces(_line_traces(data, y, color), rows=1, cols=col)
+
+    plot.update_traces(showlegend=False, col=2)
+    plot.update_layout(title=title,
+                       legend_title=color,
+                       template="plotly_white")
+    plot.update_xaxes(dtick="M60")
+
+    plot.layout.annotations[0].update(xanchor="left", xshift=-190)
+    plot.layout.annotations[1].update(xanchor="left", xshift=-190)
+
+    plot.update_layout(height=450, width=900)
+
+    return plot
 
 
 @register_dataframe_accessor("survival_tools")
@@ -24,6 +119,7 @@ class SurvivalData:
         self._obj = pandas_obj
 
     @staticmethod
+    @derived_table("survival")
     def read_csv(survival_data):
         """Read NCRI survival data in CSV format."""
         survival_data = pd.read_csv(survival_data, sep=",")
@@ -53,6 +149,7 @@ class PopulationData:
         self._obj = pandas_obj
 
     @staticmethod
+    @derived_table("population")
     def read_csv(population_csv, correct_errant_years=True):
         """Read CSO population estimates in CSV format."""
         pop_data = pd.read_csv(population_csv, sep=",", usecols=[1, 2, 3, 5])
@@ -61,14 +158,12 @@ class PopulationData:
         cols[-1] = "Population"
         pop_data.columns = cols
 
-        pop_data["Year"] = [datetime(x, 1, 1) for x in pop_data.Year]
-        pop_data = pop_data.loc[(datetime(1994, 1, 1) <= pop_data.Year)
-                                & (pop_data.Year < datetime(2020, 1, 1))]
+        pop_data = pop_data.loc[(1994 <= pop_data.Year) & (pop_data.Year < 2020)].copy()
+        pop_data["Year"] = year_starts(pop_data.Year).to_numpy()
         pop_data["Population"] = pop_data["Population"] * 1000
 
         pop_data = (pop_data
-                    .sort_values("Age Group",
-                                 key=lambda x: [y.replace("Under", "0") for y in x])
+                    .sort_values("Age Group", key=lambda x: x.str.replace("Under", "0"))
                     .sort_values("Sex", kind="stable")
                     .sort_values("Year", kind="stable"))
         pop_data.set_index(["Year", "Sex", "Age Group"], inplace=True)
@@ -76,31 +171,42 @@ class PopulationData:
         pop_data.rename(index={"Both sexes": "Both"}, level="Sex", inplace=True)
 
         if correct_errant_years:
-            for i in range(2012, 2017):
-                subset = pop_data.loc[idx[datetime(i, 1, 1), :, "1 - 4 years"]]
-                correction = (subset.loc["Both"] - subset.loc["Male"]).Population
-                pop_data.loc[idx[datetime(i, 1, 1), "Female", "1 - 4 years"]] = correction
+            years = year_starts(ERRANT_YEARS)
+            toddlers = pop_data.xs("1 - 4 years", level="Age Group").Population
+            correction = (toddlers.xs("Both", level="Sex").loc[years]
+                          - toddlers.xs("Male", level="Sex").loc[years])
+            female = pd.MultiIndex.from_arrays(
+                [years, ["Female"] * len(years), ["1 - 4 years"] * len(years)],
+                names=pop_data.index.names)
+            pop_data.loc[female, "Population"] = correction.to_numpy()
 
         return pop_data
 
+    @derived_table("cancer_age_groups")
     def aggregate_cancer_age_groups(self):
         """Aggregate CSO age bands to match NCRI age bands."""
-        aggregate = pd.DataFrame(columns=["Year", "Sex", "Population", "Age Group"])
-        for i, (agg_band, bands) in enumerate(BAND_DICT.items()):
-            sub_agg = self._obj.loc[idx[:, :, bands]].groupby(["Year", "Sex"]).agg(sum)
-            sub_agg["Age Group"] = agg_band
-            sub_agg.reset_index(inplace=True)
-            aggregate = pd.concat([aggregate, sub_agg])
-        aggregate.set_index(["Year", "Sex", "Age Group"], inplace=True)
+        data = self._obj.loc[idx[:, :, AGE_BANDS], :]
+        groups = (data.index.get_level_values("Age Group")
+                  .map(CANCER_AGE_GROUP_OF_BAND).astype(CANCER_AGE_GROUPS))
+        aggregate = data.groupby([data.index.get_level_values("Year"),
+                                  data.index.get_level_values("Sex"),
+                                  pd.Index(groups, name="Age Group")],
+                                 observed=True).sum()
+        aggregate.index = aggregate.index.set_levels(
+            aggregate.index.levels[2].astype(str), level="Age Group")
         aggregate.sort_index(inplace=True)
         return aggregate
 
+    @derived_table("band_totals")
+    def band_totals(self):
+        """Population totals over all age bands per year and sex."""
+        return self._obj.groupby(["Year", "Sex"]).agg("sum")
+
     def add_proportions(self):
         """Add column of population proportions per category."""
         data = self._obj
-        year_aggregated = data.groupby(["Year", "Sex"]).agg(sum)
-        data["Proportion"] = [pop / year_aggregated.loc[idx[year, sex]].Population
-                              for (year, sex, age), pop in data.itertuples()]
+        totals = data.groupby(level=["Year", "Sex"]).Population.transform("sum")
+        data["Proportion"] = data.Population / totals
         return data
 
     def plot(self, normalized=False, aggregate_cancer_groups=False):
@@ -127,17 +233,20 @@ class PopulationData:
 
 @register_dataframe_accessor("age_incidence_tools")
 class AgeIncidenceData:
+    TITLE = "Incidence by age: All invasive cancers (except NMSC) in Ireland"
+
     def __init__(self, pandas_obj):
         self._obj = pandas_obj
 
     @staticmethod
+    @derived_table("age_incidence")
     def read_csv(incidence_data):
         """Read NCRI cancer incidence by age group in CSV format."""
         data = pd.read_csv(incidence_data, sep=",")
         cols = list(data.columns)
         cols[0] = "Age Group"
         data.columns = cols
-        data["Year"] = [datetime(x, 1, 1) for x in data.Year]
+        data["Year"] = year_starts(data.Year)
         data = (data
                 .sort_values(by="Year")
                 .sort_values(by="Age Group", ascending=False, kind="stable"))
@@ -163,40 +272,18 @@ class AgeIncidenceData:
         incidence_plot = px.line(data, x="Year", y=y,
                                  color="Age Group",
                                  markers=True, width=750, height=500,
-                                 title=("Incidence by age: All invasive cancers "
-                                        "(except NMSC) in Ireland"),
-                                 template="plotly_white")
+                                 title=self.TITLE, template="plotly_white")
         incidence_plot = incidence_plot.update_layout(yaxis_title=y_title,
                                                       legend_title="Age Group")
         incidence_plot.update_xaxes(dtick="M60")
         return incidence_plot
 
     def _plot_combined(self):
-        raw = self.plot(raw_count=True)
-        rel = self.plot(raw_count=False)
-
-        age_plot = make_subplots(rows=1, cols=2,
-                                 subplot_titles=["a) Cases per age band",
-                                                 "b) Cases per 100K in age band"],
-                                 x_title="Year",
-                                 y_title="Cases")
-        for i, plot in enumerate([raw, rel], start=1):
-            for trace in plot.data:
-                age_plot.add_trace(trace, row=1, col=i)
-
-        age_plot.update_traces(showlegend=False, col=2)
-        age_plot.update_layout(title=raw.layout.title.text,
-                               legend_title="Age Group",
-                               template="plotly_white")
-        age_plot.update_xaxes(dtick="M60")
-
-        age_plot.layout.annotations[0].update(xanchor="left", xshift=-190)
-        age_plot.layout.annotations[1].update(xanchor="left", xshift=-190)
-
-        age_plot.update_layout(height=450, width=900)
-
-        return age_plot
+        return _combined_line_plot(self._obj, ["Case numbers", "Crude rate"], "Age Group",
+                                   ["a) Cases per age band", "b) Cases per 100K in age band"],
+                                   self.TITLE)
 
+    @derived_table("age_incidence_merged")
     def merge_with_population_table(self, population_df):
         pop_data = population_df.population_tools.aggregate_cancer_age_groups()
         pop_data = pop_data.loc[idx[:, "Both", :]].groupby(["Year", "Age Group"]).agg(sum)
@@ -207,22 +294,26 @@ class AgeIncidenceData:
 
 @register_dataframe_accessor("sex_incidence_tools")
 class SexIncidenceData:
+    TITLE = "Total incidence: All invasive cancers (except NMSC) in Ireland"
+
     def __init__(self, pandas_obj):
         self._obj = pandas_obj
 
     @staticmethod
+    @derived_table("sex_incidence")
     def read_csv(sex_incidence_csv):
         """Read NCRI cancer incidence by sex in CSV format."""
         incidence = pd.read_csv(sex_incidence_csv)
-        incidence["Year"] = [datetime(x, 1, 1) for x in incidence.Year]
+        incidence["Year"] = year_starts(incidence.Year)
         incidence.set_index(["Year", "Sex"], inplace=True)
         incidence.rename(index={"Males": "Male", "Females": "Female"},
                          level="Sex", inplace=True)
         return incidence
 
+    @derived_table("sex_incidence_merged")
     def merge_with_population_table(self, population_df):
         """Add population totals column from formatted CSO data."""
-        pop_data = population_df.groupby(["Year", "Sex"]).agg(sum)
+        pop_data = population_df.population_tools.band_totals()
         data = pd.merge(self._obj, pop_data, left_index=True, right_index=True)
         data["Relative numbers"] = data["Case numbers"] / data["Population"] * 100000
         return data
@@ -245,50 +336,117 @@ class SexIncidenceData:
         data = self._obj.reset_index()
         incidence_plot = px.line(data, x="Year", y=y, color="Sex",
                                  markers=True, width=750, height=500,
-                                 title=("Total incidence: All invasive cancers "
-                                        "(except NMSC) in Ireland"),
-                                 template="plotly_white")
+                                 title=self.TITLE, template="plotly_white")
         incidence_plot.update_layout(yaxis_title=y_title)
         incidence_plot.update_xaxes(dtick="M60")
         return incidence_plot
 
     def _plot_combined(self):
-        raw = self.plot(raw_count=True)
-        rel = self.plot(raw_count=False)
-
-        sex_plot = make_subplots(rows=1, cols=2,
-                                 subplot_titles=["a) Cases per sex",
-                                                 "b) Cases per 100K of sex"],
-                                 x_title="Year",
-                                 y_title="Cases")
-        for i, plot in enumerate([raw, rel], start=1):
-            for trace in plot.data:
-                sex_plot.add_trace(trace, row=1, col=i)
-
-        sex_plot.update_traces(showlegend=False, col=2)
-        sex_plot.update_layout(title=raw.layout.title.text,
-                               legend_title="Sex",
-                               template="plotly_white")
-        sex_plot.update_xaxes(dtick="M60")
-
-        sex_plot.layout.annotations[0].update(xanchor="left", xshift=-190)
-        sex_plot.layout.annotations[1].update(xanchor="left", xshift=-190)
-
-        sex_plot.update_layout(height=450, width=900)
-
-        return sex_plot
-
-
-def main(age_incidence_csv, sex_incidence_csv, population_csv, survival_csv):
-    """Read relevant data and return plots."""
+        return _combined_line_plot(self._obj, ["Case numbers", "Relative numbers"], "Sex",
+                                   ["a) Cases per sex", "b) Cases per 100K of sex"],
+                                   self.TITLE)
+
+
+SITE_READERS = {"age_incidence": AgeIncidenceData.read_csv,
+                "sex_incidence": SexIncidenceData.read_csv,
+                "survival": SurvivalData.read_csv,
+                "population": PopulationData.read_csv}
+
+
+def read_sites(paths, kind, max_workers=None):
+    """Read one NCRI/CSO export per cancer site in parallel into a single frame.
+
+    paths maps site names to CSVs of the same kind, a key of SITE_READERS. The
+    sites are stacked under a categorical "Site" index level and stored with
+    compact_dtypes, so e.g. frame.xs("Lung", level="Site") works with the usual
+    accessors. Returns the frame and a per-site report of rows, memory and load
+    time.
+    """
+    reader = SITE_READERS[kind]
+
+    def load(path):
+        start = time.perf_counter()
+        frame = compact_dtypes(reader(path))
+        return frame, time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers) as executor:
+        loaded = list(executor.map(load, paths.values()))
+    frames = [frame for frame, _ in loaded]
+    report = pd.DataFrame({"Rows": [len(frame) for frame in frames],
+                           "Bytes": [int(frame.memory_usage(deep=True).sum())
+                                     for frame in frames],
+                           "Seconds": [seconds for _, seconds in loaded]},
+                          index=pd.Index(list(paths), name="Site"))
+    # Categories differ between sites and concat falls back to object, so recompact.
+    frame = compact_dtypes(pd.concat(frames, keys=list(paths), names=["Site"]))
+    return frame, report
+
+
+def read_site_data(age_incidence_csv, sex_incidence_csv, population_csv, survival_csv):
+    """Read one site's exports and merge incidence with population."""
     age_incidence = AgeIncidenceData.read_csv(age_incidence_csv)
     sex_incidence = SexIncidenceData.read_csv(sex_incidence_csv)
     population = PopulationData.read_csv(population_csv)
     age_incidence = age_incidence.age_incidence_tools.merge_with_population_table(population)
     sex_incidence = sex_incidence.sex_incidence_tools.merge_with_population_table(population)
     survival = SurvivalData.read_csv(survival_csv)
+    return age_incidence, sex_incidence, survival
+
+
+# Figure name -> builder taking read_site_data's tables.
+FIGURES = {
+    "Incidence by age": lambda age, sex, survival: age.age_incidence_tools.plot(combined=True),
+    "Incidence by sex": lambda age, sex, survival: sex.sex_incidence_tools.plot(combined=True),
+    "Survival": lambda age, sex, survival: survival.survival_tools.plot(),
+}
+
+
+def _render_site(paths):
+    # Runs in a worker process: figures go back as HTML fragments, not Figures.
+    start = time.perf_counter()
+    tables = read_site_data(paths["age_incidence"], paths["sex_incidence"],
+                            paths["population"], paths["survival"])
+    timings = {"data": (time.perf_counter() - start, 0.0)}
+    fragments = []
+    for name, build in FIGURES.items():
+        start = time.perf_counter()
+        figure = build(*tables)
+        built = time.perf_counter()
+        fragments.append((name, figure.to_html(full_html=False, include_plotlyjs=False)))
+        timings[name] = (built - start, time.perf_counter() - built)
+    return fragments, timings
+
+
+def write_report(sites, path, title="NCRI cancer statistics", max_workers=None):
+    """Render the FIGURES of every site in a process pool into one HTML file.
+
+    sites maps site names to {kind: csv} dicts with the age_incidence,
+    sex_incidence, population and survival exports. plotly.js is embedded once
+    and shared by all figures. Returns the build and render time of each
+    figure, plus data loading, indexed by site and figure.
+    """
+    from html import escape
+    from plotly.offline import get_plotlyjs
+
+    with ProcessPoolExecutor(max_workers) as executor:
+        rendered = list(executor.map(_render_site, sites.values()))
+    with open(path, "w", encoding="utf-8") as outfile:
+        outfile.write(f'<!DOCTYPE html>\n<html>\n<head>\n<meta charset="utf-8">\n'
+                      f"<title>{escape(title)}</title>\n"
+                      f'<script type="text/javascript">{get_plotlyjs()}</script>\n'
+                      f"</head>\n<body>\n<h1>{escape(title)}</h1>\n")
+        for site, (fragments, _) in zip(sites, rendered):
+            outfile.write(f"<h2>{escape(site)}</h2>\n")
+            for name, fragment in fragments:
+                outfile.write(f"<h3>{escape(name)}</h3>\n{fragment}\n")
+        outfile.write("</body>\n</html>\n")
+    timings = [(site, name, build, render) for site, (_, site_timings) in zip(sites, rendered)
+               for name, (build, render) in site_timings.items()]
+    return pd.DataFrame(timings, columns=["Site", "Figure", "Build seconds", "Render seconds"]
+                        ).set_index(["Site", "Figure"])
+
 
-    age_plot = age_incidence.age_incidence_tools.plot(combined=True)
-    sex_plot = sex_incidence.sex_incidence_tools.plot(combined=True)
-    survival_plot = survival.survival_tools.plot()
-    return age_plot, sex_plot, survival_plot
+def main(age_incidence_csv, sex_incidence_csv, population_csv, survival_csv):
+    """Read relevant data and return plots."""
+    tables = read_site_data(age_incidence_csv, sex_incidence_csv, population_csv, survival_csv)
+    return tuple(build(*tables) for build in FIGURES.values())
@@ -0,0 +1,141 @@
+import sqlite3
+import threading
+import time
+from collections import Counter
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+
+class PageCache:
+    """Persistent HTTP response cache keyed by URL.
+
+    Bodies are stored in SQLite together with their ETag/Last-Modified validators.
+    Entries younger than `ttl` seconds are served without touching the network;
+    older ones are revalidated with a conditional request. The least recently used
+    entries are evicted once the stored bodies exceed `max_bytes`, and entries not
+    refreshed within `max_age` seconds are dropped. In offline mode pages are only
+    ever served from the cache.
+    """
+
+    def __init__(self, path, ttl=0, max_bytes=None, max_age=None, offline=False):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.offline = offline
+        self.stats = Counter(hits=0, misses=0, revalidated=0)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS pages ("
+                "url TEXT PRIMARY KEY, body BLOB, etag TEXT, last_modified TEXT, "
+                "fetched REAL, accessed REAL, size INTEGER)"
+            )
+            self._evict(time.time())
+
+    def __repr__(self):
+        return (f"PageCache(path='{self.path}', ttl={self.ttl}, "
+                f"max_bytes={self.max_bytes}, offline={self.offline})")
+
+    def __contains__(self, url):
+        return self._lookup(url) is not None
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self._connection.close()
+
+    def clear(self):
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM pages")
+
+    def fetch(self, url):
+        entry = self._lookup(url)
+        now = time.time()
+        if self.offline:
+            if entry is None:
+                raise LookupError(f"No cached copy of {url} available in offline mode.")
+            self._record_hit(url, now)
+            return entry[0]
+        if entry is not None and now - entry[3] < self.ttl:
+            self._record_hit(url, now)
+            return entry[0]
+
+        body, etag, last_modified, fetched = entry if entry is not None else (None,) * 4
+        request = Request(url)
+        if etag:
+            request.add_header("If-None-Match", etag)
+        if last_modified:
+            request.add_header("If-Modified-Since", last_modified)
+        try:
+            with urlopen(request) as response:
+                body = response.read()
+                etag = response.headers.get("ETag")
+                last_modified = response.headers.get("Last-Modified")
+        except HTTPError as err:
+            if err.code != 304 or entry is None:
+                raise
+            with self._lock, self._connection:
+                self._connection.execute(
+                    "UPDATE pages SET fetched = ?, accessed = ? WHERE url = ?",
+                    (now, now, url)
+                )
+                self.stats["revalidated"] += 1
+                self._evict(now, keep=url)
+            return body
+        self._store(url, body, etag, last_modified, now)
+        return body
+
+    def _lookup(self, url):
+        with self._lock:
+            return self._connection.execute(
+                "SELECT body, etag, last_modified, fetched FROM pages WHERE url = ?",
+                (url,)
+            ).fetchone()
+
+    def _record_hit(self, url, now):
+        with self._lock, self._connection:
+            self._connection.execute("UPDATE pages SET accessed = ? WHERE url = ?",
+                                     (now, url))
+            self.stats["hits"] += 1
+            self._evict(now, keep=url)
+
+    def _store(self, url, body, etag, last_modified, now):
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (url, body, etag, last_modified, now, now, len(body))
+            )
+            self.stats["misses"] += 1
+            self._evict(now, keep=url)
+
+    def _evict(self, now, keep=None):
+        # Runs on every store, hit and revalidation, and when the cache is opened;
+        # the page being served (keep) is never evicted.
+        if self.max_age is not None:
+            self._connection.execute("DELETE FROM pages WHERE fetched < ? AND url IS NOT ?",
+                                     (now - self.max_age, keep))
+        if self.max_bytes is None:
+            return
+        total = self._connection.execute("SELECT SUM(size) FROM pages").fetchone()[0] or 0
+        if total <= self.max_bytes:
+            return
+        entries = self._connection.execute(
+            "SELECT url, size FROM pages WHERE url IS NOT ? ORDER BY accessed", (keep,)
+        ).fetchall()
+        evicted = []
+        for url, size in entries:
+            if total <= self.max_bytes:
+                break
+            evicted.append((url,))
+            total -= size
+        self._connection.executemany("DELETE FROM pages WHERE url = ?", evicted)
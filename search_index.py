@@ -0,0 +1,145 @@
+import re
+
+REGEX_CHARACTERS = set(".^$*+?{}[]\\|()")
+TOKEN_PATTERN = re.compile(r"\w+")
+FIELD_WEIGHTS = {"code": 3, "description": 3}
+
+
+def link_name(thing):
+    """Name used for an object reached through a link field."""
+    if hasattr(thing, "code"):
+        return thing.code
+    if hasattr(thing, "description"):
+        return thing.description
+    return str(thing)
+
+
+def field_text(thing, field):
+    if field == "description" and hasattr(thing, "description_variants"):
+        return "\n".join(thing.description_variants)  # Every wording is searchable.
+    value = getattr(thing, field)
+    if isinstance(value, (list, tuple, set, frozenset)):
+        value = ", ".join([link_name(x) for x in value])
+    return value
+
+
+def is_literal(search_text):
+    return isinstance(search_text, str) and not REGEX_CHARACTERS & set(search_text)
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(text.casefold())
+
+
+class SearchIndex:
+    """Token and trigram index over the searchable fields of one object mapping.
+
+    Literal substring queries intersect trigram postings and only verify the
+    surviving candidates; token queries intersect case-folded token postings.
+    Call reindex() with the keys of changed objects to keep it current.
+    """
+
+    def __init__(self, objects, fields):
+        self.objects = objects
+        self.fields = tuple(fields)
+        self._texts = {}
+        self._trigrams = {}
+        self._tokens = {}
+        self._positions = {}
+        for key, thing in objects.items():
+            self._add(key, thing)
+        self.reorder()
+
+    def __len__(self):
+        return len(self._texts)
+
+    def _add(self, key, thing):
+        texts = {field: field_text(thing, field) for field in self.fields}
+        self._texts[key] = texts
+        for field, text in texts.items():
+            for gram in {text[i:i + 3] for i in range(len(text) - 2)}:
+                self._trigrams.setdefault((field, gram), set()).add(key)
+            for token in set(tokenize(text)):
+                self._tokens.setdefault((field, token), set()).add(key)
+
+    def _remove(self, key):
+        texts = self._texts.pop(key, None)
+        if texts is None:
+            return
+        for field, text in texts.items():
+            for gram in {text[i:i + 3] for i in range(len(text) - 2)}:
+                self._trigrams[(field, gram)].discard(key)
+            for token in set(tokenize(text)):
+                self._tokens[(field, token)].discard(key)
+
+    def reindex(self, keys):
+        for key in keys:
+            self._remove(key)
+            if key in self.objects:
+                self._add(key, self.objects[key])
+        self.reorder()
+
+    def texts(self, fields=None):
+        """Yield (key, [field texts]) for every indexed object in mapping order."""
+        fields = self.fields if fields is None else fields
+        for key in self._positions:
+            texts = self._texts[key]
+            yield key, [texts[field] for field in fields]
+
+    def reorder(self):
+        self._positions = {key: i for i, key in enumerate(self.objects)}
+
+    def substring(self, search_text, fields=None):
+        """Map matching keys to the fields containing search_text (case-sensitive)."""
+        fields = self.fields if fields is None else fields
+        grams = {search_text[i:i + 3] for i in range(len(search_text) - 2)}
+        matches = {}
+        for field in fields:
+            if grams:
+                postings = sorted((self._trigrams.get((field, gram), set())
+                                   for gram in grams), key=len)
+                candidates = set(postings[0]).intersection(*postings[1:])
+            else:
+                candidates = self._texts  # Too short to index; verify every text.
+            for key in candidates:
+                if search_text in self._texts[key][field]:
+                    matches.setdefault(key, []).append(field)
+        return matches
+
+    def regex(self, pattern, fields=None):
+        """Map keys whose rendered fields match pattern to those fields."""
+        fields = self.fields if fields is None else fields
+        pattern = re.compile(pattern)
+        matches = {}
+        for key, texts in self._texts.items():
+            for field in fields:
+                if pattern.search(texts[field]):
+                    matches.setdefault(key, []).append(field)
+        return matches
+
+    def tokens(self, search_text, fields=None):
+        """Map keys whose fields contain every token of search_text to those fields."""
+        fields = self.fields if fields is None else fields
+        matches = None
+        matched_fields = {}
+        for token in set(tokenize(search_text)):
+            found = set()
+            for field in fields:
+                keys = self._tokens.get((field, token), set())
+                found |= keys
+                for key in keys:
+                    matched_fields.setdefault(key, set()).add(field)
+            matches = found if matches is None else matches & found
+        return {key: sorted(matched_fields[key]) for key in matches or ()}
+
+    def order(self, matches, rank=False, limit=None):
+        """Return matched objects in mapping order, or by score if rank is set."""
+        if rank:
+            keys = sorted(matches, key=lambda key: (
+                -sum(FIELD_WEIGHTS.get(field, 1) for field in matches[key]),
+                self._positions[key]))
+        else:
+            keys = sorted(matches, key=self._positions.__getitem__)
+        if limit is not None:
+            keys = keys[:limit]
+        return [self.objects[key] for key in keys]
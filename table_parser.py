@@ -0,0 +1,256 @@
+from html import escape
+from html.parser import HTMLParser
+
+# Mirrors bs4's html.parser tree builder closely enough that parse_table and
+# friends give identical results, but only builds nodes inside <table> elements.
+VOID_ELEMENTS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "keygen",
+                 "link", "menuitem", "meta", "param", "source", "track", "wbr",
+                 "basefont", "bgsound", "command", "frame", "image", "isindex",
+                 "nextid", "spacer"}
+PRESERVE_WHITESPACE_TAGS = {"pre", "textarea"}
+SPECIAL_STRING_TAGS = {"rt", "rp", "style", "script", "template"}
+ASCII_SPACES = "\x20\x0a\x09\x0c\x0d"
+
+
+class Comment(str):
+    pass
+
+
+class SpecialString(str):
+    """Text whose bs4 counterpart is not a plain NavigableString."""
+
+
+class TableNode:
+    __slots__ = ("name", "attrs", "parent", "contents")
+
+    def __init__(self, name, attrs, parent=None):
+        self.name = name
+        self.attrs = attrs
+        self.parent = parent
+        self.contents = []
+
+    def __getitem__(self, key):
+        return self.attrs[key]
+
+    def __repr__(self):
+        return str(self)
+
+    def __str__(self):
+        parts = []
+        self._render(parts)
+        return "".join(parts)
+
+    def _render(self, parts):
+        attrs = "".join(f" {key}={_quote_attribute(value)}"
+                        for key, value in self.attrs.items())
+        if self.name in VOID_ELEMENTS and not self.contents:
+            parts.append(f"<{self.name}{attrs}/>")
+            return
+        parts.append(f"<{self.name}{attrs}>")
+        for child in self.contents:
+            if isinstance(child, TableNode):
+                child._render(parts)
+            elif isinstance(child, Comment):
+                parts.append(f"<!--{child}-->")
+            elif isinstance(child, SpecialString):
+                parts.append(child)
+            else:
+                parts.append(escape(child, quote=False))
+        parts.append(f"</{self.name}>")
+
+    @property
+    def descendants(self):
+        stack = [iter(self.contents)]
+        while stack:
+            for child in stack[-1]:
+                yield child
+                if isinstance(child, TableNode):
+                    stack.append(iter(child.contents))
+                    break
+            else:
+                stack.pop()
+
+    def _find(self, name=None, string=None):
+        if string is None:
+            return self._find_tags(name)
+        if hasattr(string, "search"):
+            return (node for node in self.descendants
+                    if isinstance(node, str) and string.search(node))
+        return (node for node in self.descendants if node == string)
+
+    def _find_tags(self, name):
+        for child in self.contents:
+            if isinstance(child, TableNode):
+                if child.name == name:
+                    yield child
+                if child.contents:
+                    yield from child._find_tags(name)
+
+    def find_all(self, name=None, string=None):
+        return list(self._find(name, string))
+
+    def find(self, name=None, string=None):
+        return next(self._find(name, string), None)
+
+    @property
+    def string(self):
+        if len(self.contents) != 1:
+            return None
+        child = self.contents[0]
+        if isinstance(child, TableNode):
+            return child.string
+        return child
+
+    def get_text(self):
+        return "".join(node for node in self.descendants
+                       if isinstance(node, str) and not isinstance(node, Comment))
+
+    @property
+    def text(self):
+        return self.get_text()
+
+
+def _quote_attribute(value):
+    value = escape(value, quote=False)
+    if '"' not in value:
+        return f'"{value}"'
+    if "'" not in value:
+        return f"'{value}'"
+    return '"' + value.replace('"', "&quot;") + '"'
+
+
+class _TableTreeBuilder(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.root = TableNode("[document]", {})
+        self._stack = []  # (name, TableNode or None) for every open tag in the page.
+        self._open_counts = {}
+        self._preserve_depth = 0
+        self._special_depth = 0
+        self._already_closed_empty = []
+        self._data = []
+
+    def _current(self):
+        return self._stack[-1][1] if self._stack else None
+
+    def _end_data(self, string_class=None):
+        if not self._data:
+            return
+        data = "".join(self._data)
+        self._data = []
+        if not self._preserve_depth and not data.strip(ASCII_SPACES):
+            data = "\n" if "\n" in data else " "
+        if (parent := self._current()) is None:
+            return
+        if string_class is None and self._special_depth:
+            string_class = SpecialString
+        parent.contents.append(data if string_class is None else string_class(data))
+
+    def _pop_to(self, name):
+        while self._open_counts.get(name):
+            popped, _ = self._stack.pop()
+            self._open_counts[popped] -= 1
+            if popped in PRESERVE_WHITESPACE_TAGS:
+                self._preserve_depth -= 1
+            elif popped in SPECIAL_STRING_TAGS:
+                self._special_depth -= 1
+            if popped == name:
+                break
+
+    def handle_starttag(self, tag, attrs, handle_empty_element=True):
+        self._end_data()
+        parent = self._current()
+        node = None
+        if parent is not None or tag == "table":
+            attr_dict = {}
+            for key, value in attrs:
+                attr_dict[key] = "" if value is None else value
+            node = TableNode(tag, attr_dict, parent if parent is not None else self.root)
+            node.parent.contents.append(node)
+        self._stack.append((tag, node))
+        self._open_counts[tag] = self._open_counts.get(tag, 0) + 1
+        if tag in PRESERVE_WHITESPACE_TAGS:
+            self._preserve_depth += 1
+        elif tag in SPECIAL_STRING_TAGS:
+            self._special_depth += 1
+        if tag in VOID_ELEMENTS and handle_empty_element:
+            self.handle_endtag(tag, check_already_closed=False)
+            self._already_closed_empty.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs, handle_empty_element=False)
+        self.handle_endtag(tag, check_already_closed=False)
+
+    def handle_endtag(self, tag, check_already_closed=True):
+        if check_already_closed and tag in self._already_closed_empty:
+            self._already_closed_empty.remove(tag)
+            return
+        self._end_data()
+        self._pop_to(tag)
+
+    def handle_data(self, data):
+        self._data.append(data)
+
+    def handle_comment(self, data):
+        self._end_data()
+        self._data.append(data)
+        self._end_data(Comment)
+
+    def handle_decl(self, decl):
+        self._end_data()
+        self._data.append(decl)
+        self._end_data(SpecialString)
+
+    def handle_pi(self, data):
+        self.handle_decl(data)
+
+    def unknown_decl(self, data):
+        self.handle_decl(data)
+
+    def close(self):
+        super().close()
+        self._end_data()
+
+
+class _LxmlTarget:
+    # Feeds lxml's parser events into the same tree builder. lxml repairs broken
+    # markup differently from html.parser, so this is only exact for well-formed
+    # pages such as the NCCP ones.
+    def __init__(self, builder):
+        self.builder = builder
+
+    def start(self, tag, attrib):
+        self.builder.handle_starttag(tag, list(attrib.items()))
+
+    def end(self, tag):
+        if tag not in VOID_ELEMENTS:
+            self.builder.handle_endtag(tag)
+
+    def data(self, data):
+        self.builder.handle_data(data)
+
+    def comment(self, text):
+        self.builder.handle_comment(text)
+
+    def close(self):
+        self.builder._end_data()
+        return self.builder.root
+
+
+def parse_table_tree(html, use_lxml=False):
+    """Parse html into a tree holding only its <table> elements.
+
+    The returned root supports the subset of the bs4 Tag API used by
+    parse_table: find/find_all, string, text, attribute access and str().
+    """
+    if isinstance(html, bytes):
+        from bs4.dammit import UnicodeDammit
+        html = UnicodeDammit(html, is_html=True).unicode_markup
+    builder = _TableTreeBuilder()
+    if use_lxml and html.strip():
+        from lxml import etree
+        parser = etree.HTMLParser(encoding="utf-8", target=_LxmlTarget(builder))
+        return etree.fromstring(html.encode("utf-8"), parser)
+    builder.feed(html)
+    builder.close()
+    return builder.root
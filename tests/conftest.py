@@ -0,0 +1,90 @@
+import copy
+import functools
+import http.server
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(ROOT), str(ROOT / "benchmarks")]
+
+import fixtures  # noqa: E402
+import nccp_chemotherapy_regimens as nccp  # noqa: E402
+
+
+def pytest_configure(config):
+    # Parse and merge warnings about the fixture's known quirks are expected.
+    config.addinivalue_line("filterwarnings", "ignore:::nccp_chemotherapy_regimens")
+
+
+class _QuietHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope="session")
+def site():
+    """Base URL of a local server standing in for www.hse.ie, serving the fixtures."""
+    handler = functools.partial(_QuietHandler, directory=fixtures.FIXTURE_DIR)
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}/"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def page_urls(site):
+    # Distinct URLs for the same page, as the tumour-group pages are.
+    return [f"{site}test_file.html?group={i}" for i in range(4)]
+
+
+@pytest.fixture
+def pages():
+    return fixtures.fresh_copy(fixtures.fixture_pages())
+
+
+def snapshot(database):
+    """Everything a full rebuild determines: objects, their order and their links."""
+    regimens = [(key, regimen.description, sorted(regimen.diseases),
+                 sorted(indication.code for indication in regimen.indication_codes))
+                for key, regimen in database.regimens.items()]
+    indications = [(key, indication.code, indication.description_variants,
+                    indication.source_url, sorted(indication.diseases),
+                    sorted(regimen.description for regimen in indication.regimens))
+                   for key, indication in database.indications.items()]
+    for indication in database.indications.values():
+        for regimen in indication.regimens:
+            assert database.regimens[regimen.description] is regimen
+    return regimens, indications
+
+
+def rebuild(pages, **kwargs):
+    return nccp.NCCP_Chemotherapy_Database.from_parsed_tables(pages, **kwargs)
+
+
+def edit_pages(pages, rng):
+    """Return a copy of pages with a few rows, tables or whole pages changed."""
+    pages = copy.deepcopy(pages)
+    urls = [url for url, tables in pages.items() if tables]
+    for _ in range(rng.randint(1, 3) if urls else 0):
+        tables = pages[rng.choice(urls)]
+        caption, rows = tables[rng.randrange(len(tables))]
+        action = rng.choice(["drop", "shuffle", "move", "rename"])
+        if action == "drop":
+            del rows[:rng.randrange(len(rows) + 1)]
+        elif action == "shuffle":
+            rng.shuffle(rows)
+        elif action == "move" and rows:
+            pages[rng.choice(urls)][0][1].append(rows.pop())
+        elif rows:
+            name, link, indications = rows[0]
+            rows[0] = (f"{name} (renamed)", link, indications)
+    if urls and rng.random() < 0.3:
+        del pages[rng.choice(urls)]
+    if urls and rng.random() < 0.3:
+        pages[f"{urls[0]}new/"] = copy.deepcopy(pages.get(urls[0], []))
+    return pages
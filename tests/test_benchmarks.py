@@ -0,0 +1,30 @@
+from run_benchmarks import environment, find_regressions
+
+HERE = {"python": "3.11.7", "machine": "here"}
+
+
+def run(median, **env):
+    return {**HERE, **env, "results": {"search@1x": {"median": median}}}
+
+
+def test_regressions_compare_only_the_same_environment():
+    history = [run(1.0), run(0.1, machine="faster"), run(0.1, python="3.13.0")]
+    result = {"search@1x": {"median": 1.1}}
+    assert find_regressions(result, history, threshold=0.2, window=5, env=HERE) == []
+    result = {"search@1x": {"median": 1.5}}
+    assert find_regressions(result, history, threshold=0.2, window=5, env=HERE) == [
+        ("search@1x", 1.5, 1.0)]
+
+
+def test_reference_is_the_median_of_the_last_window_runs():
+    history = [run(10.0), run(1.0), run(2.0), run(3.0)]
+    result = {"search@1x": {"median": 2.3}, "new@1x": {"median": 9.0}}
+    assert find_regressions(result, history, threshold=0.1, window=3, env=HERE) == [
+        ("search@1x", 2.3, 2.0)]
+
+
+def test_default_environment_is_the_current_one():
+    history = [{**environment(), "results": {"search@1x": {"median": 1.0}}}]
+    result = {"search@1x": {"median": 2.0}}
+    assert find_regressions(result, history, threshold=0.2, window=5) == [
+        ("search@1x", 2.0, 1.0)]
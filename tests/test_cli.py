@@ -0,0 +1,80 @@
+import json
+import subprocess
+import sys
+
+import pytest
+
+import nccp
+from conftest import ROOT, rebuild
+
+LAZY = """
+import sys
+import nccp
+nccp.main(sys.argv[1:])
+print(sorted(module for module in ("pandas", "bs4", "plotly") if module in sys.modules))
+"""
+
+
+@pytest.fixture
+def database(pages):
+    return rebuild(pages)
+
+
+@pytest.fixture
+def snapshot_path(database, tmp_path):
+    path = tmp_path / "database.sqlite"
+    database.save(path)
+    return str(path)
+
+
+def run(capsys, *argv):
+    assert nccp.main(list(argv)) == 0
+    return capsys.readouterr().out
+
+
+def test_search(database, snapshot_path, capsys):
+    expected = [ind.code for ind in database.search_indications("HER2")]
+    assert expected
+    lines = run(capsys, "--database", snapshot_path, "search", "HER2").splitlines()
+    assert [line.split("\t")[0] for line in lines] == expected
+    records = json.loads(run(capsys, "--database", snapshot_path, "search", "HER2",
+                             "--limit", "2", "--json"))
+    assert [record["code"] for record in records] == expected[:2]
+
+
+def test_show_indication_and_regimen(database, snapshot_path, capsys):
+    indication = next(iter(database.indications.values()))
+    record = json.loads(run(capsys, "--database", snapshot_path, "show-indication",
+                            indication.code, "--json"))
+    assert record["code"] == indication.code
+    assert record["description"] == indication.description
+    regimen = sorted(record["regimens"])[0]
+    record = json.loads(run(capsys, "--database", snapshot_path, "show-regimen", regimen,
+                            "--json"))
+    assert indication.code in record["indications"]
+    text = run(capsys, "--database", snapshot_path, "show-indication", indication.code)
+    assert text.splitlines()[0].split() == ["code", indication.code]
+
+
+def test_unknown_keys_and_missing_database_exit(snapshot_path, tmp_path):
+    with pytest.raises(SystemExit, match="No indication"):
+        nccp.main(["--database", snapshot_path, "show-indication", "nonsense"])
+    with pytest.raises(SystemExit, match="No database"):
+        nccp.main(["--database", str(tmp_path / "missing.sqlite"), "search", "HER2"])
+
+
+def test_lookups_do_not_import_heavy_modules(database, snapshot_path):
+    code = next(iter(database.indications))
+    for argv in (["show-indication", code], ["search", "HER2"]):
+        output = subprocess.run([sys.executable, "-c", LAZY, "--database", snapshot_path,
+                                 *argv], cwd=ROOT, check=True, capture_output=True,
+                                text=True).stdout
+        assert output.splitlines()[-1] == "[]"
+
+
+def test_module_entry_point_forwards_global_options(database, snapshot_path):
+    code = next(iter(database.indications))
+    output = subprocess.run([sys.executable, "-W", "ignore", "nccp_chemotherapy_regimens.py",
+                             "--database", snapshot_path, "show-indication", code, "--json"],
+                            cwd=ROOT, check=True, capture_output=True, text=True).stdout
+    assert json.loads(output)["code"] == code
@@ -0,0 +1,97 @@
+import json
+import random
+
+import pytest
+
+import nccp
+from conftest import edit_pages, rebuild
+from fixtures import FIXTURE_DIR
+from nccp_chemotherapy_regimens import entity_fields, read_code_file
+from nccp_diff import KINDS, changefeed, diff
+
+
+def expected_changes(old, new):
+    """{(kind, key): change} from every entity's fields, without any hashing."""
+    changes = {}
+    for kind in KINDS:
+        before = {key: entity_fields(kind, thing) for key, thing in getattr(old, kind).items()}
+        after = {key: entity_fields(kind, thing) for key, thing in getattr(new, kind).items()}
+        for key in before.keys() | after.keys():
+            if key not in before:
+                changes[kind, key] = "added"
+            elif key not in after:
+                changes[kind, key] = "removed"
+            elif before[key] != after[key]:
+                changes[kind, key] = "modified"
+    return changes
+
+
+def saved(database, path):
+    database.save(path)
+    return path
+
+
+@pytest.fixture
+def builds(pages):
+    rng = random.Random(1)
+    history = [pages]
+    for _ in range(3):
+        history.append(edit_pages(history[-1], rng))
+    return [rebuild(pages) for pages in history]
+
+
+def test_identical_builds_have_no_changes(pages):
+    report = diff(rebuild(pages), rebuild(pages))
+    assert report["changes"] == []
+    assert report["summary"] == {kind: {"added": 0, "removed": 0, "modified": 0}
+                                 for kind in KINDS}
+
+
+def test_changes_match_a_field_by_field_comparison(builds, tmp_path):
+    old, new = builds[0], builds[-1]
+    report = diff(old, new)
+    changes = {(change["kind"], change["key"]): change["change"]
+               for change in report["changes"]}
+    assert changes == expected_changes(old, new)
+    assert changes
+    assert report["summary"] == {
+        kind: {change: sum(1 for (k, _), c in changes.items() if (k, c) == (kind, change))
+               for change in ("added", "removed", "modified")}
+        for kind in KINDS}
+    paths = saved(old, tmp_path / "old.sqlite"), saved(new, tmp_path / "new.sqlite")
+    assert diff(*paths) == report
+
+
+def test_modified_fields_list_added_and_removed_links(builds):
+    old, new = builds[0], builds[-1]
+    for change in diff(old, new)["changes"]:
+        if change["change"] != "modified":
+            continue
+        before = entity_fields(change["kind"], getattr(old, change["kind"])[change["key"]])
+        after = entity_fields(change["kind"], getattr(new, change["kind"])[change["key"]])
+        for field, value in change["fields"].items():
+            if "added" in value:
+                assert value["added"] == sorted(set(after[field]) - set(before[field]))
+                assert value["removed"] == sorted(set(before[field]) - set(after[field]))
+            else:
+                assert value == {"old": before[field], "new": after[field]}
+
+
+def test_code_file_reports_missing_and_unlisted_codes(builds):
+    code_file = FIXTURE_DIR / "all_indication_codes.txt"
+    report = diff(builds[0], builds[-1], code_file)
+    listed, scraped = read_code_file(code_file), set(builds[-1].indications)
+    assert report["missing_codes"] == sorted(listed - scraped)
+    assert report["unlisted_codes"] == sorted(scraped - listed)
+
+
+def test_changefeed_diffs_consecutive_builds(builds):
+    expected = [diff(old, new) for old, new in zip(builds, builds[1:])]
+    assert list(changefeed(builds)) == expected
+
+
+def test_cli_diff(builds, tmp_path, capsys):
+    old = saved(builds[0], tmp_path / "old.sqlite")
+    new = saved(builds[1], tmp_path / "new.sqlite")
+    assert nccp.main(["--database", str(new), "diff", str(old)]) == 0
+    assert json.loads(capsys.readouterr().out) == json.loads(json.dumps(diff(old, new)))
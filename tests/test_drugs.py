@@ -0,0 +1,59 @@
+import pytest
+
+from conftest import ROOT, rebuild
+from nccp_drugs import JOIN_COLUMNS, DrugIndex, name_tokens, read_drug_database
+
+DRUG_DATABASE = ROOT / "AntiCancerFund" / "cancerdrugsdb.txt"
+
+
+@pytest.fixture(scope="module")
+def drugs():
+    return read_drug_database(DRUG_DATABASE)
+
+
+@pytest.fixture
+def index(drugs):
+    return DrugIndex(drugs, synonyms={"Taxol": "Paclitaxel"})
+
+
+def test_read_drug_database_types(drugs):
+    row = drugs.loc["Abemaciclib"]
+    assert row["DrugBank ID"] == "DB12001" and row["ChEMBL"] == "CHEMBL3301610"
+    assert row["EMA"] and not row["EN"]
+    assert row["Year"] == 2017
+    assert "CDK4" in row["Targets"] and isinstance(row["Targets"], tuple)
+    assert row["Last Update"].year == 2022
+
+
+@pytest.mark.parametrize("description, expected", [
+    ("Nab-Paclitaxel Monotherapy", ("Nab-Paclitaxel",)),
+    ("Carboplatin and PACLitaxel therapy", ("Carboplatin", "Paclitaxel")),
+    ("Taxol then paclitaxel", ("Paclitaxel",)),
+    ("Trastuzumab emtansine (Kadcyla)", ("Trastuzumab Emtansine",)),
+    ("Watchful waiting", ()),
+])
+def test_drugs_in_takes_the_longest_name(index, description, expected):
+    assert index.drugs_in(description) == expected
+
+
+def test_synonyms_must_name_a_known_product(index):
+    with pytest.raises(KeyError):
+        index.add_synonym("Wonder drug", "Nonexistent")
+
+
+def test_join_lists_one_row_per_regimen_and_drug(index, drugs, pages):
+    database = rebuild(pages)
+    table = index.join(database.regimens.values())
+    assert list(table.columns) == list(JOIN_COLUMNS)
+    expected = [(name, product) for name in database.regimens
+                for product in index.drugs_in(name)]
+    assert list(zip(table["Regimen"], table["Drug"])) == expected
+    assert expected
+    for row in table.head(20).itertuples(index=False):
+        assert row[2] == drugs.loc[row[1], "DrugBank ID"]
+        assert row[5] == "; ".join(drugs.loc[row[1], "Targets"])
+    assert index.join(list(database.regimens)).equals(table)
+
+
+def test_name_tokens():
+    assert name_tokens("Nab-Paclitaxel (Abraxane®)") == ("nab", "paclitaxel", "abraxane")
@@ -0,0 +1,116 @@
+import csv
+import io
+import json
+
+import pytest
+
+import nccp
+from conftest import rebuild
+from nccp_export import INDICATION_COLUMNS, write_tsv
+
+VARIANTS = "Description Variants"
+
+
+@pytest.fixture
+def database(pages):
+    return rebuild(pages)
+
+
+@pytest.fixture
+def snapshot_path(database, tmp_path):
+    path = tmp_path / "database.sqlite"
+    database.save(path)
+    return path
+
+
+def read_tsv(path_or_text):
+    text = path_or_text if isinstance(path_or_text, str) else path_or_text.read_text()
+    return [line.split("\t") for line in text.split("\n")[:-1]]
+
+
+def test_default_tsv_keeps_the_table_export_layout(database):
+    outfile = io.StringIO()
+    write_tsv(database.indications.values(), outfile)
+    rows = read_tsv(outfile.getvalue())
+    assert tuple(rows[0]) == INDICATION_COLUMNS == (
+        "Code", "Indication", "Categories", "Regimen", "URL")
+    assert len(rows) == len(database.indications) + 1
+    assert outfile.getvalue() == database.tabulate_indications().to_csv(sep="\t")
+
+
+def test_variants_column_is_opt_in(database):
+    columns = (*INDICATION_COLUMNS, VARIANTS)
+    table = database.indication_columns(columns)
+    assert tuple(table) == columns
+    variants = dict(zip(table["Code"], table[VARIANTS]))
+    expected = database.indications["00254b"].description_variants
+    assert len(expected) > 1
+    assert variants["00254b"] == "\n".join(expected[1:])
+    assert VARIANTS not in database.indication_columns()
+
+
+def test_compact_database_exports_the_same_columns(database):
+    compact = database.compact()
+    assert tuple(compact.indication_columns()) == INDICATION_COLUMNS
+    # Categories and Regimen join sets, whose order the compact arrays don't keep.
+    columns = ("Code", "Indication", "URL", VARIANTS)
+    assert compact.indication_columns(columns) == database.indication_columns(columns)
+
+
+def test_unknown_column_is_rejected(database):
+    with pytest.raises(ValueError):
+        database.indication_columns(["Code", "Nonsense"])
+
+
+def test_cli_export(snapshot_path, tmp_path):
+    path = tmp_path / "indications.tsv"
+    nccp.main(["--database", str(snapshot_path), "export", str(path)])
+    assert tuple(read_tsv(path)[0]) == INDICATION_COLUMNS
+    nccp.main(["--database", str(snapshot_path), "export", str(path), "--with-variants"])
+    assert tuple(read_tsv(path)[0]) == (*INDICATION_COLUMNS, VARIANTS)
+    path = tmp_path / "indications.jsonl"
+    nccp.main(["--database", str(snapshot_path), "export", str(path),
+               "--columns", "Code", "URL", "--with-variants"])
+    record = json.loads(path.read_text().splitlines()[0])
+    assert list(record) == ["Code", "URL", VARIANTS]
+
+
+def read_back(path, fmt):
+    if fmt == "tsv":
+        with open(path, newline="") as infile:
+            rows = list(csv.reader(infile, delimiter="\t"))
+        return {column: [row[i] for row in rows[1:]] for i, column in enumerate(rows[0])}
+    if fmt == "jsonl":
+        records = [json.loads(line) for line in path.read_text().splitlines()]
+        return {column: [record[column] for record in records] for column in records[0]}
+    pyarrow = pytest.importorskip("pyarrow")
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+        return pq.read_table(path).to_pydict()
+    return pyarrow.ipc.open_file(path).read_all().to_pydict()
+
+
+@pytest.mark.parametrize("fmt, suffix", [("tsv", ".tsv"), ("jsonl", ".jsonl"),
+                                         ("parquet", ".parquet"), ("arrow", ".feather")])
+def test_every_format_round_trips_the_columns(database, tmp_path, fmt, suffix):
+    path = tmp_path / f"indications{suffix}"
+    kwargs = {} if fmt in ("tsv", "jsonl") else {"batch_size": 100}
+    database.export_indications(path, **kwargs)
+    assert read_back(path, fmt) == database.indication_columns()
+    columns = ["URL", "Code", VARIANTS]
+    database.export_indications(path, fmt=fmt, columns=columns)
+    assert read_back(path, fmt) == database.indication_columns(columns)
+
+
+def test_rows_and_columns_agree(database):
+    columns = database.indication_columns()
+    rows = list(database.iter_indication_rows())
+    assert rows == [list(row) for row in zip(*columns.values())]
+    table = database.tabulate_indications()
+    assert list(table.index) == columns["Code"]
+    assert list(table.columns) == list(INDICATION_COLUMNS[1:])
+
+
+def test_unknown_format_is_rejected(database, tmp_path):
+    with pytest.raises(ValueError):
+        database.export_indications(tmp_path / "indications.xlsx")
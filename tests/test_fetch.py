@@ -0,0 +1,38 @@
+import warnings
+
+import pytest
+
+import nccp_chemotherapy_regimens as nccp
+
+
+@pytest.fixture
+def expected(page_urls):
+    return nccp.parse_tables_from_all_urls(page_urls)
+
+
+@pytest.mark.parametrize("parse_in_processes", [False, True])
+def test_concurrent_matches_sequential(page_urls, expected, parse_in_processes):
+    parsed = nccp.parse_tables_from_all_urls(page_urls, max_workers=3,
+                                             parse_in_processes=parse_in_processes)
+    assert list(parsed) == page_urls
+    assert parsed == expected
+
+
+@pytest.mark.parametrize("parse_in_processes", [False, True])
+def test_concurrent_reports_failures_per_url(site, page_urls, expected,
+                                             parse_in_processes):
+    missing = f"{site}missing.html"
+    failures = {}
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always")
+        parsed = nccp.parse_tables_from_all_urls([page_urls[0], missing, *page_urls[1:]],
+                                                 max_workers=2, failures=failures,
+                                                 parse_in_processes=parse_in_processes)
+    assert list(failures) == [missing]
+    assert any(missing in str(w.message) for w in caught if w.category is RuntimeWarning)
+    assert parsed == expected
+
+
+def test_sequential_raises_on_failure(site):
+    with pytest.raises(OSError):
+        nccp.parse_tables_from_all_urls([f"{site}missing.html"])
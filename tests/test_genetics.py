@@ -0,0 +1,68 @@
+import pytest
+
+from conftest import rebuild
+from fixtures import FIXTURE_DIR
+from nccp_chemotherapy_regimens import Indication
+from nccp_genetics import GeneticClassifier
+
+
+@pytest.fixture
+def classifier():
+    return GeneticClassifier(["EGFR", "ALK", "BRAF", "ALL"])
+
+
+@pytest.mark.parametrize("description, expected", [
+    ("EGFR mutation positive NSCLC", ("EGFR",)),
+    ("HER2-positive breast cancer", ("HER2",)),
+    ("HER2- positive breast cancer", ("HER2",)),
+    ("HER2-negative breast cancer", ()),
+    ("HER2/neu negative breast cancer", ()),
+    ("human epidermal growth factor receptor 2 (HER2)-negative breast cancer", ()),
+    ("NSCLC negative for EGFR and ALK mutations", ()),
+    ("EGFR-negative, ALK-positive NSCLC", ("ALK",)),
+    ("Philadelphia chromosome negative ALL", ()),
+    ("Ph+ ALL", ("BCR-ABL",)),
+    ("Ph- ALL", ()),
+    ("CD20 positive lymphoma", ("CD antigen",)),
+    ("BRAFV600E", ()),
+])
+def test_biomarkers(classifier, description, expected):
+    assert classifier.biomarkers(description) == expected
+
+
+def test_classify_keeps_the_curated_flag_unless_overridden(classifier):
+    indications = [Indication("1", "EGFR mutation positive NSCLC", None, has_genetic_req=False),
+                   Indication("2", "HER2-negative breast cancer", None, has_genetic_req=True),
+                   Indication("3", "Small cell lung cancer", None)]
+    classifier.classify(indications)
+    assert [ind.has_genetic_req for ind in indications] == [False, True, None]
+    assert [ind.auto_genetic_req for ind in indications] == [True, False, False]
+    classifier.classify(indications, override=True)
+    assert [ind.has_genetic_req for ind in indications] == [True, False, False]
+
+
+def test_agreement_reports_precision_and_disagreements(classifier):
+    indications = [Indication("1", "EGFR mutation positive NSCLC", None),
+                   Indication("2", "CD30+ Hodgkin lymphoma", None),
+                   Indication("3", "Cancer with the T315I mutation", None),
+                   Indication("4", "Small cell lung cancer", None)]
+    classifier.classify(indications)
+    report = classifier.agreement(indications, {"1", "3", "unknown"})
+    assert report == {"indications": 4, "agree": 2, "both": 1,
+                      "automatic_only": ["2"], "manual_only": ["3"],
+                      "precision": 0.5, "recall": 0.5}
+
+
+def test_classification_survives_snapshots_and_compaction(pages, classifier, tmp_path):
+    database = rebuild(pages)
+    manual_file = FIXTURE_DIR / "indications_with_genetic_requirement.txt"
+    database.add_genetic_classification(manual_file)
+    curated = {code: ind.has_genetic_req for code, ind in database.indications.items()}
+    database.classify_genetic_requirements(classifier)
+    assert {code: ind.has_genetic_req for code, ind in database.indications.items()} == curated
+    automatic = {code: ind.auto_genetic_req for code, ind in database.indications.items()}
+    assert any(automatic.values())
+    database.save(tmp_path / "database.sqlite")
+    for copy in (type(database).load(tmp_path / "database.sqlite", lazy=False),
+                 database.compact()):
+        assert {code: ind.auto_genetic_req for code, ind in copy.indications.items()} == automatic
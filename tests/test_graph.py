@@ -0,0 +1,83 @@
+import random
+from collections import Counter
+
+import pytest
+
+from conftest import edit_pages, rebuild
+
+pytest.importorskip("scipy")
+
+
+@pytest.fixture
+def database(pages):
+    return rebuild(pages)
+
+
+def links(database):
+    """{(kind, key): set of (kind, key)} adjacency built straight from the objects."""
+    adjacency = {}
+    for ind in database.indications.values():
+        node = "indications", ind.code
+        adjacency.setdefault(node, set())
+        for reg in ind.regimens:
+            adjacency[node].add(("regimens", reg.description))
+            adjacency.setdefault(("regimens", reg.description), set()).add(node)
+        for disease in ind.diseases:
+            adjacency[node].add(("diseases", disease))
+            adjacency.setdefault(("diseases", disease), set()).add(node)
+    return adjacency
+
+
+def test_neighbours_and_derived_regimen_diseases(database):
+    graph = database.graph()
+    regimen = next(iter(database.regimens.values()))
+    indications = graph.neighbours("regimens", regimen.description, "indications")
+    assert set(indications.index) == {ind.code for ind in regimen.indication_codes}
+    diseases = Counter(disease for ind in regimen.indication_codes for disease in ind.diseases)
+    assert graph.neighbours("regimens", regimen.description, "diseases").to_dict() == diseases
+
+
+def test_related_regimens_share_an_indication(database):
+    graph = database.graph()
+    for regimen in list(database.regimens.values())[:20]:
+        expected = Counter(other.description for ind in regimen.indication_codes
+                           for other in ind.regimens if other is not regimen)
+        assert graph.related("regimens", regimen.description,
+                             "indications").to_dict() == expected
+
+
+def test_co_occurrence_and_crosstab(database):
+    graph = database.graph()
+    crosstab = graph.crosstab("indications", "diseases")
+    for ind in list(database.indications.values())[:20]:
+        assert set(crosstab.columns[crosstab.loc[ind.code] > 0]) == ind.diseases
+    co_occurrence = graph.co_occurrence("indications", "diseases").sparse.to_dense()
+    for ind in list(database.indications.values())[:20]:
+        assert co_occurrence.loc[ind.code, ind.code] == len(ind.diseases)
+
+
+def test_k_hop_matches_breadth_first_search(database):
+    graph = database.graph()
+    adjacency = links(database)
+    start = next(iter(database.regimens))
+    distance, frontier = {("regimens", start): 0}, [("regimens", start)]
+    for hop in range(1, 4):
+        reached = []
+        for current in frontier:
+            for node in adjacency[current] - distance.keys():
+                distance[node] = hop
+                reached.append(node)
+        frontier = reached
+    expected = {node: hop for node, hop in distance.items() if hop > 0}
+    assert graph.k_hop("regimens", start, 3).to_dict() == expected
+    assert graph.k_hop("regimens", start, 3, target="diseases").to_dict() == {
+        key: hop for (kind, key), hop in expected.items() if kind == "diseases"}
+
+
+def test_combined_graph_holds_the_union_of_edges(database, pages):
+    other = rebuild(edit_pages(pages, random.Random(3)))
+    combined = type(database.graph()).combine([database, other])
+    for kind, other_kind in (("regimens", "indications"), ("indications", "diseases")):
+        assert set(combined.edges(kind, other_kind)) == (
+            set(database.graph().edges(kind, other_kind))
+            | set(other.graph().edges(kind, other_kind)))
@@ -0,0 +1,83 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from conftest import ROOT
+from fixtures import FIXTURE_DIR
+from harmonization import RegimenHarmonizer, guard_tokens, harmonization_key
+
+TIE = """
+from harmonization import RegimenHarmonizer
+harmonizer = RegimenHarmonizer(["Gemcitabine Cisplatin abc", "Gemcitabine Cisplatin abd",
+                                "Gemcitabine Cisplatin abe"], accept=0.8, review=0.5)
+print(harmonizer.match("Gemcitabine Cisplatin ab"), harmonizer.review)
+"""
+
+
+@pytest.fixture
+def harmonizer():
+    return RegimenHarmonizer(["Carboplatin and Paclitaxel Therapy",
+                              "Trastuzumab (IV) Monotherapy",
+                              "Trastuzumab (SC) Monotherapy"],
+                             aliases={"CarboTaxol": "carboplatin and paclitaxel therapy"})
+
+
+def test_key_ignores_case_accents_and_punctuation():
+    assert harmonization_key("  Café-Crème (IV)  ") == harmonization_key("cafe creme iv")
+
+
+def test_guard_tokens_tell_routes_and_doses_apart():
+    assert guard_tokens("Trastuzumab (IV)") != guard_tokens("Trastuzumab (SC)")
+    assert guard_tokens("Cisplatin 75mg/m2") != guard_tokens("Cisplatin 100mg/m2")
+    assert guard_tokens("Cisplatin 75 mg/m2") == guard_tokens("cisplatin 75mg/m2")
+
+
+@pytest.mark.parametrize("name, expected", [
+    ("carbotaxol", ("carboplatin and paclitaxel therapy", 1.0, "alias")),
+    ("CARBOPLATIN and paclitaxel therapy",
+     ("Carboplatin and Paclitaxel Therapy", 1.0, "exact")),
+    ("Trastuzumab (SC) Monotherapy.", ("Trastuzumab (SC) Monotherapy", 1.0, "exact")),
+])
+def test_alias_and_exact_matches(harmonizer, name, expected):
+    assert harmonizer.match(name) == expected
+
+
+def test_fuzzy_match_needs_agreeing_guard_tokens(harmonizer):
+    name, score, status = harmonizer.match("Carboplatin an Paclitaxel Therapy")
+    assert (name, status) == ("Carboplatin and Paclitaxel Therapy", "fuzzy")
+    assert score >= harmonizer.accept
+    name, score, status = harmonizer.match("Carboplatin and Paclitaxel Therapy 2")
+    assert (name, status) == ("Carboplatin and Paclitaxel Therapy 2", "review")
+    assert score >= harmonizer.accept
+    assert harmonizer.review[name] == ("Carboplatin and Paclitaxel Therapy", score)
+    assert harmonizer.match("Trastuzumab (IM) Monotherapy")[2] == "review"
+    assert harmonizer.match("Something else entirely")[2] == "new"
+
+
+def test_ties_do_not_depend_on_hash_seed():
+    outputs = set()
+    for seed in range(4):
+        env = {**os.environ, "PYTHONHASHSEED": str(seed), "PYTHONPATH": str(ROOT)}
+        outputs.add(subprocess.run([sys.executable, "-c", TIE], env=env, check=True,
+                                   capture_output=True, text=True).stdout)
+    assert len(outputs) == 1
+
+
+def test_cache_round_trip(harmonizer, tmp_path):
+    cache_file = tmp_path / "harmonizer.json"
+    harmonizer.match("Carboplatin an Paclitaxel Therapy")
+    harmonizer.save_cache(cache_file)
+    restored = RegimenHarmonizer(**harmonizer.state(), cache_file=cache_file)
+    assert restored._resolved == harmonizer._resolved
+    changed = RegimenHarmonizer(["Something Else"], cache_file=cache_file)
+    assert not changed._resolved
+
+
+def test_from_files_returns_alias_targets_as_written():
+    harmonizer = RegimenHarmonizer.from_files(FIXTURE_DIR / "harmonization.tsv")
+    with open(FIXTURE_DIR / "harmonization.tsv") as infile:
+        next(infile)
+        original, fixed = next(infile).rstrip("\n").split("\t")[:2]
+    assert harmonizer.resolve(original) == fixed
@@ -0,0 +1,33 @@
+import copy
+import random
+
+import pytest
+
+from conftest import edit_pages, rebuild, snapshot
+from fixtures import FIXTURE_DIR
+
+HARMONIZATION_FILE = FIXTURE_DIR / "harmonization.tsv"
+
+
+@pytest.mark.parametrize("harmonization_file", [None, HARMONIZATION_FILE])
+def test_update_equals_full_rebuild(pages, harmonization_file):
+    rng = random.Random(0)
+    database = rebuild(pages, harmonization_file=harmonization_file)
+    for _ in range(20):
+        pages = edit_pages(pages, rng)
+        database.update(pages)
+        expected = rebuild(pages, harmonization_file=harmonization_file)
+        assert snapshot(database) == snapshot(expected)
+        assert database.fingerprints == expected.fingerprints
+
+
+def test_update_without_changes_is_a_no_op(pages):
+    database = rebuild(pages)
+    assert database.update(copy.deepcopy(pages)) == []
+
+
+def test_reordered_pages_are_merged_in_the_new_order(pages):
+    database = rebuild(pages)
+    reordered = dict(reversed(list(pages.items())))
+    database.update(reordered)
+    assert snapshot(database) == snapshot(rebuild(reordered))
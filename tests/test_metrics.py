@@ -0,0 +1,61 @@
+import json
+
+import nccp_chemotherapy_regimens as nccp
+import nccp_metrics
+from conftest import rebuild
+from nccp_metrics import Metrics, count, stage
+
+
+def test_disabled_metrics_record_nothing():
+    assert nccp_metrics._active is None
+    with stage("anything", url="u"):
+        count("things")
+    metrics = Metrics()
+    assert metrics.to_dict()["stages"] == {}
+
+
+def test_pipeline_stages_and_counters(page_urls):
+    with Metrics() as metrics:
+        parsed = nccp.parse_tables_from_all_urls(page_urls)
+        database = rebuild(parsed)
+        database.search_indications("HER2")
+        database.search_indications("breast")
+    assert nccp_metrics._active is None
+    stages = metrics.to_dict()["stages"]
+    assert stages["fetch_page"]["calls"] == stages["parse_page"]["calls"] == len(page_urls)
+    assert stages["search_indications"]["calls"] == 2
+    assert stages["parse_table"]["wall_seconds"] >= stages["parse_indications"]["wall_seconds"]
+    rows = sum(len(table) for tables in parsed.values() for _, table in tables)
+    counters = {(c["name"], tuple(c["labels"].items())): c["value"]
+                for c in metrics.to_dict()["counters"]}
+    assert counters["rows_parsed", ()] == rows
+    assert set(metrics.urls) == set(page_urls)
+    assert all(values["rows_parsed"] and values["fetch_page_seconds"] > 0
+               for values in metrics.urls.values())
+
+
+def test_nested_metrics_restore_the_previous_collector():
+    with Metrics() as outer:
+        with Metrics() as inner:
+            count("things", 2)
+        count("things")
+    assert inner.counters["things", ()] == 2
+    assert outer.counters["things", ()] == 1
+
+
+def test_exports(tmp_path):
+    with Metrics(profile=True, trace_memory=True) as metrics:
+        with stage("work", url='http://x/"quoted"'):
+            sum(range(1000))
+        count("warnings", category="weird_row")
+    data = json.loads(metrics.to_json())
+    assert data["stages"]["work"]["calls"] == 1
+    assert data["memory"]["peak_bytes"] > 0 and data["profile"]
+    text = metrics.to_prometheus()
+    assert 'nccp_stage_calls_total{stage="work"} 1' in text
+    assert 'nccp_warnings_total{category="weird_row"} 1' in text
+    assert r'url="http://x/\"quoted\""' in text
+    metrics.write(tmp_path / "metrics.prom")
+    metrics.write(tmp_path / "metrics.json")
+    assert (tmp_path / "metrics.prom").read_text() == text
+    assert json.loads((tmp_path / "metrics.json").read_text())["stages"] == data["stages"]
@@ -0,0 +1,98 @@
+import pandas as pd
+import pytest
+from pandas.testing import assert_frame_equal
+
+import ncri_plots
+from fixtures import write_ncri_csvs
+from ncri_cache import DerivedTableCache, derived_table, frame_hash
+
+calls = []
+
+
+@derived_table("doubled")
+def doubled(frame, factor=2):
+    calls.append(factor)
+    return frame * factor
+
+
+@pytest.fixture
+def csvs(tmp_path):
+    return write_ncri_csvs(tmp_path, seed=0)
+
+
+@pytest.fixture(autouse=True)
+def reset_calls():
+    calls.clear()
+
+
+def test_cached_tables_equal_fresh_ones(csvs):
+    expected = ncri_plots.PopulationData.read_csv(csvs["population"])
+    with DerivedTableCache() as cache:
+        first = ncri_plots.PopulationData.read_csv(csvs["population"])
+        second = ncri_plots.PopulationData.read_csv(csvs["population"])
+        aggregated = second.population_tools.aggregate_cancer_age_groups()
+        again = first.population_tools.aggregate_cancer_age_groups()
+    assert_frame_equal(first, expected)
+    assert_frame_equal(second, expected)
+    assert_frame_equal(again, aggregated)
+    assert cache.stats == {"hits": 2, "misses": 2, "disk_hits": 0}
+
+
+def test_keys_follow_content_not_identity():
+    frame = pd.DataFrame({"a": [1, 2, 3]})
+    with DerivedTableCache():
+        doubled(frame)
+        doubled(frame.copy())
+        doubled(frame, factor=3)
+        frame.loc[0, "a"] = 10
+        result = doubled(frame)
+    assert calls == [2, 3, 2]
+    assert result["a"].tolist() == [20, 4, 6]
+    assert frame_hash(frame) != frame_hash(frame.astype(float))
+
+
+def test_edited_csv_is_read_again(csvs):
+    with DerivedTableCache() as cache:
+        before = ncri_plots.PopulationData.read_csv(csvs["population"])
+        population = pd.read_csv(csvs["population"])
+        population["VALUE"] *= 2
+        population.to_csv(csvs["population"], index=False)
+        after = ncri_plots.PopulationData.read_csv(csvs["population"])
+    assert cache.stats["misses"] == 2
+    assert (after["Population"] == 2 * before["Population"]).all()
+
+
+def test_results_are_copies():
+    frame = pd.DataFrame({"a": [1, 2, 3]})
+    with DerivedTableCache():
+        result = doubled(frame)
+        result.loc[0, "a"] = -1
+        assert doubled(frame)["a"].tolist() == [2, 4, 6]
+
+
+def test_lru_limit_and_disk_persistence(tmp_path):
+    frames = [pd.DataFrame({"a": [i]}) for i in range(3)]
+    with DerivedTableCache(max_entries=2, directory=tmp_path) as cache:
+        for frame in frames:
+            doubled(frame)
+        assert len(cache) == 2
+        doubled(frames[0])
+    assert cache.stats == {"hits": 0, "misses": 3, "disk_hits": 1}
+    with DerivedTableCache(directory=tmp_path) as fresh:
+        assert doubled(frames[2])["a"].tolist() == [4]
+    assert fresh.stats["disk_hits"] == 1 and calls == [2, 2, 2]
+    fresh.clear()
+    assert not list(tmp_path.glob("*.pkl"))
+
+
+def test_unkeyable_arguments_are_computed_every_time():
+    frame = pd.DataFrame({"a": [1]})
+    with DerivedTableCache() as cache:
+        doubled(frame, factor=Multiplier())
+        doubled(frame, factor=Multiplier())
+    assert len(cache) == 0 and len(calls) == 2
+
+
+class Multiplier:
+    def __rmul__(self, other):
+        return other
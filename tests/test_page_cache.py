@@ -0,0 +1,127 @@
+import hashlib
+import http.server
+import threading
+import time
+
+import pytest
+
+from page_cache import PageCache
+
+PAGES = {"/a": b"a" * 4, "/b": b"b" * 4, "/c": b"c" * 4}
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    requests = []
+
+    def do_GET(self):
+        body = PAGES.get(self.path)
+        if body is None:
+            self.send_error(404)
+            return
+        etag = f'"{hashlib.sha1(body).hexdigest()}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.requests.append((self.path, 304))
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        self.requests.append((self.path, 200))
+        self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def server():
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def requests():
+    _Handler.requests.clear()
+    return _Handler.requests
+
+
+@pytest.fixture
+def path(tmp_path):
+    return tmp_path / "pages.sqlite"
+
+
+def test_miss_then_hit_within_ttl(server, requests, path):
+    with PageCache(path, ttl=60) as cache:
+        assert cache.fetch(f"{server}/a") == PAGES["/a"]
+        assert cache.fetch(f"{server}/a") == PAGES["/a"]
+        assert requests == [("/a", 200)]
+        assert cache.stats == {"hits": 1, "misses": 1, "revalidated": 0}
+
+
+def test_stale_entry_is_revalidated(server, requests, path):
+    with PageCache(path, ttl=0) as cache:
+        cache.fetch(f"{server}/a")
+        assert cache.fetch(f"{server}/a") == PAGES["/a"]
+        assert requests == [("/a", 200), ("/a", 304)]
+        assert cache.stats == {"hits": 0, "misses": 1, "revalidated": 1}
+
+
+def test_offline_serves_only_cached_pages(server, requests, path):
+    with PageCache(path) as cache:
+        cache.fetch(f"{server}/a")
+    with PageCache(path, offline=True) as cache:
+        assert cache.fetch(f"{server}/a") == PAGES["/a"]
+        with pytest.raises(LookupError):
+            cache.fetch(f"{server}/b")
+    assert requests == [("/a", 200)]
+
+
+def test_size_limit_evicts_least_recently_used(server, path):
+    with PageCache(path, ttl=60, max_bytes=8) as cache:
+        cache.fetch(f"{server}/a")
+        cache.fetch(f"{server}/b")
+        cache.fetch(f"{server}/a")
+        cache.fetch(f"{server}/c")
+        assert f"{server}/a" in cache and f"{server}/c" in cache
+        assert f"{server}/b" not in cache
+
+
+def test_limits_are_enforced_on_hits_revalidations_and_open(server, path):
+    with PageCache(path) as cache:
+        for page in PAGES:
+            cache.fetch(f"{server}{page}")
+    with PageCache(path, ttl=0, max_bytes=10) as cache:
+        assert len(cache) == 2
+    with PageCache(path) as cache:
+        for page in PAGES:
+            cache.fetch(f"{server}{page}")
+    with PageCache(path, ttl=60) as cache:
+        cache.max_bytes = 4
+        cache.fetch(f"{server}/a")
+        assert len(cache) == 1 and f"{server}/a" in cache
+    with PageCache(path) as cache:
+        for page in PAGES:
+            cache.fetch(f"{server}{page}")
+        revalidated = cache.stats["revalidated"]
+        cache.max_bytes = 4
+        cache.fetch(f"{server}/b")
+        assert cache.stats["revalidated"] == revalidated + 1
+        assert len(cache) == 1 and f"{server}/b" in cache
+
+
+def test_age_limit_drops_entries_not_refreshed(server, path):
+    with PageCache(path) as cache:
+        cache.fetch(f"{server}/a")
+        cache.fetch(f"{server}/b")
+    time.sleep(0.05)
+    with PageCache(path, max_age=0.01) as cache:
+        assert len(cache) == 0
+        cache.fetch(f"{server}/a")
+        assert len(cache) == 1
@@ -0,0 +1,27 @@
+import pytest
+
+import nccp_chemotherapy_regimens as nccp
+from fixtures import fixture_html
+
+
+@pytest.fixture(scope="module")
+def soup_tables():
+    return nccp.parse_tables_from_html(fixture_html(), backend="soup")
+
+
+@pytest.mark.parametrize("backend", ["tables", "lxml"])
+def test_table_builders_match_the_soup_backend(soup_tables, backend):
+    if backend == "lxml":
+        pytest.importorskip("lxml")
+    assert nccp.parse_tables_from_html(fixture_html(), backend=backend) == soup_tables
+
+
+@pytest.mark.parametrize("backend", ["tables", "soup"])
+def test_decoded_text_parses_like_bytes(soup_tables, backend):
+    html = fixture_html().decode("utf-8")
+    assert nccp.parse_tables_from_html(html, backend=backend) == soup_tables
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        nccp.parse_tables_from_html(fixture_html(), backend="regex")
@@ -0,0 +1,92 @@
+import random
+import re
+
+import pytest
+
+from conftest import edit_pages, rebuild
+from search_index import field_text, tokenize
+
+QUERIES = ["HER2", "breast", "Carboplatin", "00254", "ab", "Monotherapy", "nonexistent"]
+REGEXES = [r"HER2[- ]positive", r"^Treatment", r"\bNHL\b", r"(?i)lymphoma"]
+
+
+@pytest.fixture
+def database(pages):
+    return rebuild(pages)
+
+
+def scan(database, kind, matches):
+    """Objects of kind, in order, for which matches(field text) holds in any field."""
+    return [thing for thing in getattr(database, kind).values()
+            if any(matches(field_text(thing, field))
+                   for field in database.SEARCH_FIELDS[kind])]
+
+
+def search(database, kind, text, **kwargs):
+    return getattr(database, f"search_{kind}")(text, **kwargs)
+
+
+@pytest.mark.parametrize("kind", ["regimens", "indications"])
+def test_substring_and_regex_match_a_full_scan(database, kind):
+    for query in QUERIES:
+        assert search(database, kind, query) == scan(database, kind,
+                                                     lambda text: query in text)
+    for pattern in REGEXES:
+        assert search(database, kind, pattern) == scan(
+            database, kind, lambda text: re.search(pattern, text))
+
+
+@pytest.mark.parametrize("kind", ["regimens", "indications"])
+def test_tokens_match_a_full_scan(database, kind):
+    for query in ["her2 positive", "Breast cancer", "monotherapy"]:
+        wanted = set(tokenize(query))
+        expected = [thing for thing in getattr(database, kind).values()
+                    if wanted <= {token for field in database.SEARCH_FIELDS[kind]
+                                  for token in tokenize(field_text(thing, field))}]
+        assert search(database, kind, query, tokens=True) == expected
+
+
+def test_fields_limit_and_rank(database):
+    by_code = database.search_indications("00254", fields=["code"])
+    assert by_code and all(ind.code.startswith("00254") for ind in by_code)
+    everything = database.search_indications("HER2")
+    assert database.search_indications("HER2", limit=3) == everything[:3]
+    ranked = database.search_indications("HER2", rank=True)
+    assert sorted(ranked, key=id) == sorted(everything, key=id)
+    with pytest.raises(ValueError):
+        database.search_indications("HER2", fields=["nonsense"])
+
+
+def test_index_follows_updates(database, pages):
+    rng = random.Random(2)
+    database.search_indications("HER2")
+    database.search_regimens("Monotherapy")
+    for _ in range(5):
+        pages = edit_pages(pages, rng)
+        database.update(pages)
+        expected = rebuild(pages)
+        for query in QUERIES:
+            assert ([ind.code for ind in database.search_indications(query)]
+                    == [ind.code for ind in expected.search_indications(query)])
+            assert ([reg.description for reg in database.search_regimens(query)]
+                    == [reg.description for reg in expected.search_regimens(query)])
+
+
+@pytest.mark.parametrize("kind", ["regimens", "indications"])
+@pytest.mark.parametrize("ignore_case", [False, True])
+def test_search_many_matches_one_search_per_pattern(database, kind, ignore_case):
+    patterns = [*QUERIES, *REGEXES, "HER2"]
+    results = database.search_many(patterns, kind=kind, ignore_case=ignore_case)
+    assert list(results) == list(dict.fromkeys(patterns))
+    flags = re.IGNORECASE if ignore_case else 0
+    for pattern, found in results.items():
+        regex = re.compile(pattern if pattern in REGEXES else re.escape(pattern), flags)
+        assert found == scan(database, kind, regex.search)
+
+
+def test_search_many_fields_and_kinds(database):
+    results = database.search_many(["00254", "breast"], fields=["code"])
+    assert results["breast"] == []
+    assert results["00254"] == database.search_indications("00254", fields=["code"])
+    with pytest.raises(ValueError):
+        database.search_many(["HER2"], kind="drugs")
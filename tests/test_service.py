@@ -0,0 +1,152 @@
+import asyncio
+import json
+import sqlite3
+import time
+from urllib.parse import quote
+
+import pytest
+
+from conftest import rebuild
+from nccp_chemotherapy_regimens import NCCP_Chemotherapy_Database
+from nccp_service import QueryService
+
+
+@pytest.fixture
+def snapshot_path(pages, tmp_path):
+    path = tmp_path / "database.sqlite"
+    rebuild(pages).save(path)
+    return path
+
+
+@pytest.fixture
+def service(snapshot_path):
+    service = QueryService.from_snapshot(snapshot_path, query_timeout=0.5)
+    yield service
+    service.close()
+
+
+async def request(port, method, target, body=b""):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(f"{method} {target} HTTP/1.1\r\nContent-Length: {len(body)}\r\n"
+                 f"Connection: close\r\n\r\n".encode() + body)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    headers = {}
+    while (line := await reader.readline()) != b"\r\n":
+        name, _, value = line.decode().partition(":")
+        headers[name.lower()] = value.strip()
+    payload = json.loads(await reader.readexactly(int(headers["content-length"])))
+    assert await reader.read() == b""
+    writer.close()
+    await writer.wait_closed()
+    return status, payload
+
+
+def serve(service, client):
+    """Run client(port) against service on an ephemeral port."""
+    async def main():
+        server = await service.start(port=0)
+        async with server:
+            return await client(server.sockets[0].getsockname()[1])
+    return asyncio.run(main())
+
+
+def test_lookups_and_searches(service):
+    database = service._generation.database
+    indication = next(iter(database.indications.values()))
+    regimen = next(iter(database.regimens))
+
+    async def client(port):
+        return [await request(port, "GET", target) for target in (
+            "/health", f"/indications/{indication.code}", f"/regimens/{quote(regimen)}",
+            "/indications/nonsense", "/search/indications?q=HER2&limit=3",
+            "/search/indications?q=(", "/search/indications")]
+
+    health, by_code, by_name, missing, search, bad_regex, no_text = serve(service, client)
+    assert health == (200, {"regimens": len(database.regimens),
+                            "indications": len(database.indications)})
+    assert by_code[0] == 200 and by_code[1]["code"] == indication.code
+    assert by_name[0] == 200 and by_name[1]["description"] == regimen
+    assert missing[0] == 404
+    assert search[0] == 200
+    assert [record["code"] for record in search[1]] == [
+        ind.code for ind in database.search_indications("HER2", limit=3)]
+    assert bad_regex[0] == no_text[0] == 400
+
+
+def test_batch_and_response_cache(service):
+    code = next(iter(service._generation.database.indications))
+    targets = ["/health", f"/indications/{code}", "/indications/nonsense"]
+
+    async def client(port):
+        first = await request(port, "POST", "/batch", json.dumps(targets).encode())
+        second = await request(port, "POST", "/batch", json.dumps(targets).encode())
+        invalid = await request(port, "POST", "/batch", b'{"not": "a list"}')
+        return first, second, invalid
+
+    first, second, invalid = serve(service, client)
+    assert first == second
+    assert [item["status"] for item in first[1]] == [200, 200, 404]
+    assert service.stats["misses"] == 3 and service.stats["hits"] == 3
+    assert invalid[0] == 400
+
+
+def test_slow_searches_time_out_without_blocking_the_loop(service, monkeypatch):
+    query = QueryService._query
+
+    def slow_query(database, target):
+        if target.startswith("/slow"):
+            time.sleep(1)
+        return query(database, target)
+
+    monkeypatch.setattr(QueryService, "_query", staticmethod(slow_query))
+
+    async def client(port):
+        slow = asyncio.ensure_future(request(port, "GET", "/slow/x"))
+        await asyncio.sleep(0.1)
+        start = time.perf_counter()
+        health = await request(port, "GET", "/health")
+        return await slow, health, time.perf_counter() - start
+
+    slow, health, elapsed = serve(service, client)
+    assert slow[0] == 503 and service.stats["timeouts"] == 1
+    assert health[0] == 200 and elapsed < 0.5
+    assert "/slow/x" not in service._generation.responses
+
+
+def test_keep_alive_connection_serves_several_requests(service):
+    async def client(port):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        statuses = []
+        for _ in range(3):
+            writer.write(b"GET /health HTTP/1.1\r\n\r\n")
+            await writer.drain()
+            statuses.append(int((await reader.readline()).split()[1]))
+            while (line := await reader.readline()) != b"\r\n":
+                if line.lower().startswith(b"content-length"):
+                    length = int(line.split(b":")[1])
+            await reader.readexactly(length)
+        writer.close()
+        await writer.wait_closed()
+        return statuses
+
+    assert serve(service, client) == [200, 200, 200]
+
+
+def test_reload_swaps_generation_and_closes_the_old_database(service, snapshot_path):
+    old = NCCP_Chemotherapy_Database.load(snapshot_path)
+    service.swap(old)
+    code = next(iter(old.indications))
+
+    async def client(port):
+        before = await request(port, "GET", f"/indications/{code}")
+        reloaded = await request(port, "POST", "/reload")
+        after = await request(port, "GET", f"/indications/{code}")
+        return before, reloaded, after
+
+    before, reloaded, after = serve(service, client)
+    assert reloaded == (200, {"generation": 2})
+    assert before == after
+    assert service.stats["misses"] == 2
+    with pytest.raises(sqlite3.ProgrammingError):
+        old._snapshot._connection.execute("SELECT 1")
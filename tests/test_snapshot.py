@@ -0,0 +1,61 @@
+import os
+import random
+import sqlite3
+
+import pytest
+
+import nccp_chemotherapy_regimens as nccp
+from conftest import edit_pages, rebuild, snapshot
+
+
+@pytest.fixture
+def saved(pages, tmp_path):
+    path = tmp_path / "nccp.sqlite"
+    rebuild(pages).save(path)
+    return path
+
+
+def open_files(path):
+    # Links in /proc/self/fd that point at path.
+    fds = "/proc/self/fd"
+    return [fd for fd in os.listdir(fds)
+            if os.path.realpath(os.path.join(fds, fd)) == str(path)]
+
+
+@pytest.mark.parametrize("lazy", [True, False])
+def test_load_round_trips(pages, saved, lazy):
+    database = nccp.NCCP_Chemotherapy_Database.load(saved, lazy=lazy)
+    assert snapshot(database) == snapshot(rebuild(pages))
+    assert database.fingerprints == rebuild(pages).fingerprints
+
+
+def test_update_after_loading(pages, saved):
+    database = nccp.NCCP_Chemotherapy_Database.load(saved)
+    changed = edit_pages(pages, random.Random(2))
+    database.update(changed)
+    assert snapshot(database) == snapshot(rebuild(changed))
+
+
+def test_lazy_database_closes_its_file(saved):
+    with nccp.NCCP_Chemotherapy_Database.load(saved) as database:
+        assert database.indications["00254b"].code == "00254b"
+        assert open_files(saved)
+    assert not open_files(saved)
+    with pytest.raises(sqlite3.ProgrammingError):
+        database.indications["00258a"]
+
+
+def test_materialized_database_has_no_open_file(saved):
+    database = nccp.NCCP_Chemotherapy_Database.load(saved, lazy=False)
+    assert not open_files(saved)
+    database.close()
+    assert len(database.indications) == len(rebuild(database.pages).indications)
+
+
+def test_unsupported_version_is_refused_and_closed(saved):
+    with sqlite3.connect(saved) as connection:
+        connection.execute("UPDATE meta SET value = '1' WHERE key = 'format_version'")
+    connection.close()
+    with pytest.raises(ValueError, match="format version 1"):
+        nccp.NCCP_Chemotherapy_Database.load(saved)
+    assert not open_files(saved)
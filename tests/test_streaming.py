@@ -0,0 +1,57 @@
+import random
+
+import pytest
+
+import nccp_chemotherapy_regimens as nccp
+from conftest import edit_pages, rebuild, snapshot
+from fixtures import FIXTURE_DIR
+from harmonization import RegimenHarmonizer
+
+HARMONIZATION_FILE = FIXTURE_DIR / "harmonization.tsv"
+
+
+@pytest.fixture
+def expected(page_urls):
+    return nccp.parse_tables_from_all_urls(page_urls)
+
+
+@pytest.mark.parametrize("max_workers", [None, 3])
+def test_streamed_rows_fold_into_the_batch_database(page_urls, expected, max_workers):
+    database = rebuild({})
+    records = nccp.stream_parsed_rows(page_urls, max_workers=max_workers)
+    assert list(database.fold(records, prune=True)) == page_urls
+    assert snapshot(database) == snapshot(rebuild(expected))
+    assert database.fingerprints == rebuild(expected).fingerprints
+
+
+def test_refresh_keeps_pages_that_failed_to_fetch(site, page_urls, expected):
+    missing = f"{site}missing.html"
+    previous = {page_urls[0]: expected[page_urls[0]], missing: expected[page_urls[1]],
+                page_urls[2]: expected[page_urls[2]]}
+    database = rebuild(previous)
+    failures = {}
+    records = nccp.stream_parsed_rows(list(previous), max_workers=2, failures=failures)
+    list(database.fold(records, prune=True, keep=failures))
+    assert list(failures) == [missing]
+    assert list(database.pages) == list(previous)
+    assert snapshot(database) == snapshot(rebuild(previous))
+
+
+def test_add_page_equals_full_rebuild(pages):
+    rng = random.Random(1)
+    database = rebuild(pages)
+    for _ in range(20):
+        url = rng.choice(list(pages))
+        tables = edit_pages({url: pages[url]}, rng).get(url, [])
+        pages[url] = tables
+        database.add_page(url, tables)
+        assert snapshot(database) == snapshot(rebuild(pages))
+
+
+def test_set_harmonizer_equals_full_rebuild(pages):
+    database = rebuild(pages)
+    database.set_harmonizer(RegimenHarmonizer.from_files(HARMONIZATION_FILE))
+    assert snapshot(database) == snapshot(rebuild(pages,
+                                                  harmonization_file=HARMONIZATION_FILE))
+    database.set_harmonizer(None)
+    assert snapshot(database) == snapshot(rebuild(pages))